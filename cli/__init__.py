@@ -4,6 +4,14 @@ from cli.export_transactions_job import export_transactions_to_clickhouse
 from cli.export_transfer_job import export_transfer_to_clickhouse
 from cli.export_internal_transactions_job import export_internal_transactions_to_clickhouse
 from cli.export_transaction_receipts_job import export_transaction_receipts_to_clickhouse
+from cli.export_token_ranges_job import export_token_ranges_to_clickhouse
+from cli.export_all_job import export_all_to_clickhouse
+from cli.export_logs_job import export_logs_to_clickhouse
+from cli.export_chunks_job import export_chunks_to_clickhouse
+from cli.load_staged_files_job import load_staged_files
+from cli.export_cdc_job import export_cdc_to_clickhouse
+from cli.verify_job import verify
+from cli.repair_job import repair
 
 @click.group()
 @click.version_option(version='1.0.0')
@@ -16,4 +24,12 @@ cli.add_command(export_blocks_to_clickhouse, "export_blocks_to_clickhouse")
 cli.add_command(export_transactions_to_clickhouse, "export_transactions_to_clickhouse")
 cli.add_command(export_transfer_to_clickhouse, "export_transfer_to_clickhouse")
 cli.add_command(export_internal_transactions_to_clickhouse, "export_internal_transactions_to_clickhouse")
-cli.add_command(export_transaction_receipts_to_clickhouse, "export_transaction_receipts_to_clickhouse")
\ No newline at end of file
+cli.add_command(export_transaction_receipts_to_clickhouse, "export_transaction_receipts_to_clickhouse")
+cli.add_command(export_token_ranges_to_clickhouse, "export_token_ranges_to_clickhouse")
+cli.add_command(export_all_to_clickhouse, "export_all_to_clickhouse")
+cli.add_command(export_logs_to_clickhouse, "export_logs_to_clickhouse")
+cli.add_command(export_chunks_to_clickhouse, "export_chunks_to_clickhouse")
+cli.add_command(load_staged_files, "load_staged_files")
+cli.add_command(export_cdc_to_clickhouse, "export_cdc_to_clickhouse")
+cli.add_command(verify, "verify")
+cli.add_command(repair, "repair")
\ No newline at end of file
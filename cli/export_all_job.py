@@ -0,0 +1,16 @@
+import click
+
+from cli.stream_command import stream_options, run_stream
+from streaming.adapter_factory import ENGINES
+from jobs.export_all import ENTITIES
+from streaming.async_export_adapter import ENTITY_TABLES
+
+@click.command()
+@stream_options
+@click.option('--entities', default=','.join(ENTITIES), show_default=True, help='Comma-separated entities to export')
+@click.option('--engine', type=click.Choice(ENGINES), default='threads', help='threads, or asyncio to schedule every read from one event loop (--adaptive and --batch-rows are ignored)')
+def export_all_to_clickhouse(entities, engine, **options):
+    entities = [entity.strip() for entity in entities.split(',') if entity.strip()]
+    adapter_kwargs = dict(entities=entities, engine=engine) if engine == 'asyncio' else dict(entities=entities)
+    # Only the tables of the exported entities are cleared on a reorg
+    run_stream('all', adapter_kwargs, reorg_tables=[ENTITY_TABLES[entity] for entity in entities], **options)
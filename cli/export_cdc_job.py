@@ -0,0 +1,95 @@
+import uuid
+
+import click
+
+from utils.logging_utils import logging_basic_config
+from database.cassandra_client import CassandraClient
+from database.clickhouse_client import ClickhouseClient, INSERT_MODES
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from streaming.cdc_streamer import CdcStreamer
+from jobs.export_cdc_changes import CDC_TABLES
+
+@click.command()
+@click.option('-i', '--input', default=None, help='Input database, required unless --dry-run')
+@click.option('-o', '--output', default=None, help='Output database, required unless --dry-run')
+@click.option('-d', '--db-prefix', default='', help='Database prefix')
+@click.option('--cdc-raw-dir', required=True, help='cdc_raw directory of the Cassandra node, or a copy of its segment and _cdc.idx files')
+@click.option('--offsets-file', default='cdc_offsets.json', help='File keeping the offset reached in each segment')
+@click.option('--max-changes', type=int, default=1000, help='Changed partitions per micro-batch')
+@click.option('--period-seconds', type=int, default=10, help='Seconds to sleep when there is no new change')
+@click.option('--delete-consumed', is_flag=True, default=False, help='Delete completed segments once applied, so Cassandra can reuse the cdc_raw space')
+@click.option('--once', is_flag=True, default=False, help='Apply the changes found in cdc_raw and exit')
+@click.option('--dry-run', is_flag=True, default=False, help='Only print the changed partitions found in cdc_raw, without connecting to Cassandra or ClickHouse or saving offsets')
+@click.option('--table-id', multiple=True, help='Table id as table=uuid from system_schema.tables, required with --dry-run (repeatable)')
+@click.option('-w', '--max-workers', type=int, default=10, help='Maximum number of workers')
+@click.option('--tx-partitions', type=int, default=100, help='Transaction partitions')
+@click.option('--log-partitions', type=int, default=100, help='Log partitions')
+@click.option('--block-partitions', type=int, default=10000, help='Block partitions')
+@click.option('--insert-mode', type=click.Choice(INSERT_MODES), default='rows', help='ClickHouse insert mode: rows, columnar or numpy')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='none', help='Compress data sent to ClickHouse (lz4 and zstd need the lz4 / zstd packages)')
+@click.option('--insert-setting', multiple=True, help='ClickHouse insert setting as name=value for every table or table.name=value, e.g. logs.max_insert_threads=4 (repeatable)')
+def export_cdc_to_clickhouse(input, output, db_prefix, cdc_raw_dir, offsets_file, max_changes, period_seconds, delete_consumed, once, dry_run, table_id, max_workers, tx_partitions, log_partitions, block_partitions, insert_mode, compression, insert_setting):
+    """Apply the rows rewritten in Cassandra to ClickHouse by tailing CDC commit log segments.
+
+    Each changed partition is a whole bucket re-read from Cassandra. New blocks are CDC
+    mutations as well, so while the chain grows every micro-batch re-reads the hot bucket
+    of each table (up to --block-partitions blocks for blocks), on top of the export streams."""
+    logging_basic_config()
+
+    if dry_run:
+        table_ids = parse_table_ids(table_id)
+        streamer = CdcStreamer(
+            cdc_raw_dir=cdc_raw_dir,
+            item_importer=None,
+            item_exporter=None,
+            max_workers=max_workers,
+            offsets_file=None,
+            table_ids=table_ids,
+            max_changes=max_changes,
+            apply_changes=echo_changes)
+        streamer.sync_once()
+        return
+    if not input or not output:
+        raise click.UsageError('--input and --output are required unless --dry-run is given')
+
+    item_importer = CassandraClient(connection_url=input, keyspace_prefix=db_prefix, tx_partitions=tx_partitions, log_partitions=log_partitions, block_partitions=block_partitions)
+    item_exporter = ClickhouseClient(connection_url=output, db_prefix=db_prefix, insert_mode=insert_mode,
+                                     compression=compression, insert_profile=InsertProfile.parse(insert_setting))
+
+    streamer = CdcStreamer(
+        cdc_raw_dir=cdc_raw_dir,
+        item_importer=item_importer,
+        item_exporter=item_exporter,
+        max_workers=max_workers,
+        offsets_file=offsets_file,
+        max_changes=max_changes,
+        period_seconds=period_seconds,
+        delete_consumed=delete_consumed)
+
+    if once:
+        streamer.sync_once()
+    else:
+        streamer.stream()
+
+
+def parse_table_ids(specs):
+    """Map uuid.UUID -> table name from table=uuid options"""
+    table_ids = {}
+    for spec in specs:
+        table, _, table_id = spec.partition('=')
+        try:
+            table_id = uuid.UUID(table_id.strip())
+        except ValueError:
+            table_id = None
+        if table not in CDC_TABLES or table_id is None:
+            raise click.BadParameter(f'Expected table=uuid with a table of {CDC_TABLES}, got {spec}',
+                                     param_hint='--table-id')
+        table_ids[table_id] = table
+    if not table_ids:
+        raise click.UsageError('--dry-run needs the ids of the CDC tables, pass them with --table-id')
+    return table_ids
+
+
+def echo_changes(changes):
+    for table, bucket_id in sorted(changes):
+        click.echo(f'{table} {bucket_id}')
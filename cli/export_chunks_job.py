@@ -0,0 +1,52 @@
+import click
+
+from utils.logging_utils import logging_basic_config
+from database.cassandra_client import CassandraClient
+from database.clickhouse_client import ClickhouseClient, INSERT_MODES
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from streaming.adapter_factory import ADAPTERS, create_adapter
+from streaming.work_coordinator import WorkCoordinator, SqliteChunkStore, ClickhouseChunkStore
+
+@click.command()
+@click.option('-i', '--input', required=True, help='Input database')
+@click.option('-o', '--output', required=True, help='Output database')
+@click.option('-d', '--db-prefix', default='', help='Database prefix')
+@click.option('-S', '--stream', required=True, type=click.Choice(sorted(ADAPTERS)), help='Stream to export')
+@click.option('-s', '--start-block', type=int, default=None, help='Plan chunks from this block number')
+@click.option('-e', '--end-block', type=int, default=None, help='Plan chunks up to this block number')
+@click.option('--chunk-size', type=int, default=100000, help='Blocks per leased chunk')
+@click.option('--coordinator', default='clickhouse', help='"clickhouse" for a control table in the output database, or a local SQLite file path')
+@click.option('--worker-id', default=None, help='Worker id, defaults to <hostname>-<pid>')
+@click.option('--lease-seconds', type=int, default=300, help='Seconds before a chunk of a silent worker is handed out again')
+@click.option('-b', '--batch-size', type=int, default=1000, help='Batch size')
+@click.option('-w', '--max-workers', type=int, default=10, help='Maximum number of workers')
+@click.option('--tx-partitions', type=int, default=100, help='Transaction partitions')
+@click.option('--log-partitions', type=int, default=100, help='Log partitions')
+@click.option('--block-partitions', type=int, default=10000, help='Block partitions')
+@click.option('--insert-mode', type=click.Choice(INSERT_MODES), default='rows', help='ClickHouse insert mode: rows, columnar or numpy')
+@click.option('--buffer-rows', type=int, default=0, help='Coalesce inserts per table up to this many rows (0 disables buffering)')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='none', help='Compress data sent to ClickHouse (lz4 and zstd need the lz4 / zstd packages)')
+@click.option('--insert-setting', multiple=True, help='ClickHouse insert setting as name=value for every table or table.name=value, e.g. logs.max_insert_threads=4 (repeatable)')
+@click.option('--deduplicate', is_flag=True, default=False, help='Send a deduplication token with every insert so retried batches are skipped by ClickHouse')
+@click.option('--batch-rows', type=int, default=None, help='Size batches by estimated rows instead of blocks, aiming at this many rows per batch')
+@click.option('--adaptive', is_flag=True, default=False, help='Tune batch size and concurrency while running, starting from -b and -w')
+def export_chunks_to_clickhouse(input, output, db_prefix, stream, start_block, end_block, chunk_size, coordinator, worker_id, lease_seconds, batch_size, max_workers, tx_partitions, log_partitions, block_partitions, insert_mode, buffer_rows, compression, insert_setting, deduplicate, batch_rows, adaptive):
+    """Lease block-range chunks from a shared chunk store until none are left. Run it on any number of hosts."""
+    logging_basic_config()
+
+    item_importer = CassandraClient(connection_url=input, keyspace_prefix=db_prefix, tx_partitions=tx_partitions, log_partitions=log_partitions, block_partitions=block_partitions)
+    item_exporter = ClickhouseClient(connection_url=output, db_prefix=db_prefix, insert_mode=insert_mode, buffer_max_rows=buffer_rows,
+                                     compression=compression, insert_profile=InsertProfile.parse(insert_setting), deduplicate=deduplicate)
+
+    if coordinator == 'clickhouse':
+        store = ClickhouseChunkStore(ClickhouseClient(connection_url=output, db_prefix=db_prefix))
+    else:
+        store = SqliteChunkStore(coordinator)
+
+    work_coordinator = WorkCoordinator(store, stream_id=stream, worker_id=worker_id, lease_seconds=lease_seconds)
+    if start_block is not None and end_block is not None:
+        work_coordinator.plan(start_block, end_block, chunk_size)
+
+    adapter = create_adapter(stream, item_importer=item_importer, item_exporter=item_exporter,
+                             batch_size=batch_size, max_workers=max_workers, adaptive=adaptive, batch_rows=batch_rows)
+    work_coordinator.run(adapter)
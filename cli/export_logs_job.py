@@ -0,0 +1,9 @@
+import click
+
+from cli.stream_command import stream_options, run_stream, PIPELINE_WORKERS_OPTION
+
+@click.command()
+@stream_options
+@PIPELINE_WORKERS_OPTION
+def export_logs_to_clickhouse(pipeline_workers, **options):
+    run_stream('logs', dict(pipeline_workers=pipeline_workers), **options)
@@ -0,0 +1,49 @@
+import click
+
+from utils.logging_utils import logging_basic_config
+from database.cassandra_client import CassandraClient
+from database.clickhouse_client import INSERT_MODES
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from database.clickhouse_file_exporter import STAGING_COMPRESSIONS
+from database.exporter_factory import create_item_exporter
+from jobs.export_token_ranges import ExportTokenRanges, BLOCK_NUMBER_COLUMNS
+
+@click.command()
+@click.option('-i', '--input', required=True, help='Input database')
+@click.option('-o', '--output', required=True, help='Output database')
+@click.option('-d', '--db-prefix', default='', help='Database prefix')
+@click.option('-T', '--table', required=True, type=click.Choice(sorted(BLOCK_NUMBER_COLUMNS)), help='Cassandra table to scan')
+@click.option('-n', '--splits', type=int, default=256, help='Number of token ranges to scan in parallel, at least one per range owned by a node (vnode)')
+@click.option('-f', '--fetch-size', type=int, default=5000, help='Rows per Cassandra page')
+@click.option('-s', '--start-block', type=int, default=None, help='Only export rows from this block number (filtered in Cassandra, the whole table is still read)')
+@click.option('-e', '--end-block', type=int, default=None, help='Only export rows up to this block number (filtered in Cassandra, the whole table is still read)')
+@click.option('-w', '--max-workers', type=int, default=10, help='Maximum number of workers')
+@click.option('--insert-mode', type=click.Choice(INSERT_MODES), default='rows', help='ClickHouse insert mode: rows, columnar or numpy')
+@click.option('--buffer-rows', type=int, default=0, help='Coalesce inserts per table up to this many rows (0 disables buffering)')
+@click.option('--buffer-bytes', type=int, default=64 * 1024 * 1024, help='Flush a table buffer once it holds about this many bytes')
+@click.option('--buffer-seconds', type=int, default=10, help='Flush a table buffer once its oldest row is this many seconds old')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='none', help='Compress data sent to ClickHouse (lz4 and zstd need the lz4 / zstd packages)')
+@click.option('--insert-setting', multiple=True, help='ClickHouse insert setting as name=value for every table or table.name=value, e.g. logs.max_insert_threads=4 (repeatable)')
+@click.option('--deduplicate', is_flag=True, default=False, help='Send a deduplication token with every insert so retried batches are skipped by ClickHouse')
+@click.option('--staging-dir', default=None, help='Stage rows as Parquet files under this directory instead of inserting them, load them with load_staged_files')
+@click.option('--staging-compression', type=click.Choice(STAGING_COMPRESSIONS), default='zstd', help='Parquet compression of staged files')
+def export_token_ranges_to_clickhouse(input, output, db_prefix, table, splits, fetch_size, start_block, end_block, max_workers, insert_mode, buffer_rows, buffer_bytes, buffer_seconds, compression, insert_setting, deduplicate, staging_dir, staging_compression):
+    logging_basic_config()
+
+    item_importer = CassandraClient(connection_url=input, keyspace_prefix=db_prefix)
+    item_exporter = create_item_exporter(connection_url=output, db_prefix=db_prefix, insert_mode=insert_mode,
+                                         buffer_max_rows=buffer_rows, buffer_max_bytes=buffer_bytes, buffer_max_seconds=buffer_seconds,
+                                         compression=compression, insert_profile=InsertProfile.parse(insert_setting), deduplicate=deduplicate,
+                                         staging_dir=staging_dir, staging_compression=staging_compression)
+
+    job = ExportTokenRanges(
+        table=table,
+        split_count=splits,
+        fetch_size=fetch_size,
+        start_block=start_block,
+        end_block=end_block,
+        max_workers=max_workers,
+        item_importer=item_importer,
+        item_exporter=item_exporter)
+
+    job.run()
@@ -0,0 +1,36 @@
+import click
+
+from utils.logging_utils import logging_basic_config
+from database.clickhouse_client import ClickhouseClient
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from jobs.load_staged_files import LoadStagedFiles
+
+TABLES = ['blocks', 'transactions', 'transaction_receipts', 'token_transfer', 'internal_transactions', 'logs']
+
+@click.command()
+@click.option('-o', '--output', required=True, help='Output database')
+@click.option('-d', '--db-prefix', default='', help='Database prefix')
+@click.option('--staging-dir', required=True, help='Directory the export commands staged Parquet files in')
+@click.option('-T', '--tables', default=','.join(TABLES), help='Comma-separated tables to load')
+@click.option('-w', '--max-workers', type=int, default=4, help='Files loaded in parallel')
+@click.option('--batch-rows', type=int, default=1000000, help='Rows per insert')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='none', help='Compress data sent to ClickHouse (lz4 and zstd need the lz4 / zstd packages)')
+@click.option('--insert-setting', multiple=True, help='ClickHouse insert setting as name=value for every table or table.name=value, e.g. logs.max_insert_threads=4 (repeatable)')
+@click.option('--deduplicate', is_flag=True, default=False, help='Send a deduplication token with every insert so retried batches are skipped by ClickHouse')
+@click.option('--delete-loaded', is_flag=True, default=False, help='Delete loaded files instead of renaming them to *.loaded')
+def load_staged_files(output, db_prefix, staging_dir, tables, max_workers, batch_rows, compression, insert_setting, deduplicate, delete_loaded):
+    """Load staged Parquet files into ClickHouse. Rerun it to retry the files that failed."""
+    logging_basic_config()
+
+    item_exporter = ClickhouseClient(connection_url=output, db_prefix=db_prefix, insert_mode='columnar',
+                                     compression=compression, insert_profile=InsertProfile.parse(insert_setting), deduplicate=deduplicate)
+
+    job = LoadStagedFiles(
+        staging_dir=staging_dir,
+        tables=[table.strip() for table in tables.split(',') if table.strip()],
+        item_exporter=item_exporter,
+        max_workers=max_workers,
+        batch_rows=batch_rows,
+        delete_loaded=delete_loaded)
+
+    job.run()
\ No newline at end of file
@@ -0,0 +1,49 @@
+import click
+
+from utils.logging_utils import logging_basic_config
+from utils.block_range_utils import parse_block_ranges, merge_ranges, iter_block_number_chunks
+from database.cassandra_client import CassandraClient
+from database.clickhouse_client import ClickhouseClient, INSERT_MODES
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from streaming.adapter_factory import ADAPTERS, create_adapter
+
+@click.command()
+@click.option('-i', '--input', required=True, help='Input database')
+@click.option('-o', '--output', required=True, help='Output database')
+@click.option('-d', '--db-prefix', default='', help='Database prefix')
+@click.option('-S', '--stream', required=True, type=click.Choice(sorted(ADAPTERS)), help='Stream to re-export')
+@click.option('-f', '--ranges-file', type=click.File('r'), default='-', help='File of start-end ranges or block numbers, e.g. the repair file of verify (default: stdin)')
+@click.option('-b', '--batch-size', type=int, default=100, help='Batch size')
+@click.option('-w', '--max-workers', type=int, default=10, help='Maximum number of workers')
+@click.option('--tx-partitions', type=int, default=100, help='Transaction partitions')
+@click.option('--log-partitions', type=int, default=100, help='Log partitions')
+@click.option('--block-partitions', type=int, default=10000, help='Block partitions')
+@click.option('--insert-mode', type=click.Choice(INSERT_MODES), default='rows', help='ClickHouse insert mode: rows, columnar or numpy')
+@click.option('--buffer-rows', type=int, default=0, help='Coalesce inserts per table up to this many rows (0 disables buffering)')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='none', help='Compress data sent to ClickHouse (lz4 and zstd need the lz4 / zstd packages)')
+@click.option('--insert-setting', multiple=True, help='ClickHouse insert setting as name=value for every table or table.name=value, e.g. logs.max_insert_threads=4 (repeatable)')
+def repair(input, output, db_prefix, stream, ranges_file, batch_size, max_workers, tx_partitions, log_partitions, block_partitions, insert_mode, buffer_rows, compression, insert_setting):
+    """Re-export the listed block ranges in one run, without touching last_synced_block.txt."""
+    logging_basic_config()
+
+    block_ranges = merge_ranges(parse_block_ranges(ranges_file))
+    if not block_ranges:
+        click.echo('No block ranges to repair')
+        return
+    total_blocks = sum(end_block - start_block + 1 for start_block, end_block in block_ranges)
+    click.echo(f'Repairing {total_blocks} blocks of {stream} in {len(block_ranges)} ranges')
+
+    item_importer = CassandraClient(connection_url=input, keyspace_prefix=db_prefix, tx_partitions=tx_partitions, log_partitions=log_partitions, block_partitions=block_partitions)
+    item_exporter = ClickhouseClient(connection_url=output, db_prefix=db_prefix, insert_mode=insert_mode, buffer_max_rows=buffer_rows,
+                                     compression=compression, insert_profile=InsertProfile.parse(insert_setting))
+
+    adapter = create_adapter(stream, item_importer=item_importer, item_exporter=item_exporter,
+                             batch_size=batch_size, max_workers=max_workers)
+    adapter.open()
+    try:
+        # Sorted chunks keep each batch within as few Cassandra buckets as possible and bound
+        # memory, while a chunk still holds a batch for every worker
+        for block_numbers in iter_block_number_chunks(block_ranges, batch_size * max_workers):
+            adapter.export_block_numbers(block_numbers)
+    finally:
+        adapter.close()
@@ -0,0 +1,121 @@
+import click
+
+from utils.logging_utils import logging_basic_config
+from utils.completed_ranges import CompletedRanges
+from database.cassandra_client import CassandraClient
+from database.clickhouse_client import INSERT_MODES
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from database.clickhouse_file_exporter import STAGING_COMPRESSIONS
+from database.exporter_factory import create_item_exporter
+from streaming.adapter_factory import create_adapter
+from streaming.streamer import Streamer, completed_ranges_file, stream_last_synced_block_file
+from streaming.sharded_streamer import ShardedStreamer
+from streaming.reorg_detector import ReorgDetector, STREAM_TABLES
+
+# Options of every stream export command, in the order --help lists them
+STREAM_OPTIONS = [
+    click.option('-i', '--input', required=True, help='Input database'),
+    click.option('-o', '--output', required=True, help='Output database, or comma-separated URLs of replicas to fail over between'),
+    click.option('-d', '--db-prefix', default='', help='Database prefix'),
+    click.option('-s', '--start-block', type=int, default=None, help='Starting block number, omit it to resume from last_synced_block.<stream>.txt (a new run starts at block 0)'),
+    click.option('-e', '--end-block', type=int, default=None, help='Ending block number, omit it to keep following the chain head'),
+    click.option('--lag', type=int, default=0, help='Stay this many blocks behind the newest block in Cassandra'),
+    click.option('--period-seconds', type=int, default=10, help='Seconds to sleep when caught up with the chain head'),
+    click.option('--reorg-depth', type=int, default=0, help='Watch this many recent blocks for chain reorganizations and re-export from the fork (0 disables, not used with --processes)'),
+    click.option('-b', '--batch-size', type=int, default=1000, help='Batch size'),
+    click.option('-w', '--max-workers', type=int, default=10, help='Maximum number of workers'),
+    click.option('-c', '--chain-id', type=int, default=1, help='Chain ID'),
+    click.option('-t', '--tx-partitions', type=int, default=100, help='Transaction partitions'),
+    click.option('-l', '--log-partitions', type=int, default=100, help='Log partitions'),
+    click.option('-p', '--block-partitions', type=int, default=10000, help='Block partitions'),
+    click.option('--insert-mode', type=click.Choice(INSERT_MODES), default='rows', help='ClickHouse insert mode: rows, columnar or numpy'),
+    click.option('--buffer-rows', type=int, default=0, help='Coalesce inserts per table up to this many rows (0 disables buffering)'),
+    click.option('--buffer-bytes', type=int, default=64 * 1024 * 1024, help='Flush a table buffer once it holds about this many bytes'),
+    click.option('--buffer-seconds', type=int, default=10, help='Flush a table buffer once its oldest row is this many seconds old, and checkpoint at most this often while buffering'),
+    click.option('--pool-size', type=int, default=16, help='Maximum ClickHouse connections shared by all workers'),
+    click.option('--compression', type=click.Choice(COMPRESSIONS), default='none', help='Compress data sent to ClickHouse (lz4 and zstd need the lz4 / zstd packages)'),
+    click.option('--insert-setting', multiple=True, help='ClickHouse insert setting as name=value for every table or table.name=value, e.g. logs.max_insert_threads=4 (repeatable)'),
+    click.option('--deduplicate', is_flag=True, default=False, help='Send a deduplication token with every insert so retried batches are skipped by ClickHouse'),
+    click.option('--staging-dir', default=None, help='Stage rows as Parquet files under this directory instead of inserting them, load them with load_staged_files'),
+    click.option('--staging-compression', type=click.Choice(STAGING_COMPRESSIONS), default='zstd', help='Parquet compression of staged files'),
+    click.option('--batch-rows', type=int, default=None, help='Size batches by estimated rows instead of blocks, aiming at this many rows per batch'),
+    click.option('--adaptive', is_flag=True, default=False, help='Tune batch size and concurrency while running, starting from -b and -w'),
+    click.option('--processes', type=int, default=1, help='Split the block range into this many shards, each exported by its own process; reruns resume the shard plan saved in last_synced_block.<stream>.shards.json'),
+]
+
+PIPELINE_WORKERS_OPTION = click.option('--pipeline-workers', type=(int, int, int), default=None, help='Run reader, transformer and writer stages with these pool sizes, e.g. 4 2 4')
+
+
+def stream_options(command):
+    """Add STREAM_OPTIONS to a command, which passes them on to run_stream as keyword arguments"""
+    for option in reversed(STREAM_OPTIONS):
+        command = option(command)
+    return command
+
+
+def run_stream(stream_id, adapter_kwargs, input, output, db_prefix, start_block, end_block, lag, period_seconds, reorg_depth, batch_size, max_workers, chain_id, tx_partitions, log_partitions, block_partitions, insert_mode, buffer_rows, buffer_bytes, buffer_seconds, pool_size, compression, insert_setting, deduplicate, staging_dir, staging_compression, batch_rows, adaptive, processes, reorg_tables=None):
+    """Export stream_id with the adapter of adapter_factory, given adapter_kwargs on top of the
+    batch options, in one Streamer or, with processes, in a ShardedStreamer"""
+    logging_basic_config()
+    # The adaptive controller and the asyncio engine need several batches in flight per sync cycle
+    asyncio_engine = adapter_kwargs.get('engine') == 'asyncio'
+    sync_batch_size = batch_size * max_workers if adaptive or asyncio_engine else batch_size
+
+    importer_kwargs = dict(connection_url=input, keyspace_prefix=db_prefix, tx_partitions=tx_partitions, log_partitions=log_partitions, block_partitions=block_partitions)
+    exporter_kwargs = dict(connection_url=output, db_prefix=db_prefix, insert_mode=insert_mode,
+                           buffer_max_rows=buffer_rows, buffer_max_bytes=buffer_bytes, buffer_max_seconds=buffer_seconds, pool_size=pool_size,
+                           compression=compression, insert_profile=InsertProfile.parse(insert_setting), deduplicate=deduplicate,
+                           staging_dir=staging_dir, staging_compression=staging_compression,
+                           # Streamer flushes at its checkpoints, so buffered inserts span several jobs
+                           flush_on_close=False)
+    checkpoint_seconds = buffer_seconds if buffer_rows else 0
+    if asyncio_engine:
+        # The asyncio engine neither tunes nor sizes its batches
+        adapter_kwargs = dict(adapter_kwargs, batch_size=batch_size, max_workers=max_workers)
+    else:
+        adapter_kwargs = dict(adapter_kwargs, batch_size=batch_size, max_workers=max_workers, adaptive=adaptive, batch_rows=batch_rows)
+
+    if processes > 1:
+        sharded_streamer = ShardedStreamer(
+            stream_id=stream_id,
+            start_block=start_block if start_block is not None else 0,
+            end_block=end_block,
+            processes=processes,
+            lag=lag,
+            importer_kwargs=importer_kwargs,
+            exporter_kwargs=exporter_kwargs,
+            adapter_kwargs=adapter_kwargs,
+            block_batch_size=sync_batch_size,
+            shard_alignment=block_partitions,
+            checkpoint_seconds=checkpoint_seconds
+        )
+        sharded_streamer.stream()
+        return
+
+    last_synced_block_file = stream_last_synced_block_file(stream_id)
+    item_importer = CassandraClient(**importer_kwargs)
+    item_exporter = create_item_exporter(**exporter_kwargs)
+
+    completed_ranges = CompletedRanges(completed_ranges_file(last_synced_block_file))
+    reorg_detector = ReorgDetector(item_importer, item_exporter, reorg_tables or STREAM_TABLES[stream_id],
+                                   depth=reorg_depth) if reorg_depth else None
+    adapter = create_adapter(stream_id, item_importer=item_importer, item_exporter=item_exporter,
+                             completed_ranges=completed_ranges, **adapter_kwargs)
+
+    streamer = Streamer(
+        blockchain_streamer_adapter=adapter,
+        last_synced_block_file=last_synced_block_file,
+        lag=lag,
+        start_block=start_block,
+        end_block=end_block,
+        period_seconds=period_seconds,
+        block_batch_size=sync_batch_size,
+        stream_id=stream_id,
+        exporter=item_exporter,
+        chain_id=chain_id,
+        completed_ranges=completed_ranges,
+        reorg_detector=reorg_detector,
+        checkpoint_seconds=checkpoint_seconds
+    )
+
+    streamer.stream()
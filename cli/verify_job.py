@@ -0,0 +1,51 @@
+import sys
+
+import click
+
+from utils.logging_utils import logging_basic_config
+from database.cassandra_client import CassandraClient
+from database.clickhouse_client import ClickhouseClient
+from jobs.verify_ranges import VerifyRanges, VERIFY_KEYS, write_repair_file
+
+@click.command()
+@click.option('-i', '--input', required=True, help='Input database')
+@click.option('-o', '--output', required=True, help='Output database')
+@click.option('-d', '--db-prefix', default='', help='Database prefix')
+@click.option('-T', '--table', required=True, type=click.Choice(sorted(VERIFY_KEYS)), help='Table to verify')
+@click.option('-s', '--start-block', type=int, required=True, help='Starting block number')
+@click.option('-e', '--end-block', type=int, required=True, help='Ending block number')
+@click.option('--range-size', type=int, default=10000, help='Blocks per checksummed range')
+@click.option('--min-range-size', type=int, default=100, help='Stop halving mismatched ranges at this many blocks')
+@click.option('--repair-file', default='repair_ranges.txt', help='File receiving the mismatched ranges, one start-end per line, for repair (which cannot remove rows only ClickHouse has)')
+@click.option('-w', '--max-workers', type=int, default=10, help='Maximum number of workers')
+@click.option('--tx-partitions', type=int, default=100, help='Transaction partitions')
+@click.option('--log-partitions', type=int, default=100, help='Log partitions')
+@click.option('--block-partitions', type=int, default=10000, help='Block partitions')
+def verify(input, output, db_prefix, table, start_block, end_block, range_size, min_range_size, repair_file, max_workers, tx_partitions, log_partitions, block_partitions):
+    """Compare per-range row counts and key checksums of a table between Cassandra and ClickHouse.
+    Exits with status 1 when ranges differ, after writing them to --repair-file.
+
+    repair re-exports those ranges from Cassandra, which fixes rows missing or stale in
+    ClickHouse but not rows ClickHouse has in excess, e.g. of blocks since removed from
+    Cassandra: such ranges keep mismatching until those rows are deleted."""
+    logging_basic_config()
+
+    item_importer = CassandraClient(connection_url=input, keyspace_prefix=db_prefix, tx_partitions=tx_partitions, log_partitions=log_partitions, block_partitions=block_partitions)
+    item_exporter = ClickhouseClient(connection_url=output, db_prefix=db_prefix)
+
+    job = VerifyRanges(
+        table=table,
+        start_block=start_block,
+        end_block=end_block,
+        item_importer=item_importer,
+        item_exporter=item_exporter,
+        max_workers=max_workers,
+        range_size=range_size,
+        min_range_size=min_range_size)
+    job.run()
+
+    write_repair_file(repair_file, job.mismatched_ranges)
+    if job.mismatched_ranges:
+        click.echo(f'{len(job.mismatched_ranges)} mismatched ranges written to {repair_file}')
+        sys.exit(1)
+    click.echo(f'{table} matches from {start_block} to {end_block}')
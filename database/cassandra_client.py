@@ -1,27 +1,169 @@
+import asyncio
 import logging
+import queue
 import sys
+import threading
+import time
 
 from cassandra.auth import PlainTextAuthProvider
-from cassandra.cluster import Cluster
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.metadata import Murmur3Token
+from cassandra.policies import TokenAwarePolicy, DCAwareRoundRobinPolicy
+from cassandra.query import SimpleStatement, tuple_factory
 from utils.parse_cassandra_connection_elements import parse_cassandra_connection_elements
 from configs.config import CassandraConfig
-from utils.db_utils import round_timestamp, round_number
+from utils.db_utils import round_timestamp
 
 logger = logging.getLogger('Cassandra Client')
 
+MURMUR3_MIN_TOKEN = -2 ** 63
+MURMUR3_MAX_TOKEN = 2 ** 63 - 1
+
+TRANSACTION_RECEIPT_COLUMNS = ['block_number', 'hash', 'receipt_contract_address', 'receipt_cumulative_gas_used',
+                               'receipt_gas_used', 'receipt_root', 'receipt_status', 'transaction_index', 'type']
+
+# Execution profile for the streaming readers, which hand pages of plain tuples
+# plus their column names to ClickhouseClient instead of namedtuples/dicts
+EXEC_PROFILE_TUPLES = 'tuples'
+
+class ConcurrentFetch:
+    """Collects the rows of many execute_async requests, blocking submit() once
+    max_in_flight requests are outstanding. Follow-up pages are fetched from the
+    driver callbacks so a request only frees its slot after its last page."""
+    def __init__(self, max_in_flight):
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._rows = []
+        self._error = None
+
+    def submit(self, session, statement, params):
+        self._semaphore.acquire()
+        with self._condition:
+            if self._error is not None:
+                self._semaphore.release()
+                return
+            self._pending += 1
+        try:
+            future = session.execute_async(statement, params)
+        except Exception:
+            # Raised before any callback could free the slot, e.g. NoHostAvailable
+            self._finish()
+            raise
+        future.add_callbacks(self._on_page, self._on_error, callback_args=(future,), errback_args=(future,))
+
+    def _on_page(self, rows, future):
+        with self._condition:
+            self._rows.extend(rows)
+        if future.has_more_pages:
+            future.start_fetching_next_page()
+        else:
+            self._finish()
+
+    def _on_error(self, error, future):
+        with self._condition:
+            if self._error is None:
+                self._error = error
+        self._finish()
+
+    def _finish(self):
+        self._semaphore.release()
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify_all()
+
+    def result(self):
+        with self._condition:
+            while self._pending > 0:
+                self._condition.wait()
+        if self._error is not None:
+            raise self._error
+        return self._rows
+
+
+async def iter_pages_async(response_future, column_names):
+    """Bridge a driver ResponseFuture into the running event loop, yielding
+    (column_names, tuple_rows) pages. The next page is only requested once the
+    consumer comes back for it, so a slow writer holds back its reader."""
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue()
+    response_future.add_callbacks(
+        lambda rows: loop.call_soon_threadsafe(pages.put_nowait, (rows, None)),
+        lambda error: loop.call_soon_threadsafe(pages.put_nowait, (None, error)))
+    while True:
+        rows, error = await pages.get()
+        if error is not None:
+            raise error
+        has_more_pages = response_future.has_more_pages
+        if rows:
+            yield column_names, rows
+        if not has_more_pages:
+            return
+        response_future.start_fetching_next_page()
+
+
+def iter_pages_concurrently(session, bound_statements, column_names, max_in_flight):
+    """Yield (column_names, tuple_rows) pages of many bound statements as they arrive,
+    with at most max_in_flight of them executing at once. As in iter_pages_async, the
+    next page of a statement is only requested once its previous page has been taken,
+    so no more than max_in_flight pages are held at a time."""
+    pages = queue.Queue()
+    statements = iter(bound_statements)
+
+    def start_next():
+        bound_statement = next(statements, None)
+        if bound_statement is None:
+            return False
+        future = session.execute_async(bound_statement, execution_profile=EXEC_PROFILE_TUPLES)
+        future.add_callbacks(lambda rows, future: pages.put((future, rows, None)),
+                             lambda error, future: pages.put((future, None, error)),
+                             callback_args=(future,), errback_args=(future,))
+        return True
+
+    in_flight = 0
+    while in_flight < max_in_flight and start_next():
+        in_flight += 1
+    while in_flight > 0:
+        future, rows, error = pages.get()
+        if error is not None:
+            raise error
+        has_more_pages = future.has_more_pages
+        if rows:
+            yield column_names, rows
+        if has_more_pages:
+            future.start_fetching_next_page()
+        elif not start_next():
+            in_flight -= 1
+
+
 class CassandraClient:
-    def __init__(self, connection_url=None, keyspace_prefix=None, block_partitions = 10000, tx_partitions = 100, log_partitions = 100):
+    def __init__(self, connection_url=None, keyspace_prefix=None, block_partitions = 10000, tx_partitions = 100, log_partitions = 100, max_concurrent_requests=32, fetch_size=5000, head_cache_seconds=5):
         if not connection_url:
             connection_url = CassandraConfig.CONNECTION_URL
         
         self.block_partitions = block_partitions
         self.tx_partitions = tx_partitions
         self.log_partitions = log_partitions
+        self.max_concurrent_requests = max_concurrent_requests
+        self.fetch_size = fetch_size
+        self._prepared_statements = {}
+        self._prepare_lock = threading.Lock()
+        self.head_cache_seconds = head_cache_seconds
+        self._head_lock = threading.Lock()
+        self._head_bucket = None
+        self._head_block = None
+        self._head_read_at = 0
         try:
             host, port, username, password = parse_cassandra_connection_elements(connection_url)
             self.connection_url = f'{host}:{port}'
             auth_provider = PlainTextAuthProvider(username=username, password=password)
-            self._cluster = Cluster([host], port=port, auth_provider=auth_provider, connect_timeout=10)
+            # Token-aware routing sends each single-partition statement to one of its replicas
+            profile = ExecutionProfile(load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy()))
+            tuples_profile = ExecutionProfile(load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy()),
+                                              row_factory=tuple_factory)
+            self._cluster = Cluster([host], port=port, auth_provider=auth_provider, connect_timeout=10,
+                                    execution_profiles={EXEC_PROFILE_DEFAULT: profile,
+                                                        EXEC_PROFILE_TUPLES: tuples_profile})
             self._session = self._cluster.connect()
             logger.info(f'Successfully connected to Cassandra')                
         except Exception as err:
@@ -39,104 +181,336 @@ class CassandraClient:
     def close(self):
         pass
         
+    def _prepare(self, query):
+        """Prepared statements are cached by query text so each query is parsed once per session"""
+        statement = self._prepared_statements.get(query)
+        if statement is None:
+            with self._prepare_lock:
+                statement = self._prepared_statements.get(query)
+                if statement is None:
+                    statement = self._session.prepare(query)
+                    self._prepared_statements[query] = statement
+        return statement
+
+    @staticmethod
+    def _group_by_bucket(numbers, partitions):
+        buckets = {}
+        for number in numbers:
+            number = int(number)
+            buckets.setdefault(round_timestamp(number, partitions), []).append(number)
+        return buckets
+
+    def _execute_per_bucket(self, query, params_list):
+        """Fire one single-partition query per bucket with execute_async, keeping at most
+        max_concurrent_requests in flight, and merge pages as they arrive"""
+        statement = self._prepare(query)
+        fetch = ConcurrentFetch(self.max_concurrent_requests)
+        for params in params_list:
+            fetch.submit(self._session, statement, params)
+        rows = fetch.result()
+        return [row._asdict() for row in rows]
+
+    def _stream_per_bucket(self, query, params_list):
+        """Page through the bucket queries with up to max_concurrent_requests of them in
+        flight, yielding one (column_names, tuple_rows) page at a time, so memory is
+        bounded by max_concurrent_requests pages of fetch_size rows"""
+        statement = self._prepare(query)
+        column_names = [column[2] for column in statement.result_metadata]
+        bound_statements = []
+        for params in params_list:
+            bound_statement = statement.bind(params)
+            bound_statement.fetch_size = self.fetch_size
+            bound_statements.append(bound_statement)
+        return iter_pages_concurrently(self._session, bound_statements, column_names, self.max_concurrent_requests)
+
+    @staticmethod
+    def _iter_pages(response):
+        while True:
+            rows = response.current_rows
+            if rows:
+                yield response.column_names, rows
+            if not response.has_more_pages:
+                break
+            response.fetch_next_page()
+
+    def _blocks_query(self, columns='*'):
+        return f"""
+                    SELECT {columns} FROM {self.keyspace}.blocks
+                    WHERE bucket_id = ?
+                    AND number IN ?
+                    ALLOW FILTERING;
+                """
+
+    def _block_number_in_query(self, table, columns='*'):
+        return f"""
+                SELECT {columns} FROM {self.keyspace}.{table}
+                WHERE bucket_id = ?
+                AND block_number IN ?;
+            """
+
+    def _logs_query(self, columns='*'):
+        return f"""
+                SELECT {columns} FROM {self.keyspace}.logs
+                WHERE bucket_id = ?
+                AND block_number >= ? AND block_number <= ?;
+            """
+
+    def _receipts_query(self):
+        return self._block_number_in_query('transactions', ', '.join(TRANSACTION_RECEIPT_COLUMNS))
+
+    def _bucket_params(self, numbers, partitions):
+        return list(self._group_by_bucket(numbers, partitions).items())
+
+    def _logs_params(self, start_block, end_block):
+        start_buck_id = round_timestamp(start_block, self.log_partitions)
+        end_buck_id = round_timestamp(end_block, self.log_partitions)
+        return [(bucket_id, int(start_block), int(end_block))
+                for bucket_id in range(start_buck_id, end_buck_id + 1, self.log_partitions)]
+
     def get_blocks_data(self, numbers):
         if not numbers:
             return
-        bucket_ids = [str(round_timestamp(i, self.block_partitions)) for i in numbers]
-        bucket_ids = set(bucket_ids)
-        string_buck_id = ','.join(bucket_ids)
-        string_numbers = ','.join(str(i) for i in numbers)
-        query = f"""
-                    SELECT * FROM {self.keyspace}.blocks
-                    WHERE  bucket_id IN ({string_buck_id})
-                    AND number IN ({string_numbers})
-                    ALLOW FILTERING;
-                """
-        response = self._session.execute(query).all()
-        blocks = [block._asdict() for block in response]
-        return blocks
-    
+        return self._execute_per_bucket(self._blocks_query(), self._bucket_params(numbers, self.block_partitions))
+
     def get_transactions_data(self, numbers):
         if not numbers:
             return
-        bucket_ids = [str(round_timestamp(i, self.tx_partitions)) for i in numbers]
-        bucket_ids = set(bucket_ids)
-        string_buck_id = ','.join(bucket_ids)
-        string_numbers = ','.join(str(i) for i in numbers)
-        query = f"""
-                SELECT * FROM {self.keyspace}.transactions
-                WHERE bucket_id IN ({string_buck_id})
-                AND block_number IN ({string_numbers});
-            """
-        response = self._session.execute(query).all()
-        transactions = [transaction._asdict() for transaction in response]
-        return transactions
-    
+        return self._execute_per_bucket(self._block_number_in_query('transactions'), self._bucket_params(numbers, self.tx_partitions))
+
     def get_logs_data(self, start_block, end_block):
-        start_buck_id = round_timestamp(start_block, self.log_partitions)
-        end_buck_id = round_timestamp(end_block, self.log_partitions)
-        if start_buck_id < end_buck_id:
-            string_buck_id = ','.join(set(str(i) for i in range(start_buck_id, end_buck_id + self.log_partitions, self.log_partitions)))
-            query = f"""
-                    SELECT * FROM {self.keyspace}.logs
-                    WHERE bucket_id IN ({string_buck_id})
-                    AND block_number >= {start_block} AND block_number <= {end_block}
-                """
-        else:
-            query = f"""
-                    SELECT * FROM {self.keyspace}.logs
-                    WHERE bucket_id = {start_buck_id}
-                    AND block_number >= {start_block} AND block_number <= {end_block}
-                """
-        response = self._session.execute(query).all()
-        logs = [log._asdict() for log in response]
-        return logs
+        return self._execute_per_bucket(self._logs_query(), self._logs_params(start_block, end_block))
 
     def get_token_transfers_data(self, numbers):
         if not numbers:
             return
-        bucket_ids = [str(round_timestamp(i, self.tx_partitions)) for i in numbers]
-        bucket_ids = set(bucket_ids)
-        string_buck_id = ','.join(bucket_ids)
-        string_numbers = ','.join(str(i) for i in numbers)
-        query = f"""
-                SELECT * FROM {self.keyspace}.token_transfer
-                WHERE bucket_id IN ({string_buck_id})
-                AND block_number IN ({string_numbers});
-            """
-        response = self._session.execute(query).all()
-        token_transfers = [token_transfer._asdict() for token_transfer in response]
-        return token_transfers
+        return self._execute_per_bucket(self._block_number_in_query('token_transfer'), self._bucket_params(numbers, self.tx_partitions))
 
     def get_internal_transactions_data(self, numbers):
         if not numbers:
             return
-        bucket_ids = [str(round_timestamp(i, self.tx_partitions)) for i in numbers]
-        bucket_ids = set(bucket_ids)
-        string_buck_id = ','.join(bucket_ids)
-        string_numbers = ','.join(str(i) for i in numbers)
-        query = f"""
-                SELECT * FROM {self.keyspace}.internal_transactions
-                WHERE bucket_id IN ({string_buck_id})
-                AND block_number IN ({string_numbers});
-            """
-        response = self._session.execute(query).all()
-        internal_transactions = [internal_transaction._asdict() for internal_transaction in response]
-        return internal_transactions
+        return self._execute_per_bucket(self._block_number_in_query('internal_transactions'), self._bucket_params(numbers, self.tx_partitions))
 
     def get_transaction_receipts_data(self, numbers):
         if not numbers:
             return
-        bucket_ids = [str(round_timestamp(i, self.tx_partitions)) for i in numbers]
-        bucket_ids = set(bucket_ids)
-        string_buck_id = ','.join(bucket_ids)
-        string_numbers = ','.join(str(i) for i in numbers)
-        query = f"""
-                SELECT block_number, hash, receipt_contract_address, receipt_cumulative_gas_used, receipt_gas_used, receipt_root, receipt_status, transaction_index, type
-                FROM {self.keyspace}.transactions
-                WHERE bucket_id IN ({string_buck_id})
-                AND block_number IN ({string_numbers});
-            """
-        response = self._session.execute(query).all()
-        transaction_receipts = [transaction_receipt._asdict() for transaction_receipt in response]
-        return transaction_receipts
\ No newline at end of file
+        return self._execute_per_bucket(self._receipts_query(), self._bucket_params(numbers, self.tx_partitions))
+
+    def _entity_query(self, entity):
+        """The query and bucket size stream_<entity>_data uses"""
+        if entity == 'blocks':
+            return self._blocks_query(), self.block_partitions
+        if entity == 'transaction_receipts':
+            return self._receipts_query(), self.tx_partitions
+        tables = {'transactions': 'transactions', 'token_transfers': 'token_transfer',
+                  'internal_transactions': 'internal_transactions'}
+        return self._block_number_in_query(tables[entity]), self.tx_partitions
+
+    def entity_statements(self, entity, numbers):
+        """One bound statement per bucket, for callers scheduling the reads themselves"""
+        query, partitions = self._entity_query(entity)
+        statement = self._prepare(query)
+        bound_statements = []
+        for params in self._bucket_params(numbers, partitions):
+            bound_statement = statement.bind(params)
+            bound_statement.fetch_size = self.fetch_size
+            bound_statements.append(bound_statement)
+        return bound_statements
+
+    def stream_pages_async(self, bound_statement):
+        """Async generator of (column_names, tuple_rows) pages of one bound statement"""
+        column_names = [column[2] for column in bound_statement.prepared_statement.result_metadata]
+        response_future = self._session.execute_async(bound_statement, execution_profile=EXEC_PROFILE_TUPLES)
+        return iter_pages_async(response_future, column_names)
+
+    def get_transaction_counts(self, numbers):
+        """Map block number -> transaction_count with a narrow read of the blocks table"""
+        if not numbers:
+            return {}
+        rows = self._execute_per_bucket(self._blocks_query('number, transaction_count'),
+                                        self._bucket_params(numbers, self.block_partitions))
+        return {int(row['number']): int(row['transaction_count'] or 0) for row in rows}
+
+    def get_block_hashes(self, numbers):
+        """(number, hash, parent_hash) of blocks, with a narrow read of the blocks table"""
+        if not numbers:
+            return []
+        return self._execute_per_bucket(self._blocks_query('number, hash, parent_hash'),
+                                        self._bucket_params(numbers, self.block_partitions))
+
+    def stream_block_range_columns(self, table, columns, start_block, end_block):
+        """(column_names, tuple_rows) pages of a few columns of table for [start_block, end_block],
+        e.g. the key columns checksummed by verify"""
+        columns = ', '.join(columns)
+        if table == 'logs':
+            return self._stream_per_bucket(self._logs_query(columns), self._logs_params(start_block, end_block))
+        numbers = range(start_block, end_block + 1)
+        if table == 'blocks':
+            return self._stream_per_bucket(self._blocks_query(columns), self._bucket_params(numbers, self.block_partitions))
+        return self._stream_per_bucket(self._block_number_in_query(table, columns), self._bucket_params(numbers, self.tx_partitions))
+
+    def get_table_ids(self):
+        """Map table id (the uuid commit log mutations refer to) -> table name of the keyspace"""
+        rows = self._session.execute('SELECT table_name, id FROM system_schema.tables WHERE keyspace_name = %s;',
+                                     (self.keyspace,))
+        return {row.id: row.table_name for row in rows}
+
+    def get_latest_block_number(self):
+        """Highest block number ingested into the blocks table, cached for head_cache_seconds.
+
+        The first call finds the newest bucket from the distinct bucket ids. Later calls
+        gallop forward from the bucket of the previous head, then binary search for the
+        last non-empty bucket, so following the head costs a few single-partition reads.
+        Returns -1 while the table is empty."""
+        with self._head_lock:
+            if self._head_block is not None and time.time() - self._head_read_at < self.head_cache_seconds:
+                return self._head_block
+            if self._head_bucket is None:
+                self._head_bucket = self._newest_block_bucket()
+            else:
+                self._head_bucket = self._gallop_block_buckets(self._head_bucket)
+            if self._head_bucket is None:
+                head_block = -1
+            else:
+                head_block = self._max_block_in_bucket(self._head_bucket)
+                if head_block is None:
+                    # The cached bucket was emptied, look for the newest one again
+                    self._head_bucket = self._newest_block_bucket()
+                    head_block = -1 if self._head_bucket is None else self._max_block_in_bucket(self._head_bucket)
+            self._head_block = head_block
+            self._head_read_at = time.time()
+            return head_block
+
+    def _newest_block_bucket(self):
+        rows = self._session.execute(SimpleStatement(f'SELECT DISTINCT bucket_id FROM {self.keyspace}.blocks;',
+                                                     fetch_size=self.fetch_size))
+        bucket_ids = [row[0] for row in rows]
+        return max(bucket_ids) if bucket_ids else None
+
+    def _gallop_block_buckets(self, bucket_id):
+        """Last non-empty bucket at or after bucket_id, assuming buckets fill up in order"""
+        step = 1
+        while self._block_bucket_exists(bucket_id + step * self.block_partitions):
+            bucket_id += step * self.block_partitions
+            step *= 2
+        # bucket_id is non-empty, bucket_id + step buckets is empty
+        low, high = 0, step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self._block_bucket_exists(bucket_id + middle * self.block_partitions):
+                low = middle
+            else:
+                high = middle
+        return bucket_id + low * self.block_partitions
+
+    def _block_bucket_exists(self, bucket_id):
+        query = self._prepare(f'SELECT number FROM {self.keyspace}.blocks WHERE bucket_id = ? LIMIT 1;')
+        return self._session.execute(query, (bucket_id,)).one() is not None
+
+    def _max_block_in_bucket(self, bucket_id):
+        # A reversed clustering-order read stops at the first row, max(number) reads the whole partition
+        query = self._prepare(f'SELECT number FROM {self.keyspace}.blocks WHERE bucket_id = ? ORDER BY number DESC LIMIT 1;')
+        row = self._session.execute(query, (bucket_id,)).one()
+        return int(row[0]) if row is not None and row[0] is not None else None
+
+    def stream_blocks_data(self, numbers):
+        if not numbers:
+            return iter(())
+        return self._stream_per_bucket(self._blocks_query(), self._bucket_params(numbers, self.block_partitions))
+
+    def stream_transactions_data(self, numbers):
+        if not numbers:
+            return iter(())
+        return self._stream_per_bucket(self._block_number_in_query('transactions'), self._bucket_params(numbers, self.tx_partitions))
+
+    def stream_logs_data(self, start_block, end_block):
+        return self._stream_per_bucket(self._logs_query(), self._logs_params(start_block, end_block))
+
+    def stream_token_transfers_data(self, numbers):
+        if not numbers:
+            return iter(())
+        return self._stream_per_bucket(self._block_number_in_query('token_transfer'), self._bucket_params(numbers, self.tx_partitions))
+
+    def stream_internal_transactions_data(self, numbers):
+        if not numbers:
+            return iter(())
+        return self._stream_per_bucket(self._block_number_in_query('internal_transactions'), self._bucket_params(numbers, self.tx_partitions))
+
+    def stream_transaction_receipts_data(self, numbers):
+        if not numbers:
+            return iter(())
+        return self._stream_per_bucket(self._receipts_query(), self._bucket_params(numbers, self.tx_partitions))
+
+    def split_token_ring(self, split_count):
+        """Split the Murmur3 token ring into contiguous (start, end] ranges that follow the
+        ring's token boundaries, so every range is owned by one set of replicas. Each owned
+        range is subdivided in proportion to its width, for about split_count ranges in
+        total but at least one per owned range, e.g. one per vnode."""
+        split_count = max(int(split_count), 1)
+        ring_size = MURMUR3_MAX_TOKEN - MURMUR3_MIN_TOKEN
+        boundaries = self._ring_boundaries()
+        token_ranges = []
+        for start_token, end_token in zip(boundaries, boundaries[1:]):
+            pieces = max(round(split_count * (end_token - start_token) / ring_size), 1)
+            token_ranges.extend(split_token_range(start_token, end_token, pieces))
+        return token_ranges
+
+    def _ring_boundaries(self):
+        """Sorted tokens of the ring between the minimum and maximum token. The range that
+        wraps around the ring is cut in two at the minimum token, both halves have the
+        same owner. Without token metadata the ring is split uniformly."""
+        token_map = self._cluster.metadata.token_map
+        tokens = sorted({token.value for token in token_map.ring}) if token_map is not None else []
+        return [MURMUR3_MIN_TOKEN] + [token for token in tokens if MURMUR3_MIN_TOKEN < token < MURMUR3_MAX_TOKEN] \
+            + [MURMUR3_MAX_TOKEN]
+
+    def _get_token_range_replica(self, end_token):
+        token_map = self._cluster.metadata.token_map
+        if token_map is None:
+            return None
+        replicas = token_map.get_replicas(self.keyspace, Murmur3Token(end_token))
+        for replica in replicas:
+            if replica.is_up:
+                return replica
+        return None
+
+    def scan_token_range(self, table, start_token, end_token, fetch_size=None, block_column=None,
+                         start_block=None, end_block=None):
+        """Page through every row of table whose partition token falls in (start_token, end_token].
+        Yields one (column_names, tuple_rows) pair per driver page.
+
+        start_block/end_block filter on block_column in Cassandra (ALLOW FILTERING): the
+        replica still reads every partition of the range but only returns matching rows."""
+        conditions = ['token(bucket_id) > %s', 'token(bucket_id) <= %s']
+        params = [start_token, end_token]
+        if start_block is not None:
+            conditions.append(f'{block_column} >= %s')
+            params.append(int(start_block))
+        if end_block is not None:
+            conditions.append(f'{block_column} <= %s')
+            params.append(int(end_block))
+        filtering = ' ALLOW FILTERING' if len(conditions) > 2 else ''
+        query = SimpleStatement(
+            f"""
+                SELECT * FROM {self.keyspace}.{table}
+                WHERE {' AND '.join(conditions)}{filtering};
+            """,
+            fetch_size=fetch_size or self.fetch_size
+        )
+        # The driver cannot derive a routing key from a token() restriction,
+        # so send the scan straight to a live replica owning the range
+        host = self._get_token_range_replica(end_token)
+        response = self._session.execute(query, params, host=host,
+                                         execution_profile=EXEC_PROFILE_TUPLES)
+        yield from self._iter_pages(response)
+
+
+def split_token_range(start_token, end_token, pieces):
+    """Split (start_token, end_token] into at most pieces contiguous ranges"""
+    pieces = max(min(int(pieces), end_token - start_token), 1)
+    step = (end_token - start_token) // pieces
+    token_ranges = []
+    for i in range(pieces):
+        piece_end = end_token if i == pieces - 1 else start_token + step
+        token_ranges.append((start_token, piece_end))
+        start_token = piece_end
+    return token_ranges
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import re
+import struct
+import uuid
+import zlib
+
+logger = logging.getLogger('CDC Commit Log')
+
+# Commit log versions whose entries hold mutations serialized as in Cassandra 4.0 and later
+SUPPORTED_VERSIONS = (7, 8)
+
+SEGMENT_NAME_PATTERN = re.compile(r'^CommitLog-(\d+)-(\d+)\.log$')
+INDEX_SUFFIX = '_cdc.idx'
+SYNC_MARKER_SIZE = 8
+ENTRY_OVERHEAD_SIZE = 12
+# Entries shorter than this are padding at the end of a section
+MIN_ENTRY_SIZE = 10
+
+
+class CommitLogError(Exception):
+    pass
+
+
+class CdcSegment:
+    """A commit log segment in cdc_raw, with the offset Cassandra has made durable so far
+    (from its _cdc.idx file) and whether Cassandra is done writing it"""
+    def __init__(self, path, segment_id, durable_offset, completed):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.segment_id = segment_id
+        self.durable_offset = durable_offset
+        self.completed = completed
+
+    @property
+    def index_path(self):
+        return self.path[:-len('.log')] + INDEX_SUFFIX
+
+
+def list_cdc_segments(cdc_raw_dir):
+    """Segments of cdc_raw_dir oldest first. A segment without an index file has no
+    durable data yet and is skipped."""
+    segments = []
+    for name in os.listdir(cdc_raw_dir):
+        match = SEGMENT_NAME_PATTERN.match(name)
+        if not match:
+            continue
+        path = os.path.join(cdc_raw_dir, name)
+        index_path = path[:-len('.log')] + INDEX_SUFFIX
+        if not os.path.isfile(index_path):
+            continue
+        durable_offset, completed = read_cdc_index(index_path)
+        segments.append(CdcSegment(path, int(match.group(2)), durable_offset, completed))
+    return sorted(segments, key=lambda segment: segment.segment_id)
+
+
+def read_cdc_index(index_path):
+    """(durable offset, completed) from a _cdc.idx file"""
+    with open(index_path) as index_file:
+        lines = index_file.read().split()
+    durable_offset = int(lines[0]) if lines else 0
+    return durable_offset, 'COMPLETED' in lines[1:]
+
+
+def read_commit_log_header(segment_file):
+    """Read the descriptor at the start of a segment. Returns (version, segment_id, parameters)."""
+    crc = 0
+    data = _read_exactly(segment_file, 12)
+    version, segment_id = struct.unpack('>iq', data)
+    crc = _crc_int(crc, version)
+    crc = _crc_int(crc, segment_id & 0xFFFFFFFF)
+    crc = _crc_int(crc, (segment_id >> 32) & 0xFFFFFFFF)
+    parameters_length, = struct.unpack('>H', _read_exactly(segment_file, 2))
+    crc = _crc_int(crc, parameters_length)
+    parameters_bytes = _read_exactly(segment_file, parameters_length)
+    crc = zlib.crc32(parameters_bytes, crc)
+    expected_crc, = struct.unpack('>I', _read_exactly(segment_file, 4))
+    if crc != expected_crc:
+        raise CommitLogError(f'Corrupt commit log header in {segment_file.name}')
+    if version not in SUPPORTED_VERSIONS:
+        raise CommitLogError(f'Unsupported commit log version {version} in {segment_file.name}, '
+                             f'expected one of {SUPPORTED_VERSIONS}')
+    parameters = json.loads(parameters_bytes.decode('utf-8')) if parameters_bytes else {}
+    return version, segment_id, parameters
+
+
+def read_commit_log_entries(path, start_offset=0, end_offset=None):
+    """
+    Yield (section_end, mutation_bytes) for every entry of the sync sections of an
+    uncompressed, unencrypted segment that start at or after start_offset and end at or
+    before end_offset (the durable offset of its _cdc.idx file). section_end is where
+    reading should resume once the entries of that section are applied.
+    """
+    with open(path, 'rb') as segment_file:
+        version, segment_id, parameters = read_commit_log_header(segment_file)
+        if parameters.get('compressionClass') or parameters.get('encryptionParameters') \
+                or parameters.get('encrypted'):
+            raise CommitLogError(f'Compressed or encrypted commit logs are not supported: {path}')
+
+        file_size = os.fstat(segment_file.fileno()).st_size
+        end_offset = file_size if end_offset is None else min(end_offset, file_size)
+        marker_offset = max(segment_file.tell(), start_offset)
+        while marker_offset + SYNC_MARKER_SIZE <= end_offset:
+            segment_file.seek(marker_offset)
+            next_marker, marker_crc = struct.unpack('>iI', _read_exactly(segment_file, SYNC_MARKER_SIZE))
+            crc = _crc_int(0, segment_id & 0xFFFFFFFF)
+            crc = _crc_int(crc, (segment_id >> 32) & 0xFFFFFFFF)
+            crc = _crc_int(crc, marker_offset)
+            if next_marker == 0 or crc != marker_crc:
+                # Nothing was synced past this point yet
+                return
+            if next_marker <= marker_offset or next_marker > end_offset:
+                return
+            for mutation_bytes in _read_section(segment_file, next_marker):
+                yield next_marker, mutation_bytes
+            # A section without entries still moves the resume offset forward
+            yield next_marker, None
+            marker_offset = next_marker
+
+
+def _read_section(segment_file, section_end):
+    while segment_file.tell() + ENTRY_OVERHEAD_SIZE <= section_end:
+        size_bytes = _read_exactly(segment_file, 4)
+        size, = struct.unpack('>i', size_bytes)
+        if size < MIN_ENTRY_SIZE:
+            return
+        crc = zlib.crc32(size_bytes)
+        size_crc, = struct.unpack('>I', _read_exactly(segment_file, 4))
+        if crc != size_crc:
+            raise CommitLogError(f'Corrupt commit log entry size at {segment_file.tell() - 8} in {segment_file.name}')
+        mutation_bytes = _read_exactly(segment_file, size)
+        crc = zlib.crc32(mutation_bytes, crc)
+        mutation_crc, = struct.unpack('>I', _read_exactly(segment_file, 4))
+        if crc != mutation_crc:
+            raise CommitLogError(f'Corrupt commit log entry at {segment_file.tell() - size - 4} in {segment_file.name}')
+        yield mutation_bytes
+
+
+def parse_mutation(mutation_bytes):
+    """
+    Decode the head of a serialized mutation: (update_count, first_table_id, partition_key).
+
+    A mutation changes one partition key of one keyspace, in one or more tables. Row
+    contents are not decoded since the rows are re-read from Cassandra, so only the
+    table of the first partition update is known.
+    """
+    update_count, position = read_unsigned_vint(mutation_bytes, 0)
+    table_id = uuid.UUID(bytes=bytes(mutation_bytes[position:position + 16]))
+    position += 16
+    key_length, position = read_unsigned_vint(mutation_bytes, position)
+    partition_key = bytes(mutation_bytes[position:position + key_length])
+    if len(partition_key) != key_length:
+        raise CommitLogError('Truncated mutation')
+    return update_count, table_id, partition_key
+
+
+def read_unsigned_vint(data, position):
+    """Cassandra unsigned vint: the leading one bits of the first byte count the extra bytes"""
+    first_byte = data[position]
+    extra_bytes = 0
+    while extra_bytes < 8 and first_byte & (0x80 >> extra_bytes):
+        extra_bytes += 1
+    value = first_byte & (0xFF >> (extra_bytes + 1)) if extra_bytes < 8 else 0
+    for i in range(1, extra_bytes + 1):
+        value = (value << 8) | data[position + i]
+    return value, position + 1 + extra_bytes
+
+
+def decode_bucket_id(partition_key):
+    """bucket_id partition keys are int or bigint columns"""
+    if len(partition_key) == 4:
+        return struct.unpack('>i', partition_key)[0]
+    if len(partition_key) == 8:
+        return struct.unpack('>q', partition_key)[0]
+    raise CommitLogError(f'Unexpected partition key of {len(partition_key)} bytes')
+
+
+def _crc_int(crc, value):
+    return zlib.crc32(struct.pack('>I', value & 0xFFFFFFFF), crc)
+
+
+def _read_exactly(segment_file, size):
+    data = segment_file.read(size)
+    if len(data) != size:
+        raise CommitLogError(f'Unexpected end of {segment_file.name}')
+    return data
@@ -1,89 +1,205 @@
 import collections
+import hashlib
+import importlib.util
 import logging
+import re
 import threading
 import time
 import sys
 
 from configs.config import ClickhouseConfig
-from clickhouse_driver import connect
+from database.clickhouse_pool import ClickhouseConnectionPool, is_connection_error
+from database.insert_buffer import InsertBuffer
+from database.insert_profile import COMPRESSIONS, InsertProfile
+from database.row_converter import build_row_converter, INT_FIELDS, LIST_FIELDS, SKIPPED_FIELDS
 
 logger = logging.getLogger("Clickhouse Client")
 
+try:
+    import numpy as np
+    # clickhouse-driver's numpy mode also needs pandas
+    import pandas
+except ImportError:
+    np = None
+
+# Modules clickhouse-driver needs for each compression, installed by its lz4 / zstd extras
+COMPRESSION_MODULES = {
+    'lz4': ('lz4', 'clickhouse_cityhash'),
+    'lz4hc': ('lz4', 'clickhouse_cityhash'),
+    'zstd': ('zstd', 'clickhouse_cityhash'),
+}
+
+INSERT_MODES = ('rows', 'columnar', 'numpy')
+
+# Non-array columns sent as typed numpy arrays in numpy insert mode; every other
+# column is sent as an object array. Nullable numeric columns use a float dtype
+# so missing values become NaN, which clickhouse-driver writes as NULL.
+NUMPY_DTYPES = {
+    'blocks': {'number': 'int32', 'timestamp': 'int32'},
+    'transactions': {'block_number': 'int64', 'block_timestamp': 'int64', 'transaction_index': 'int16'},
+    'token_transfer': {'block_number': 'int64', 'log_index': 'int16', 'value': 'float64'},
+    'internal_transactions': {'block_number': 'int64', 'idx': 'int16'},
+}
+# clickhouse-driver has no numpy column for Array types, such inserts fall back to columnar mode
+NUMPY_UNSUPPORTED_FIELDS = {'withdrawals', 'topics'}
+
+# Recent insert blocks whose hashes (or deduplication tokens) a non-replicated table keeps
+DEDUPLICATION_WINDOW = 10000
+
+
+# Sorting keys of the tables, identifying the rows of an insert in its deduplication token
+SORTING_KEYS = {
+    'blocks': ('number',),
+    'transactions': ('block_number', 'transaction_index'),
+    'transaction_receipts': ('block_number', 'transaction_index'),
+    'logs': ('block_number', 'log_index'),
+    'token_transfer': ('block_number', 'log_index'),
+    'internal_transactions': ('block_number', 'hash', 'idx'),
+}
+
+
+def insert_deduplication_token(table, fields, data, epoch='', columnar=False):
+    """Deterministic token of an insert of rows, or of columns when columnar: the same
+    rows inserted again into the same table get the same token, and ClickHouse skips
+    them as a duplicate. It is built from the block range, the row count and a hash of
+    the sorting key columns only, so rows whose other values changed are skipped too
+    unless the epoch changed."""
+    fields = list(fields)
+
+    def column(field):
+        index = fields.index(field)
+        return data[index] if columnar else [row[index] for row in data]
+
+    block_range = ''
+    for field in ('block_number', 'number'):
+        if field in fields:
+            block_numbers = [number for number in column(field) if number is not None]
+            if block_numbers:
+                block_range = f'{min(block_numbers)}-{max(block_numbers)}'
+            break
+    row_count = len(data[0]) if columnar and data else len(data)
+    key_fields = [field for field in SORTING_KEYS.get(table, ()) if field in fields] or fields
+    key_hash = hashlib.sha256(repr([list(column(field)) for field in key_fields]).encode()).hexdigest()
+    token = f'{table}:{block_range}:{row_count}:{key_hash}'
+    return f'{token}:{epoch}' if epoch else token
+
+
 class ClickhouseClient:
-    def __init__(self, connection_url=None, db_prefix=''):
-        self.connection_url = connection_url
+    """
+    connection_url may list several comma-separated URLs of replicas to fail over
+    between. Connections come from a ClickhouseConnectionPool of up to pool_size
+    connections shared by all threads; compression (lz4, zstd) compresses the data
+    blocks sent over the native protocol, and insert_profile holds the settings sent
+    with the inserts into each table.
+
+    With deduplicate, every insert carries an insert_deduplication_token derived from
+    its table, block range and sorting keys, so a batch re-inserted by a retry or a restart
+    is skipped by ClickHouse instead of left for ReplacingMergeTree to merge away.
+
+    close() flushes buffered inserts unless flush_on_close is False, for callers such
+    as Streamer that flush at their own checkpoints so the buffer spans several jobs.
+    """
+    def __init__(self, connection_url=None, db_prefix='', insert_mode='rows', buffer_max_rows=0,
+                 buffer_max_bytes=64 * 1024 * 1024, buffer_max_seconds=10, pool_size=16, compression=None,
+                 insert_profile=None, deduplicate=False, flush_on_close=True):
+        self.connection_url = connection_url or ClickhouseConfig.CONNECTION_URL
+        if insert_mode not in INSERT_MODES:
+            raise ValueError(f'Unknown insert mode {insert_mode}, expected one of {INSERT_MODES}')
+        if insert_mode == 'numpy' and np is None:
+            raise ValueError('numpy insert mode requires numpy and pandas to be installed')
+        self.insert_mode = insert_mode
+        if compression not in (None,) + COMPRESSIONS:
+            raise ValueError(f'Unknown compression {compression}, expected one of {COMPRESSIONS}')
+        missing_modules = [module for module in COMPRESSION_MODULES.get(compression, ())
+                           if importlib.util.find_spec(module) is None]
+        if missing_modules:
+            raise ValueError(f'{compression} compression requires {", ".join(missing_modules)} to be installed')
+        self.insert_profile = insert_profile or InsertProfile()
+        self.deduplicate = deduplicate
+        # Changed by deletes, so rows inserted again after a delete are not skipped as duplicates
+        self._deduplication_epoch = ''
+        # Inserts go straight to ClickHouse unless buffer_max_rows is set
+        self._insert_buffer = None
+        self.flush_on_close = flush_on_close
+        if buffer_max_rows:
+            self._insert_buffer = InsertBuffer(self._write_rows, max_rows=buffer_max_rows,
+                                               max_bytes=buffer_max_bytes, max_seconds=buffer_max_seconds)
         if db_prefix:
             self.database = f'{db_prefix}_{ClickhouseConfig.DATABASE}'
         else:
             self.database = ClickhouseConfig.DATABASE
+        self._row_converters = {}
+
+        self.connection_urls = [url.strip() for url in self.connection_url.split(',') if url.strip()]
+        self.pool_size = pool_size
+        self._url_params = {'compression': compression} if compression not in (None, 'none') else {}
+        self._pool = ClickhouseConnectionPool(self.connection_urls, max_size=pool_size, url_params=self._url_params)
+        # Numpy inserts need a client created with use_numpy, they get their own pool
+        self._numpy_pool = None
+        self._numpy_pool_lock = threading.Lock()
 
         try:
-            tmp_conn = connect(self.connection_url)
-            self._local = threading.local()
-            with tmp_conn.cursor() as cursor:
-                self._tmp_cursor = cursor
-                # self.init_schema()
-            tmp_conn.close()
+            with self._pool.connection():
+                pass
         except Exception as err:
             logger.warning(f'Failed to connect Clickhouse: {self.connection_url}')
             logger.exception(err)
             sys.exit(1)
-        
-    def _get_connection(self):
-        conn = getattr(self._local, 'connection', None)
-        if conn is None:
-            try:
-                conn = connect(self.connection_url)
-                self._local.connection = conn
-            except Exception as e:
-                logger.warning('Failed to create ClickHouse connection')
-                logger.exception(e)
-                raise
-        return conn
 
-    def _reconnect_current_thread(self):
+        if self.deduplicate:
+            self._enable_deduplication()
+
+    def _get_pool(self, use_numpy=False):
+        if not use_numpy:
+            return self._pool
+        with self._numpy_pool_lock:
+            if self._numpy_pool is None:
+                self._numpy_pool = ClickhouseConnectionPool(self.connection_urls, max_size=self.pool_size,
+                                                            url_params=dict(self._url_params, use_numpy='true'))
+            return self._numpy_pool
+
+    def _execute(self, query, params=None, use_numpy=False, **kwargs):
+        """Run one statement on a pooled connection. A connection error drops that
+        connection, and the statement is retried once on another one."""
+        pool = self._get_pool(use_numpy)
         try:
-            conn = getattr(self._local, 'connection', None)
-            if conn is not None:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
-            self._local.connection = connect(self.connection_url)
-        except Exception as e:
-            logger.warning('Failed to reconnect ClickHouse connection')
-            logger.exception(e)
-            raise
-        
+            with pool.connection() as client:
+                return client.execute(query, params, **kwargs)
+        except Exception as err:
+            if not is_connection_error(err):
+                raise
+            logger.warning(f'ClickHouse connection failed ({err}), retrying on another connection')
+        with pool.connection() as client:
+            return client.execute(query, params, **kwargs)
+
     def open(self):
         pass
 
+    def flush(self):
+        if self._insert_buffer is not None:
+            self._insert_buffer.flush()
+
+    def after_flush(self, callback):
+        """Run callback once every row inserted so far has reached ClickHouse"""
+        if self._insert_buffer is not None:
+            self._insert_buffer.after_flush(callback)
+        else:
+            callback()
+
     def close(self):
-        conn = getattr(self._local, 'connection', None)
-        if conn:
-            try:
-                conn.close()
-            except Exception:
-                pass
+        # Buffered rows are written before the caller moves on to checkpointing,
+        # a failed flush raises so the checkpoint is not advanced
+        if self.flush_on_close:
+            self.flush()
+        # The client is reused by the next job, so the pools only drop their idle connections
+        self._pool.close_idle()
+        if self._numpy_pool is not None:
+            self._numpy_pool.close_idle()
 
     def execute_query(self, query: str, params: dict = None):
         try:
-            conn = self._get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(query, params)
-                return cursor.fetchall()
+            return self._execute(query, params)
         except Exception as err:
-            # Try one reconnect in case connection is closed
-            msg = str(err).lower()
-            if 'closed' in msg or 'disconnect' in msg:
-                try:
-                    self._reconnect_current_thread()
-                    conn = self._get_connection()
-                    with conn.cursor() as cursor:
-                        cursor.execute(query, params)
-                        return cursor.fetchall()
-                except Exception:
-                    pass
             logger.warning(f'Failed to execute query: {query}')
             logger.exception(err)
             raise
@@ -120,7 +236,7 @@ class ClickhouseClient:
                 PARTITION BY toYYYYMM(toDateTime(timestamp))
                 ORDER BY number
                 TTL toDateTime(update_at) + INTERVAL 30 DAY
-                SETTINGS index_granularity = 8192;
+                SETTINGS index_granularity = 8192, non_replicated_deduplication_window = {DEDUPLICATION_WINDOW};
         """)
         
         logger.info("Creating transactions table...")
@@ -150,7 +266,7 @@ class ClickhouseClient:
             PARTITION BY (block_number)
             ORDER BY (block_number, transaction_index)
             TTL toDateTime(update_at) + INTERVAL 30 DAY
-            SETTINGS index_granularity = 8192;
+            SETTINGS index_granularity = 8192, non_replicated_deduplication_window = {DEDUPLICATION_WINDOW};
         """)
 
         logger.info("Creating token_transfer table...")
@@ -170,7 +286,7 @@ class ClickhouseClient:
                 PARTITION BY (block_number)
                 ORDER BY (block_number, log_index)
                 TTL toDateTime(update_at) + INTERVAL 30 DAY
-                SETTINGS index_granularity = 8192;
+                SETTINGS index_granularity = 8192, non_replicated_deduplication_window = {DEDUPLICATION_WINDOW};
             """)
 
         logger.info("Creating internal_transactions table...")
@@ -197,9 +313,65 @@ class ClickhouseClient:
             PARTITION BY (block_number)
             ORDER BY (block_number, hash, idx)
             TTL toDateTime(update_at) + INTERVAL 30 DAY
-            SETTINGS index_granularity = 8192;
+            SETTINGS index_granularity = 8192, non_replicated_deduplication_window = {DEDUPLICATION_WINDOW};
+        """)
+
+        self.init_logs_schema()
+
+    def _enable_deduplication(self):
+        """A non-replicated table ignores insert_deduplication_token unless its
+        non_replicated_deduplication_window is set, which is not the default. Tables
+        created by init_schema have it in their DDL, older ones are altered here."""
+        tables = self.execute_query(
+            "SELECT name, engine_full FROM system.tables WHERE database = %(database)s "
+            "AND engine LIKE '%%MergeTree' AND engine NOT LIKE 'Replicated%%'",
+            {'database': self.database})
+        for table, engine_full in tables:
+            match = re.search(r'non_replicated_deduplication_window = (\d+)', engine_full)
+            if match and int(match.group(1)) > 0:
+                continue
+            logger.info(f"Enabling insert deduplication on {self.database}.{table}")
+            self.execute_query(f"ALTER TABLE {self.database}.{table} "
+                               f"MODIFY SETTING non_replicated_deduplication_window = {DEDUPLICATION_WINDOW}")
+
+    def init_logs_schema(self):
+        self.execute_query(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+
+        # Logs are read back by block range, so parts are partitioned by million-block
+        # ranges rather than per block, and sorted by (block_number, log_index)
+        logger.info("Creating logs table...")
+        self.execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.database}.logs
+            (
+                block_number Int64,
+                log_index Int32,
+                transaction_hash String,
+                transaction_index Nullable(Int32),
+                address Nullable(String),
+                block_hash Nullable(String),
+                data Nullable(String),
+                event_signature Nullable(String),
+                topic0 Nullable(String),
+                topics Array(String),
+                type Nullable(String),
+                update_at Datetime DEFAULT now()
+            )
+            ENGINE = ReplacingMergeTree()
+            PARTITION BY intDiv(block_number, 1000000)
+            ORDER BY (block_number, log_index)
+            TTL toDateTime(update_at) + INTERVAL 30 DAY
+            SETTINGS index_granularity = 8192, non_replicated_deduplication_window = {DEDUPLICATION_WINDOW};
         """)
 
+    def delete_from_block(self, table, block_number):
+        """Lightweight DELETE of the rows of table from block_number on, e.g. after a reorg"""
+        # Buffered rows of the deleted blocks must not be inserted after the delete
+        self.flush()
+        column = 'number' if table == 'blocks' else 'block_number'
+        self.execute_query(f'DELETE FROM {self.database}.{table} WHERE {column} >= %(block_number)s',
+                           {'block_number': int(block_number)})
+        self._deduplication_epoch = str(time.time_ns())
+
     @staticmethod
     def handle_error(exception):
         logger.error(exception)
@@ -210,21 +382,19 @@ class ClickhouseClient:
             
         cleaned_data = []
         
-        fields_to_remove = {'bucket_id'}
-        
         for record in data:
             cleaned_record = {}
             
             for key, value in record.items():
-                if key in fields_to_remove:
+                if key in SKIPPED_FIELDS:
                     continue
                     
-                if key in ['number', 'timestamp', 'transaction_count', 'block_number']:
+                if key in INT_FIELDS:
                     if value is not None:
                         cleaned_record[key] = int(value)
                     else:
                         cleaned_record[key] = None
-                elif key == 'withdrawals':
+                elif key in LIST_FIELDS:
                     if value is None or value == 'null':
                         cleaned_record[key] = []
                     elif isinstance(value, list):
@@ -239,26 +409,108 @@ class ClickhouseClient:
 
     def build_insert_statement_from_entity(self, entity, table):
         fields = list(entity.keys())
+        return self.build_insert_statement(fields, table), fields
+
+    def build_insert_statement(self, fields, table):
         fields_str = ','.join(fields)
-        insert_stmt = f'INSERT INTO {self.database}.{table} ({fields_str}) VALUES'
-        return insert_stmt, fields
+        return f'INSERT INTO {self.database}.{table} ({fields_str}) VALUES'
 
     def upsert_entities(self, entities, table):
         if not entities:
             return
 
-        insert_entity_stmt, fields = self.build_insert_statement_from_entity(entities[0], table)
+        fields = list(entities[0].keys())
         data_tuples = [tuple(entity.get(field) for field in fields) for entity in entities]
+        self.insert_rows(data_tuples, fields, table)
 
+    def insert_rows(self, rows, fields, table):
+        if not rows:
+            return
+
+        if self._insert_buffer is not None:
+            self._insert_buffer.add(rows, fields, table)
+        else:
+            self._write_rows(rows, fields, table)
+
+    def _write_rows(self, rows, fields, table):
+        insert_stmt = self.build_insert_statement(fields, table)
         try:
-            conn = self._get_connection()
-            with conn.cursor() as cursor:
-                cursor.executemany(insert_entity_stmt, data_tuples)
+            if self.insert_mode == 'rows':
+                self._execute(insert_stmt, rows, settings=self._insert_settings(table, fields, rows))
+            else:
+                self._insert_columnar(insert_stmt, rows, fields, table)
         except Exception as e:
             logger.warning(f'Failed to insert data into ClickHouse table {table}')
             logger.exception(e)
             raise
 
+    def insert_columns(self, columns, fields, table):
+        """Insert data that is already columnar, e.g. read back from staged files, in one block"""
+        insert_stmt = self.build_insert_statement(fields, table)
+        try:
+            self._execute(insert_stmt, columns, columnar=True,
+                          settings=self._insert_settings(table, fields, columns, columnar=True))
+        except Exception as e:
+            logger.warning(f'Failed to insert columns into ClickHouse table {table}')
+            logger.exception(e)
+            raise
+
+    def _insert_settings(self, table, fields, data, columnar=False):
+        settings = self.insert_profile.settings_for(table)
+        if self.deduplicate:
+            settings = dict(settings, insert_deduplicate=1,
+                            insert_deduplication_token=insert_deduplication_token(
+                                table, fields, data, self._deduplication_epoch, columnar=columnar))
+        return settings
+
+    def _insert_columnar(self, insert_stmt, rows, fields, table):
+        # zip transposes in C, so clickhouse-driver receives ready-made columns
+        columns = list(zip(*rows))
+        settings = self._insert_settings(table, fields, columns, columnar=True)
+        use_numpy = self.insert_mode == 'numpy' and not NUMPY_UNSUPPORTED_FIELDS.intersection(fields)
+        if use_numpy:
+            columns = self._to_numpy_columns(columns, fields, table)
+        self._execute(insert_stmt, columns, use_numpy=use_numpy, columnar=True, settings=settings)
+
+    @staticmethod
+    def _to_numpy_columns(columns, fields, table):
+        dtypes = NUMPY_DTYPES.get(table, {})
+        numpy_columns = []
+        for field, column in zip(fields, columns):
+            dtype = dtypes.get(field)
+            if dtype is not None and (dtype.startswith('float') or None not in column):
+                numpy_columns.append(np.array(column, dtype=dtype))
+            else:
+                numpy_column = np.empty(len(column), dtype=object)
+                numpy_column[:] = column
+                numpy_columns.append(numpy_column)
+        return numpy_columns
+
+    def get_row_converter(self, columns, table):
+        """Row converters are built once per (table, Cassandra column layout)"""
+        key = (table, tuple(columns))
+        converter = self._row_converters.get(key)
+        if converter is None:
+            converter = build_row_converter(columns)
+            self._row_converters[key] = converter
+        return converter
+
+    def convert_rows(self, columns, rows, table):
+        fields, convert = self.get_row_converter(columns, table)
+        return fields, [convert(row) for row in rows]
+
+    def upsert_chunks(self, chunks, table):
+        """Insert an iterable of (column_names, tuple_rows) pages one page at a time,
+        so only one page is held in memory. Returns the number of rows inserted."""
+        row_count = 0
+        for columns, rows in chunks:
+            if not rows:
+                continue
+            fields, data_tuples = self.convert_rows(columns, rows, table)
+            self.insert_rows(data_tuples, fields, table)
+            row_count += len(data_tuples)
+        return row_count
+
     def upsert_blocks(self, blocks):
         if not blocks or blocks == []:
             logger.warning('No blocks to upsert')
@@ -0,0 +1,268 @@
+import logging
+import os
+import uuid
+
+from database.row_converter import build_row_converter, LIST_FIELDS
+
+logger = logging.getLogger("Clickhouse File Exporter")
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Array columns may be empty in a whole page, so their types are fixed up front
+# instead of inferred, following the ClickHouse DDL
+LIST_ARROW_TYPES = {
+    'topics': pa.list_(pa.string()),
+    'withdrawals': pa.list_(pa.struct([('idx', pa.string()), ('validator_index', pa.string()),
+                                       ('address', pa.string()), ('amount', pa.string())])),
+} if pa is not None else {}
+
+# ClickHouse types of the exported columns (see ClickhouseClient.init_schema). The
+# Parquet schema of a staged file follows them instead of the first page, where a column
+# may be all null. Columns not listed here are still inferred from the first page.
+CLICKHOUSE_COLUMN_TYPES = {
+    'blocks': {
+        'number': 'Int32', 'hash': 'String', 'difficulty': 'String', 'extra_data': 'String',
+        'gas_limit': 'String', 'gas_used': 'String', 'logs_bloom': 'String', 'miner': 'String',
+        'nonce': 'String', 'parent_hash': 'String', 'receipts_root': 'String', 'sha3_uncles': 'String',
+        'size': 'String', 'state_root': 'String', 'timestamp': 'Int32', 'total_difficulty': 'String',
+        'transaction_count': 'Int32', 'transactions_root': 'String', 'type': 'String',
+    },
+    'transactions': {
+        'block_number': 'Int64', 'hash': 'String', 'block_hash': 'String', 'block_timestamp': 'Int64',
+        'from_address': 'String', 'gas': 'String', 'gas_price': 'String', 'input': 'String',
+        'nonce': 'Int32', 'receipt_contract_address': 'String', 'receipt_cumulative_gas_used': 'Int32',
+        'receipt_gas_used': 'Int32', 'receipt_root': 'String', 'receipt_status': 'Int16',
+        'to_address': 'String', 'transaction_index': 'Int16', 'type': 'String', 'value': 'String',
+    },
+    'token_transfer': {
+        'block_number': 'Int64', 'contract_address': 'String', 'log_index': 'Int16',
+        'from_address': 'String', 'to_address': 'String', 'transaction_hash': 'String', 'value': 'Float64',
+    },
+    'internal_transactions': {
+        'block_number': 'Int64', 'hash': 'String', 'idx': 'Int16', 'contract_address': 'String',
+        'err_code': 'String', 'from_address': 'String', 'gas': 'String', 'gas_used': 'String',
+        'input': 'String', 'is_error': 'Int16', 'to_address': 'String', 'trace_id': 'String',
+        'type': 'String', 'value': 'String',
+    },
+    'logs': {
+        'block_number': 'Int64', 'log_index': 'Int32', 'transaction_hash': 'String',
+        'transaction_index': 'Int32', 'address': 'String', 'block_hash': 'String', 'data': 'String',
+        'event_signature': 'String', 'topic0': 'String', 'type': 'String',
+    },
+}
+# Receipts are a projection of the transactions columns
+CLICKHOUSE_COLUMN_TYPES['transaction_receipts'] = CLICKHOUSE_COLUMN_TYPES['transactions']
+
+ARROW_TYPES = {
+    'String': pa.string(),
+    'Int16': pa.int16(),
+    'Int32': pa.int32(),
+    'Int64': pa.int64(),
+    'Float64': pa.float64(),
+} if pa is not None else {}
+
+STAGING_COMPRESSIONS = ('zstd', 'snappy', 'gzip', 'lz4', 'none')
+STAGED_FILE_SUFFIX = '.parquet'
+LOADED_FILE_SUFFIX = '.loaded'
+
+
+class ClickhouseFileExporter:
+    """
+    Drop-in exporter for cold backfills that stages rows as compressed Parquet files
+    instead of inserting them, so reading Cassandra and loading ClickHouse run separately
+    and a failed load is retried from disk (see LoadStagedFiles).
+
+    Every upsert_chunks/insert_rows call becomes one file
+    staging_dir/{table}/{min_block}-{max_block}-{uuid}.parquet, written under a
+    temporary name and renamed once complete, so the loader never sees partial files.
+    """
+    def __init__(self, staging_dir, compression='zstd', db_prefix=''):
+        if pa is None:
+            raise ValueError('Staging files requires pyarrow to be installed')
+        self.staging_dir = staging_dir
+        self.compression = compression
+        self.db_prefix = db_prefix
+        self._row_converters = {}
+
+    def open(self):
+        pass
+
+    def init_schema(self):
+        pass
+
+    def init_logs_schema(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def after_flush(self, callback):
+        # A staged file is complete once renamed, nothing is buffered
+        callback()
+
+    def close(self):
+        pass
+
+    def delete_from_block(self, table, block_number):
+        raise ValueError('Staged files cannot be deleted by block number, reorg handling needs a ClickHouse exporter')
+
+    def get_row_converter(self, columns, table):
+        key = (table, tuple(columns))
+        converter = self._row_converters.get(key)
+        if converter is None:
+            converter = build_row_converter(columns)
+            self._row_converters[key] = converter
+        return converter
+
+    def convert_rows(self, columns, rows, table):
+        fields, convert = self.get_row_converter(columns, table)
+        return fields, [convert(row) for row in rows]
+
+    def upsert_chunks(self, chunks, table):
+        """Stage an iterable of (column_names, tuple_rows) pages as one file, one row group
+        per page. Returns the number of rows staged."""
+        writer = None
+        row_count = 0
+        try:
+            for columns, rows in chunks:
+                if not rows:
+                    continue
+                fields, data_tuples = self.convert_rows(columns, rows, table)
+                if writer is None:
+                    writer = _StagedFileWriter(self._table_dir(table), table, fields, self.compression)
+                writer.write(data_tuples)
+                row_count += len(data_tuples)
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            path = writer.commit()
+            logger.debug(f'Staged {row_count} rows of {table} in {path}')
+        return row_count
+
+    def insert_rows(self, rows, fields, table):
+        if not rows:
+            return
+        writer = _StagedFileWriter(self._table_dir(table), table, fields, self.compression)
+        try:
+            writer.write(rows)
+        except Exception:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def upsert_entities(self, entities, table):
+        if not entities:
+            return
+        fields = list(entities[0].keys())
+        self.insert_rows([tuple(entity.get(field) for field in fields) for entity in entities], fields, table)
+
+    def _table_dir(self, table):
+        table_dir = os.path.join(self.staging_dir, table)
+        os.makedirs(table_dir, exist_ok=True)
+        return table_dir
+
+
+class _StagedFileWriter:
+    def __init__(self, table_dir, table, fields, compression):
+        self.table_dir = table_dir
+        self.table = table
+        self.fields = list(fields)
+        self.compression = compression
+        self.tmp_path = os.path.join(table_dir, f'.{uuid.uuid4().hex}.tmp')
+        self._block_index = _block_number_index(self.fields)
+        self._writer = None
+        self._min_block = None
+        self._max_block = None
+
+    def write(self, rows):
+        columns = [list(column) for column in zip(*rows)]
+        for field, column in zip(self.fields, columns):
+            if field in LIST_FIELDS:
+                column[:] = [_to_arrow_list(value) for value in column]
+        arrays = {field: column for field, column in zip(self.fields, columns)}
+        if self._writer is None:
+            schema = self._schema(arrays)
+            self._writer = pq.ParquetWriter(self.tmp_path, schema, compression=self.compression)
+        table = pa.Table.from_pydict(arrays, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+        if self._block_index is not None:
+            block_numbers = [number for number in columns[self._block_index] if number is not None]
+            if block_numbers:
+                self._min_block = min(block_numbers) if self._min_block is None else min(self._min_block, min(block_numbers))
+                self._max_block = max(block_numbers) if self._max_block is None else max(self._max_block, max(block_numbers))
+
+    def _schema(self, arrays):
+        column_types = CLICKHOUSE_COLUMN_TYPES.get(self.table, {})
+        unknown_fields = [field for field in self.fields
+                          if field not in LIST_ARROW_TYPES and field not in column_types]
+        inferred = pa.Table.from_pydict({field: arrays[field] for field in unknown_fields}).schema \
+            if unknown_fields else None
+        schema_fields = []
+        for field in self.fields:
+            if field in LIST_ARROW_TYPES:
+                schema_fields.append(pa.field(field, LIST_ARROW_TYPES[field]))
+            elif field in column_types:
+                schema_fields.append(pa.field(field, ARROW_TYPES[column_types[field]]))
+            else:
+                inferred_field = inferred.field(field)
+                # A column that is null in the first page would otherwise be typed null for the whole file
+                schema_fields.append(inferred_field.with_type(pa.string()) if pa.types.is_null(inferred_field.type)
+                                     else inferred_field)
+        return pa.schema(schema_fields)
+
+    def commit(self):
+        self._writer.close()
+        block_range = f'{self._min_block}-{self._max_block}' if self._min_block is not None else 'unknown'
+        path = os.path.join(self.table_dir, f'{block_range}-{uuid.uuid4().hex}{STAGED_FILE_SUFFIX}')
+        os.replace(self.tmp_path, path)
+        return path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _block_number_index(fields):
+    for column in ('block_number', 'number'):
+        if column in fields:
+            return fields.index(column)
+    return None
+
+
+def _to_arrow_list(value):
+    # Cassandra UDTs (e.g. withdrawals) come as named tuples, Parquet stores them as structs
+    return [item._asdict() if hasattr(item, '_asdict') else item for item in value]
+
+
+def list_staged_files(staging_dir, table):
+    table_dir = os.path.join(staging_dir, table)
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(os.path.join(table_dir, name) for name in os.listdir(table_dir)
+                  if name.endswith(STAGED_FILE_SUFFIX))
+
+
+def read_staged_file(path, batch_rows=1000000):
+    """Yield (fields, columns) of at most batch_rows rows each from a staged file"""
+    parquet_file = pq.ParquetFile(path)
+    fields = parquet_file.schema_arrow.names
+    for record_batch in parquet_file.iter_batches(batch_size=batch_rows):
+        columns = []
+        for field, column in zip(fields, record_batch.columns):
+            values = column.to_pylist()
+            if pa.types.is_list(column.type) and pa.types.is_struct(column.type.value_type):
+                # ClickHouse Array(Tuple(...)) expects tuples back
+                values = [[tuple(item.values()) for item in value] if value is not None else []
+                          for value in values]
+            columns.append(values)
+        yield fields, columns
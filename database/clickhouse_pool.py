@@ -0,0 +1,181 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlparse, parse_qsl, urlunparse
+
+from clickhouse_driver import Client
+from clickhouse_driver import errors
+
+logger = logging.getLogger('Clickhouse Pool')
+
+# Errors after which a connection cannot be trusted any more: it is dropped instead of
+# returned to the pool, and the operation may be retried on another connection
+CONNECTION_ERRORS = (errors.NetworkError, errors.SocketTimeoutError, errors.UnexpectedPacketFromServerError,
+                     errors.UnknownPacketFromServerError, errors.PartiallyConsumedQueryError,
+                     EOFError, ConnectionError, socket.timeout)
+
+
+def with_url_params(url, **params):
+    parsed_url = urlparse(url)
+    query = dict(parse_qsl(parsed_url.query))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunparse(parsed_url._replace(query=urlencode(query)))
+
+
+def is_connection_error(error):
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+class _PooledClient:
+    def __init__(self, client, url):
+        self.client = client
+        self.url = url
+        self.last_used = time.time()
+        self.last_checked = self.last_used
+
+
+class ClickhouseConnectionPool:
+    """
+    Bounded pool of native clickhouse-driver clients shared by every thread.
+
+    connection_urls is a list of URLs of replicas (or shards accepting the same inserts);
+    new connections go to them in turn, and a URL that fails to connect is skipped for
+    failover_seconds. Connections idle for more than idle_seconds are closed, and one
+    idle for more than health_check_seconds is pinged before it is handed out. url_params
+    (e.g. compression=lz4) are added to every URL.
+
+    Sockets cannot be shared across processes, so a pool used after a fork drops the
+    parent's connections and starts empty in the child.
+    """
+    def __init__(self, connection_urls, max_size=16, idle_seconds=300, health_check_seconds=30,
+                 failover_seconds=30, url_params=None):
+        self.connection_urls = [with_url_params(url, **url_params) if url_params else url
+                                for url in connection_urls]
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.health_check_seconds = health_check_seconds
+        self.failover_seconds = failover_seconds
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._size = 0
+        self._next_url = 0
+        self._failed_until = {}
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Inherited sockets belong to the parent, do not disconnect them from here
+            self._reset()
+
+    @contextmanager
+    def connection(self):
+        pooled = self._acquire()
+        try:
+            yield pooled.client
+        except Exception as e:
+            self._release(pooled, discard=is_connection_error(e))
+            raise
+        self._release(pooled)
+
+    def _acquire(self):
+        while True:
+            with self._condition:
+                self._check_pid()
+                while not self._idle and self._size >= self.max_size:
+                    self._condition.wait()
+                if not self._idle:
+                    self._size += 1
+                    break
+                pooled = self._idle.pop()
+                now = time.time()
+                if now - pooled.last_used > self.idle_seconds:
+                    self._disconnect(pooled)
+                    continue
+            # The health check runs outside the lock, it is a round trip to the server
+            if now - pooled.last_checked > self.health_check_seconds and not self._is_healthy(pooled):
+                with self._condition:
+                    self._disconnect(pooled)
+                continue
+            return pooled
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, pooled, discard=False):
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            if discard:
+                self._disconnect(pooled)
+            else:
+                # A connection that just completed a query needs no health check
+                pooled.last_used = pooled.last_checked = time.time()
+                self._idle.append(pooled)
+            self._condition.notify()
+
+    def _connect(self):
+        """Connect to the next healthy URL, falling back to the others in turn"""
+        with self._condition:
+            now = time.time()
+            urls = [self.connection_urls[(self._next_url + i) % len(self.connection_urls)]
+                    for i in range(len(self.connection_urls))]
+            self._next_url = (self._next_url + 1) % len(self.connection_urls)
+            # URLs that failed recently are only tried when nothing else is left
+            urls.sort(key=lambda url: self._failed_until.get(url, 0) > now)
+
+        last_error = None
+        for url in urls:
+            client = Client.from_url(url)
+            try:
+                client.execute('SELECT 1')
+            except Exception as e:
+                if not is_connection_error(e) and not isinstance(e, OSError):
+                    raise
+                logger.warning(f'Failed to connect to ClickHouse replica {_host_of(url)}: {e}')
+                last_error = e
+                with self._condition:
+                    self._failed_until[url] = time.time() + self.failover_seconds
+                continue
+            return _PooledClient(client, url)
+        raise last_error
+
+    def _is_healthy(self, pooled):
+        try:
+            pooled.client.execute('SELECT 1')
+        except Exception as e:
+            logger.info(f'Dropping unhealthy ClickHouse connection to {_host_of(pooled.url)}: {e}')
+            return False
+        pooled.last_checked = time.time()
+        return True
+
+    def _disconnect(self, pooled):
+        self._size -= 1
+        try:
+            pooled.client.disconnect()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        """Close every idle connection. Connections in use go back to the pool when
+        released, and the pool reconnects on demand."""
+        with self._condition:
+            self._check_pid()
+            idle, self._idle = self._idle, []
+            for pooled in idle:
+                self._disconnect(pooled)
+            self._condition.notify_all()
+
+
+def _host_of(url):
+    # Without the credentials of the URL
+    return urlparse(url).netloc.split('@')[-1]
@@ -0,0 +1,10 @@
+from database.clickhouse_client import ClickhouseClient
+from database.clickhouse_file_exporter import ClickhouseFileExporter
+
+
+def create_item_exporter(staging_dir=None, staging_compression='zstd', **clickhouse_kwargs):
+    """ClickhouseClient, or a ClickhouseFileExporter staging Parquet files when staging_dir is set"""
+    if staging_dir:
+        return ClickhouseFileExporter(staging_dir, compression=staging_compression,
+                                      db_prefix=clickhouse_kwargs.get('db_prefix', ''))
+    return ClickhouseClient(**clickhouse_kwargs)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger('Insert Buffer')
+
+
+class _PendingRows:
+    def __init__(self):
+        self.rows = []
+        self.size_bytes = 0
+        self.created_at = time.time()
+
+
+class InsertBuffer:
+    """Thread-safe buffer coalescing many small inserts into few large ones.
+
+    Rows are grouped per (table, fields) and handed to flush_handler(rows, fields, table)
+    once max_rows, max_bytes or max_seconds is reached for that group, or on flush().
+    A timer thread flushes groups older than max_seconds even when nothing is added;
+    flush() waits for a timer flush in progress and retries the rows it failed to write.
+    If a flush fails the rows are put back so the next flush() retries them.
+    """
+    def __init__(self, flush_handler, max_rows=100000, max_bytes=64 * 1024 * 1024, max_seconds=10):
+        self._flush_handler = flush_handler
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        # Held by the timer while it flushes and by flush(), so flush() never returns before a timer flush
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._flushing = 0
+        self._flush_callbacks = []
+        self._timer = None
+
+    def add(self, rows, fields, table):
+        if not rows:
+            return
+        key = (table, tuple(fields))
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingRows()
+            pending.rows.extend(rows)
+            pending.size_bytes += estimate_size_bytes(rows)
+            ready = self._take_ready()
+            if self._timer is None and self.max_seconds:
+                self._timer = threading.Thread(target=self._flush_periodically, name='InsertBufferTimer', daemon=True)
+                self._timer.start()
+        self._flush_ready(ready)
+
+    def _take_ready(self):
+        """Remove the groups due for a flush, called with the lock held"""
+        now = time.time()
+        ready = []
+        for pending_key, pending_rows in list(self._pending.items()):
+            if len(pending_rows.rows) >= self.max_rows or pending_rows.size_bytes >= self.max_bytes \
+                    or now - pending_rows.created_at >= self.max_seconds:
+                ready.append((pending_key, self._pending.pop(pending_key)))
+        self._flushing += len(ready)
+        return ready
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(min(self.max_seconds, 1))
+            with self._flush_lock:
+                with self._lock:
+                    ready = self._take_ready()
+                try:
+                    self._flush_ready(ready)
+                except Exception:
+                    # The rows are kept, the next flush retries them
+                    pass
+
+    def flush(self):
+        """Write every buffered row, then run the callbacks registered with after_flush.
+        Raises if any row, including one a failed timer flush put back, could not be written."""
+        with self._flush_lock:
+            with self._lock:
+                ready = list(self._pending.items())
+                self._pending.clear()
+                self._flushing += len(ready)
+            self._flush_ready(ready)
+            with self._lock:
+                # Groups taken by add() in other threads
+                while self._flushing:
+                    self._flushed.wait()
+        self._run_flush_callbacks()
+
+    def _flush_ready(self, ready):
+        # Every group is attempted so a failure leaves all unwritten rows buffered
+        error = None
+        for pending_key, pending_rows in ready:
+            try:
+                self._flush_pending(pending_key, pending_rows)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def after_flush(self, callback):
+        """Run callback once every row added so far has been written"""
+        with self._lock:
+            if self._pending or self._flushing:
+                self._flush_callbacks.append(callback)
+                return
+        callback()
+
+    def _run_flush_callbacks(self):
+        with self._lock:
+            if self._pending or self._flushing:
+                return
+            callbacks = self._flush_callbacks
+            self._flush_callbacks = []
+        for callback in callbacks:
+            callback()
+
+    def _flush_pending(self, key, pending_rows):
+        table, fields = key
+        try:
+            self._flush_handler(pending_rows.rows, list(fields), table)
+        except Exception:
+            logger.warning(f'Failed to flush {len(pending_rows.rows)} buffered rows into {table}, keeping them for retry')
+            with self._lock:
+                self._flushing -= 1
+                current = self._pending.get(key)
+                if current is not None:
+                    pending_rows.rows.extend(current.rows)
+                    pending_rows.size_bytes += current.size_bytes
+                self._pending[key] = pending_rows
+                self._flushed.notify_all()
+            raise
+        with self._lock:
+            self._flushing -= 1
+            self._flushed.notify_all()
+        self._run_flush_callbacks()
+
+
+def estimate_size_bytes(rows):
+    """Approximate payload size from the first row, strings counted by length and other values as 8 bytes"""
+    sample = rows[0]
+    row_size = sum(len(value) if isinstance(value, str) else 8 for value in sample)
+    return row_size * len(rows)
@@ -0,0 +1,53 @@
+COMPRESSIONS = ('none', 'lz4', 'lz4hc', 'zstd')
+
+# Settings accepted by --insert-setting, sent along with every insert
+INSERT_SETTINGS = {
+    'insert_block_size': int,
+    'max_insert_threads': int,
+    'min_insert_block_size_rows': int,
+    'min_insert_block_size_bytes': int,
+    'async_insert': int,
+    'wait_for_async_insert': int,
+    'async_insert_busy_timeout_ms': int,
+    'insert_deduplicate': int,
+    'insert_quorum': int,
+}
+
+
+class InsertProfile:
+    """
+    ClickHouse settings sent with the inserts into each table, e.g. larger blocks
+    and more insert threads for logs, or async inserts for small tables.
+
+    Settings of table '*' apply to every table, the ones of a table override them.
+    """
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+        for table_settings in self.settings.values():
+            for name in table_settings:
+                if name not in INSERT_SETTINGS:
+                    raise ValueError(f'Unknown insert setting {name}, expected one of {sorted(INSERT_SETTINGS)}')
+        self._table_settings = {}
+
+    @classmethod
+    def parse(cls, specs):
+        """Build a profile from "name=value" (every table) or "table.name=value" specs"""
+        settings = {}
+        for spec in specs or ():
+            key, separator, value = spec.partition('=')
+            if not separator:
+                raise ValueError(f'Invalid insert setting {spec}, expected name=value or table.name=value')
+            table, _, name = key.strip().rpartition('.')
+            name = name.strip()
+            if name not in INSERT_SETTINGS:
+                raise ValueError(f'Unknown insert setting {name}, expected one of {sorted(INSERT_SETTINGS)}')
+            settings.setdefault(table.strip() or '*', {})[name] = INSERT_SETTINGS[name](value.strip())
+        return cls(settings)
+
+    def settings_for(self, table):
+        table_settings = self._table_settings.get(table)
+        if table_settings is None:
+            table_settings = dict(self.settings.get('*', {}))
+            table_settings.update(self.settings.get(table, {}))
+            self._table_settings[table] = table_settings
+        return table_settings
@@ -0,0 +1,54 @@
+from operator import itemgetter
+
+INT_FIELDS = {'number', 'timestamp', 'transaction_count', 'block_number'}
+LIST_FIELDS = {'withdrawals', 'topics'}
+SKIPPED_FIELDS = {'bucket_id'}
+
+
+def _to_int(value):
+    return None if value is None else int(value)
+
+
+def _to_list(value):
+    return value if isinstance(value, list) else []
+
+
+def build_row_converter(columns, int_fields=INT_FIELDS, list_fields=LIST_FIELDS, skipped_fields=SKIPPED_FIELDS):
+    """Build a function turning one Cassandra tuple row into one ClickHouse insert tuple.
+
+    Column positions and the coercions of clean_cassandra_data are resolved once per
+    column layout: an itemgetter picks the kept columns and only the coerced ones go
+    through a converter function, so converting a row builds no intermediate dict.
+
+    :return: (fields, convert) where fields are the ClickHouse column names in tuple order
+    """
+    fields = []
+    indexes = []
+    coercions = []
+    for index, column in enumerate(columns):
+        if column in skipped_fields:
+            continue
+        if column in int_fields:
+            coercions.append((len(fields), _to_int))
+        elif column in list_fields:
+            coercions.append((len(fields), _to_list))
+        fields.append(column)
+        indexes.append(index)
+
+    if not indexes:
+        return fields, lambda row: ()
+    if len(indexes) == 1:
+        # itemgetter of one index returns the value itself rather than a tuple
+        index = indexes[0]
+        get_values = lambda row: (row[index],)
+    else:
+        get_values = itemgetter(*indexes)
+    if not coercions:
+        return fields, get_values
+
+    def convert(row):
+        values = list(get_values(row))
+        for position, coerce in coercions:
+            values[position] = coerce(values[position])
+        return tuple(values)
+    return fields, convert
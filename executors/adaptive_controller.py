@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+
+from cassandra import OperationTimedOut, ReadTimeout, WriteTimeout
+from cassandra.cluster import NoHostAvailable
+from clickhouse_driver.errors import ErrorCodes, ServerException
+
+# ClickHouse answers these when it cannot keep up with the inserts
+CLICKHOUSE_OVERLOAD_CODES = {
+    ErrorCodes.TOO_MANY_PARTS,
+    ErrorCodes.TOO_MANY_SIMULTANEOUS_QUERIES,
+}
+CASSANDRA_OVERLOAD_EXCEPTIONS = (ReadTimeout, WriteTimeout, OperationTimedOut)
+
+
+def is_overload_error(error):
+    """True for errors meaning a cluster is overloaded rather than the batch being bad"""
+    if isinstance(error, CASSANDRA_OVERLOAD_EXCEPTIONS):
+        return True
+    if isinstance(error, ServerException):
+        return error.code in CLICKHOUSE_OVERLOAD_CODES
+    if isinstance(error, NoHostAvailable):
+        return any(is_overload_error(host_error) for host_error in error.errors.values()
+                   if isinstance(host_error, Exception))
+    return False
+
+
+class AdaptiveController:
+    """
+    Tunes batch size and in-flight batches from what the batches report back (AIMD).
+
+    Completed batches are collected in windows of about `concurrency` batches. At the
+    end of a window the throughput in rows per second is compared with the best one
+    seen so far: while it keeps up the controller probes further, growing concurrency
+    and batch size in turn by an additive step, and when it drops the last probe is
+    undone. A window whose mean batch latency exceeds target_latency_seconds shrinks
+    the batch size. An overload error (Cassandra timeouts, ClickHouse "too many parts")
+    cuts both by backoff_factor at once, at most once per window.
+    """
+    def __init__(self, batch_size, concurrency, min_batch_size=1, max_batch_size=None, min_concurrency=1,
+                 max_concurrency=None, target_latency_seconds=30, backoff_factor=0.5, tolerance=0.1):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size or batch_size * 8
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency or concurrency * 4
+        self.target_latency_seconds = target_latency_seconds
+        self.backoff_factor = backoff_factor
+        self.tolerance = tolerance
+        self.batch_size_step = max(batch_size // 4, 1)
+        self.logger = logging.getLogger('AdaptiveController')
+        self._lock = threading.Lock()
+        self._best_throughput = None
+        self._last_probe = None
+        self._next_probe = 'concurrency'
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_started_at = time.time()
+        self._window_batches = 0
+        self._window_rows = 0
+        self._window_seconds = 0.0
+        self._overloaded_in_window = False
+
+    def observe(self, seconds, rows):
+        """Record a successful batch that took `seconds` and produced `rows` rows"""
+        with self._lock:
+            self._window_batches += 1
+            self._window_rows += rows
+            self._window_seconds += seconds
+            if self._window_batches >= self.concurrency:
+                self._adjust()
+
+    def on_overload(self):
+        with self._lock:
+            if self._overloaded_in_window:
+                return
+            self.concurrency = max(int(self.concurrency * self.backoff_factor), self.min_concurrency)
+            self.batch_size = max(int(self.batch_size * self.backoff_factor), self.min_batch_size)
+            self.logger.info(f'Overload detected, backing off to batch size {self.batch_size}, '
+                             f'concurrency {self.concurrency}')
+            # The old best was measured above the sustainable load
+            self._best_throughput = None
+            self._last_probe = None
+            self._reset_window()
+            self._overloaded_in_window = True
+
+    def _adjust(self):
+        elapsed = max(time.time() - self._window_started_at, 1e-6)
+        throughput = self._window_rows / elapsed
+        latency = self._window_seconds / self._window_batches
+
+        if latency > self.target_latency_seconds:
+            self.batch_size = max(int(self.batch_size * (1 - self.tolerance * 2)), self.min_batch_size)
+            self._last_probe = None
+        elif self._best_throughput is not None and throughput < self._best_throughput * (1 - self.tolerance):
+            self._undo_probe()
+        else:
+            self._best_throughput = max(throughput, self._best_throughput or 0)
+            self._probe()
+
+        self.logger.info(f'{throughput:.0f} rows/s, {latency:.2f}s per batch, '
+                         f'now batch size {self.batch_size}, concurrency {self.concurrency}')
+        self._reset_window()
+
+    def _probe(self):
+        probe = self._next_probe
+        if probe == 'concurrency' and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+        elif self.batch_size < self.max_batch_size:
+            probe = 'batch_size'
+            self.batch_size = min(self.batch_size + self.batch_size_step, self.max_batch_size)
+        else:
+            probe = None
+        self._last_probe = probe
+        self._next_probe = 'batch_size' if self._next_probe == 'concurrency' else 'concurrency'
+
+    def _undo_probe(self):
+        if self._last_probe == 'concurrency':
+            self.concurrency = max(self.concurrency - 1, self.min_concurrency)
+        elif self._last_probe == 'batch_size':
+            self.batch_size = max(self.batch_size - self.batch_size_step, self.min_batch_size)
+        self._last_probe = None
+        # Let the best throughput decay, load on the clusters changes over a migration
+        self._best_throughput *= 1 - self.tolerance / 2
@@ -1,9 +1,11 @@
 import logging
+import threading
 import time
 from executors.fail_safe_executor import FailSafeExecutor
 from executors.bounded_executor import BoundedExecutor
 from requests.exceptions import Timeout as RequestsTimeout, HTTPError, TooManyRedirects
-from utils.executors_utils import ProgressLogger, dynamic_batch_iterator
+from executors.adaptive_controller import is_overload_error
+from utils.executors_utils import ProgressLogger, dynamic_batch_iterator, row_count_batch_iterator
 
 class RetriableValueError(ValueError):
     pass
@@ -12,14 +14,30 @@ RETRY_EXCEPTIONS = (ConnectionError, HTTPError, RequestsTimeout, TooManyRedirect
                     RetriableValueError)
 
 BATCH_CHANGE_COOLDOWN_PERIOD_SECONDS = 2 * 60
+# Caps batches of nearly empty blocks when batching by rows
+MAX_ROW_BATCH_SIZE_FACTOR = 10
 
 
 class BatchWorkExecutor:
-    def __init__(self, starting_batch_size, max_workers, retry_exceptions=RETRY_EXCEPTIONS, max_retries=3):
+    def __init__(self, starting_batch_size, max_workers, retry_exceptions=RETRY_EXCEPTIONS, max_retries=3,
+                 completed_ranges=None, commit_handler=None, controller=None, batch_rows=None,
+                 row_count_estimator=None):
+        self.starting_batch_size = starting_batch_size
         self.batch_size = starting_batch_size
         self.max_batch_size = starting_batch_size
         self.latest_batch_size_change_time = None
         self.max_workers = max_workers
+        # With an AdaptiveController the batch size and the number of batches in flight
+        # follow the controller, the pool is sized for its maximum concurrency
+        self.controller = controller
+        if controller is not None:
+            self.max_workers = controller.max_concurrency
+        self._in_flight = 0
+        self._in_flight_changed = threading.Condition()
+        # With batch_rows and a RowCountEstimator a batch closes at about batch_rows estimated
+        # rows instead of a fixed block count, scaled as the batch size above is tuned
+        self.batch_rows = batch_rows
+        self.row_count_estimator = row_count_estimator
         # Using bounded executor prevents unlimited queue growth
         # and allows monitoring in-progress futures and failing fast in case of errors.
         self.executor = FailSafeExecutor(BoundedExecutor(1, self.max_workers))
@@ -27,25 +45,94 @@ class BatchWorkExecutor:
         self.max_retries = max_retries
         self.progress_logger = ProgressLogger()
         self.logger = logging.getLogger('BatchWorkExecutor')
+        # Finished batches are recorded in completed_ranges and skipped when the work is rerun.
+        # commit_handler(callback) delays recording until the batch output is durable,
+        # e.g. ClickhouseClient.after_flush when inserts are buffered.
+        self.completed_ranges = completed_ranges
+        self.commit_handler = commit_handler
 
     def execute(self, work_iterable, work_handler, total_items=None):
         self.progress_logger.start(total_items=total_items)
-        for batch in dynamic_batch_iterator(work_iterable, lambda: self.batch_size):
+        if self.completed_ranges is not None:
+            work_iterable = self.completed_ranges.missing(work_iterable)
+        if self.controller is not None:
+            for batch in self._batches(work_iterable, lambda: self.controller.batch_size):
+                self._wait_for_slot()
+                self.executor.submit(self._fail_safe_execute, work_handler, batch)
+            return
+
+        for batch in self._batches(work_iterable, lambda: self.batch_size):
             self.executor.submit(self._fail_safe_execute, work_handler, batch)
 
+    def _batches(self, work_iterable, batch_size_getter):
+        if self.batch_rows is None or self.row_count_estimator is None:
+            return dynamic_batch_iterator(work_iterable, batch_size_getter)
+        return row_count_batch_iterator(
+            work_iterable,
+            lambda: self.batch_rows * batch_size_getter() / self.starting_batch_size,
+            self.row_count_estimator,
+            max_batch_size=self.starting_batch_size * MAX_ROW_BATCH_SIZE_FACTOR)
+
+    def _wait_for_slot(self):
+        with self._in_flight_changed:
+            while self._in_flight >= self.controller.concurrency:
+                self._in_flight_changed.wait(timeout=1)
+            self._in_flight += 1
+
+    def _release_slot(self):
+        with self._in_flight_changed:
+            self._in_flight -= 1
+            self._in_flight_changed.notify()
+
     def _fail_safe_execute(self, work_handler, batch):
-        try:
-            work_handler(batch)
-            self._try_increase_batch_size(len(batch))
-        except self.retry_exceptions:
-            self.logger.exception('An exception occurred while executing work_handler.')
-            self._try_decrease_batch_size(len(batch))
-            self.logger.info('The batch of size {} will be retried one item at a time.'.format(len(batch)))
-            # for item in batch:
-            execute_with_retries(work_handler, batch,
-                                     max_retries=self.max_retries, retry_exceptions=self.retry_exceptions)
+        if self.controller is not None:
+            try:
+                rows = self._adaptive_execute(work_handler, batch)
+            finally:
+                self._release_slot()
+        else:
+            try:
+                rows = work_handler(batch)
+                self._try_increase_batch_size(len(batch))
+            except self.retry_exceptions:
+                self.logger.exception('An exception occurred while executing work_handler.')
+                self._try_decrease_batch_size(len(batch))
+                self.logger.info('The batch of size {} will be retried one item at a time.'.format(len(batch)))
+                # for item in batch:
+                rows = execute_with_retries(work_handler, batch,
+                                         max_retries=self.max_retries, retry_exceptions=self.retry_exceptions)
 
+        if self.row_count_estimator is not None and isinstance(rows, int):
+            self.row_count_estimator.observe(batch, rows)
         self.progress_logger.track(len(batch))
+        self._record_completed(batch)
+
+    def _record_completed(self, batch):
+        if self.completed_ranges is None:
+            return
+        if self.commit_handler is not None:
+            self.commit_handler(lambda: self.completed_ranges.add_numbers(batch))
+        else:
+            self.completed_ranges.add_numbers(batch)
+
+    def _adaptive_execute(self, work_handler, batch):
+        """work_handler may return the number of rows it exported, otherwise block numbers are counted"""
+        for i in range(self.max_retries):
+            started_at = time.time()
+            try:
+                rows = work_handler(batch)
+            except Exception as e:
+                overloaded = is_overload_error(e)
+                retriable = overloaded or isinstance(e, self.retry_exceptions)
+                if not retriable or i == self.max_retries - 1:
+                    raise
+                self.logger.exception('An exception occurred while executing work_handler. Retry #{}'.format(i))
+                if overloaded:
+                    self.controller.on_overload()
+                time.sleep(2 ** i)
+                continue
+            self.controller.observe(time.time() - started_at, rows if isinstance(rows, int) else len(batch))
+            return rows
 
     # Some acceptable race conditions are possible
     def _try_decrease_batch_size(self, current_batch_size):
@@ -0,0 +1,176 @@
+import logging
+import queue
+import threading
+
+from executors.batch_work_executor import MAX_ROW_BATCH_SIZE_FACTOR, RETRY_EXCEPTIONS, execute_with_retries
+from utils.executors_utils import ProgressLogger, dynamic_batch_iterator, row_count_batch_iterator
+
+_STOP = object()
+
+
+class _BatchState:
+    """Pages of one batch may be written by any writer in any order, the batch is
+    complete once reading has finished and every emitted page has been written"""
+    def __init__(self, batch):
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._emitted = 0
+        self._written = 0
+        self._reading_done = False
+
+    def page_emitted(self):
+        with self._lock:
+            self._emitted += 1
+
+    def reading_done(self):
+        with self._lock:
+            self._reading_done = True
+            return self._written == self._emitted
+
+    def page_written(self):
+        with self._lock:
+            self._written += 1
+            return self._reading_done and self._written == self._emitted
+
+
+class PipelineWorkExecutor:
+    """Runs batches through reader -> transformer -> writer thread pools connected by
+    bounded queues, so reading batch N+1 overlaps with writing batch N.
+
+    read_handler(batch) returns an iterable of pages, transform_handler(page) returns
+    the converted page and write_handler(converted) stores it. Each stage has its own
+    pool size and pages are queued as soon as they are read, so queue_size bounds the
+    pages waiting between two stages. The first failure stops the pipeline and is
+    raised from shutdown(), like FailSafeExecutor.
+    """
+    def __init__(self, starting_batch_size, reader_workers, transformer_workers, writer_workers,
+                 queue_size=None, retry_exceptions=RETRY_EXCEPTIONS, max_retries=3,
+                 completed_ranges=None, commit_handler=None, batch_rows=None, row_count_estimator=None):
+        self.batch_size = starting_batch_size
+        self.reader_workers = reader_workers
+        self.transformer_workers = transformer_workers
+        self.writer_workers = writer_workers
+        self.queue_size = queue_size or 2 * max(reader_workers, transformer_workers, writer_workers)
+        self.retry_exceptions = retry_exceptions
+        self.max_retries = max_retries
+        self.progress_logger = ProgressLogger()
+        self.logger = logging.getLogger('PipelineWorkExecutor')
+        # See BatchWorkExecutor
+        self.completed_ranges = completed_ranges
+        self.commit_handler = commit_handler
+        self.batch_rows = batch_rows
+        self.row_count_estimator = row_count_estimator
+        self._error = None
+        self._stopped = threading.Event()
+        self._batches = None
+
+    def execute(self, work_iterable, read_handler, transform_handler, write_handler, total_items=None):
+        self.progress_logger.start(total_items=total_items)
+        self._batches = queue.Queue(self.queue_size)
+        pages = queue.Queue(self.queue_size)
+        converted_pages = queue.Queue(self.queue_size)
+
+        readers = self._start_stage(self.reader_workers, self._read, self._batches, pages, read_handler)
+        transformers = self._start_stage(self.transformer_workers, self._transform, pages, converted_pages, transform_handler)
+        writers = self._start_stage(self.writer_workers, self._write, converted_pages, None, write_handler)
+        self._stages = [(readers, pages), (transformers, converted_pages), (writers, None)]
+
+        if self.completed_ranges is not None:
+            work_iterable = self.completed_ranges.missing(work_iterable)
+        if self.batch_rows is not None and self.row_count_estimator is not None:
+            # Pages are written separately, so only the prefetched estimates are used here
+            batches = row_count_batch_iterator(work_iterable, lambda: self.batch_rows, self.row_count_estimator,
+                                               max_batch_size=self.batch_size * MAX_ROW_BATCH_SIZE_FACTOR)
+        else:
+            batches = dynamic_batch_iterator(work_iterable, lambda: self.batch_size)
+        for batch in batches:
+            if not self._put(self._batches, batch):
+                break
+
+    def _start_stage(self, worker_count, target, input_queue, output_queue, handler):
+        threads = []
+        for _ in range(worker_count):
+            thread = threading.Thread(target=self._run_worker, args=(target, input_queue, output_queue, handler), daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def _run_worker(self, target, input_queue, output_queue, handler):
+        while not self._stopped.is_set():
+            try:
+                item = input_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                return
+            try:
+                target(item, output_queue, handler)
+            except Exception as e:
+                self.logger.exception('An exception occurred in the export pipeline.')
+                if self._error is None:
+                    self._error = e
+                self._stopped.set()
+                return
+
+    def _read(self, batch, output_queue, handler):
+        # Pages are passed on as they arrive; a retried batch may re-send some of them,
+        # which ReplacingMergeTree collapses
+        batch_state = _BatchState(batch)
+
+        def read_pages():
+            for page in handler(batch):
+                batch_state.page_emitted()
+                self._put(output_queue, (batch_state, page))
+
+        execute_with_retries(read_pages, max_retries=self.max_retries, retry_exceptions=self.retry_exceptions)
+        if batch_state.reading_done():
+            self._complete_batch(batch)
+
+    def _transform(self, item, output_queue, handler):
+        batch_state, page = item
+        self._put(output_queue, (batch_state, handler(page)))
+
+    def _write(self, item, output_queue, handler):
+        batch_state, converted = item
+        execute_with_retries(handler, converted, max_retries=self.max_retries,
+                             retry_exceptions=self.retry_exceptions)
+        if batch_state.page_written():
+            self._complete_batch(batch_state.batch)
+
+    def _complete_batch(self, batch):
+        self.progress_logger.track(len(batch))
+        self._record_completed(batch)
+
+    def _record_completed(self, batch):
+        if self.completed_ranges is None:
+            return
+        if self.commit_handler is not None:
+            self.commit_handler(lambda: self.completed_ranges.add_numbers(batch))
+        else:
+            self.completed_ranges.add_numbers(batch)
+
+    def _put(self, target_queue, item):
+        """Block on a full queue, but give up once the pipeline has failed"""
+        while not self._stopped.is_set():
+            try:
+                target_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def shutdown(self):
+        if self._batches is not None:
+            self._drain_stage(self.reader_workers, self._batches, self._stages[0][0])
+            self._drain_stage(self.transformer_workers, self._stages[0][1], self._stages[1][0])
+            self._drain_stage(self.writer_workers, self._stages[1][1], self._stages[2][0])
+        if self._error is not None:
+            raise self._error
+        self.progress_logger.finish()
+
+    def _drain_stage(self, worker_count, input_queue, threads):
+        for _ in range(worker_count):
+            self._put(input_queue, _STOP)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
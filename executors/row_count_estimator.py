@@ -0,0 +1,57 @@
+import logging
+import threading
+from collections import OrderedDict
+
+
+class RowCountEstimator:
+    """
+    Estimates the rows a block produces, so batches can be sized by rows instead of blocks.
+
+    Each block gets a weight of transaction_count + 1, prefetched from the blocks table
+    prefetch_size blocks at a time, and the rows per unit of weight are learned from the
+    batches already exported (EWMA), since token transfers, logs or internal
+    transactions only scale with the transaction count. Without transaction counts
+    every block weighs 1 and the estimate is the average yield of previous batches.
+    """
+    def __init__(self, item_importer=None, use_transaction_counts=True, prefetch_size=10000, smoothing=0.2,
+                 initial_rows_per_weight=1.0):
+        self.item_importer = item_importer
+        self.use_transaction_counts = use_transaction_counts and item_importer is not None
+        self.prefetch_size = prefetch_size
+        self.smoothing = smoothing
+        self.rows_per_weight = initial_rows_per_weight
+        self.logger = logging.getLogger('RowCountEstimator')
+        self._lock = threading.Lock()
+        # Weights of batches still in flight must outlive the next prefetch
+        self._weights = OrderedDict()
+
+    def estimate(self, number):
+        return self.rows_per_weight * self._weight(number)
+
+    def observe(self, numbers, rows):
+        """Learn from a finished batch of block numbers that produced `rows` rows"""
+        with self._lock:
+            weight = sum(self._weights.get(number, 1) for number in numbers)
+            rows_per_weight = rows / weight
+            self.rows_per_weight += self.smoothing * (rows_per_weight - self.rows_per_weight)
+
+    def _weight(self, number):
+        if not self.use_transaction_counts:
+            return 1
+        with self._lock:
+            weight = self._weights.get(number)
+        if weight is None:
+            self._prefetch(number)
+            with self._lock:
+                weight = self._weights.get(number, 1)
+        return weight
+
+    def _prefetch(self, start_block):
+        numbers = list(range(start_block, start_block + self.prefetch_size))
+        transaction_counts = self.item_importer.get_transaction_counts(numbers)
+        with self._lock:
+            for number in numbers:
+                self._weights[number] = transaction_counts.get(number, 0) + 1
+            while len(self._weights) > 4 * self.prefetch_size:
+                self._weights.popitem(last=False)
+        self.logger.debug(f'Prefetched transaction counts of blocks {numbers[0]} to {numbers[-1]}')
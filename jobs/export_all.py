@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+from jobs.base_job import BaseJob
+from executors.batch_work_executor import BatchWorkExecutor
+from database.cassandra_client import TRANSACTION_RECEIPT_COLUMNS
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+ENTITIES = ['blocks', 'transactions', 'transaction_receipts', 'token_transfers', 'internal_transactions']
+
+
+class ExportAll(BaseJob):
+    """Walks the block range once and exports every selected entity per batch.
+    The entities of a batch are read concurrently, and transaction receipts are
+    projected from the transaction rows when transactions are exported too."""
+    def __init__(self, start_block, end_block, item_importer, item_exporter, batch_size, max_workers, entities=None,
+                 completed_ranges=None, controller=None, batch_rows=None, row_count_estimator=None,
+                 block_numbers=None):
+        self.start_block = start_block
+        self.end_block = end_block
+        self.block_numbers = block_numbers
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.entities = entities or ENTITIES
+        unknown_entities = set(self.entities) - set(ENTITIES)
+        if unknown_entities:
+            raise ValueError(f'Unknown entities {sorted(unknown_entities)}, expected some of {ENTITIES}')
+        self.batch_work_executor = BatchWorkExecutor(
+            starting_batch_size=batch_size,
+            max_workers=max_workers,
+            completed_ranges=completed_ranges,
+            commit_handler=item_exporter.after_flush,
+            controller=controller,
+            batch_rows=batch_rows,
+            row_count_estimator=row_count_estimator
+        )
+        self.entity_executor = ThreadPoolExecutor(max_workers=self.batch_work_executor.max_workers * len(self.entities))
+
+    def _start(self):
+        self.item_importer.open()
+
+    def _export(self):
+        _LOGGER.info(f"Exporting {', '.join(self.entities)} from {self.start_block} to {self.end_block}")
+        block_numbers = self.block_numbers if self.block_numbers is not None \
+            else range(self.start_block, self.end_block + 1)
+        total_blocks = len(block_numbers)
+
+        self.batch_work_executor.execute(
+            block_numbers,
+            self.read_and_export_all_batch,
+            total_items=total_blocks
+        )
+
+    def read_and_export_all_batch(self, block_numbers):
+        handlers = []
+        if 'blocks' in self.entities:
+            handlers.append(self._export_blocks)
+        if 'transactions' in self.entities:
+            handlers.append(self._export_transactions)
+        elif 'transaction_receipts' in self.entities:
+            handlers.append(self._export_transaction_receipts)
+        if 'token_transfers' in self.entities:
+            handlers.append(self._export_token_transfers)
+        if 'internal_transactions' in self.entities:
+            handlers.append(self._export_internal_transactions)
+
+        futures = [self.entity_executor.submit(handler, block_numbers) for handler in handlers]
+        return sum(future.result() for future in futures)
+
+    def _export_blocks(self, block_numbers):
+        blocks = self.item_importer.stream_blocks_data(block_numbers)
+        return self.item_exporter.upsert_chunks(blocks, 'blocks')
+
+    def _export_transactions(self, block_numbers):
+        export_receipts = 'transaction_receipts' in self.entities
+        row_count = 0
+        for columns, rows in self.item_importer.stream_transactions_data(block_numbers):
+            row_count += self.item_exporter.upsert_chunks([(columns, rows)], 'transactions')
+            if export_receipts:
+                receipt_getter = itemgetter(*[columns.index(column) for column in TRANSACTION_RECEIPT_COLUMNS])
+                receipts = [receipt_getter(row) for row in rows]
+                row_count += self.item_exporter.upsert_chunks([(TRANSACTION_RECEIPT_COLUMNS, receipts)], 'transaction_receipts')
+        return row_count
+
+    def _export_transaction_receipts(self, block_numbers):
+        transaction_receipts = self.item_importer.stream_transaction_receipts_data(block_numbers)
+        return self.item_exporter.upsert_chunks(transaction_receipts, 'transaction_receipts')
+
+    def _export_token_transfers(self, block_numbers):
+        token_transfers = self.item_importer.stream_token_transfers_data(block_numbers)
+        return self.item_exporter.upsert_chunks(token_transfers, 'token_transfer')
+
+    def _export_internal_transactions(self, block_numbers):
+        internal_transactions = self.item_importer.stream_internal_transactions_data(block_numbers)
+        return self.item_exporter.upsert_chunks(internal_transactions, 'internal_transactions')
+
+    def _end(self):
+        self.batch_work_executor.shutdown()
+        self.entity_executor.shutdown()
+        self.item_exporter.close()
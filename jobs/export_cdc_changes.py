@@ -0,0 +1,63 @@
+from jobs.base_job import BaseJob
+from executors.batch_work_executor import BatchWorkExecutor
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# Cassandra tables followed through CDC, each keyed by a bucket_id partition
+CDC_TABLES = ['blocks', 'transactions', 'token_transfer', 'internal_transactions', 'logs']
+
+
+class ExportCdcChanges(BaseJob):
+    """Re-exports the Cassandra partitions that CDC reported as changed.
+    Each change is a (table, bucket_id) pair, and the whole bucket is read again and
+    upserted, so ReplacingMergeTree keeps the newest version of every rewritten row."""
+    def __init__(self, changes, item_importer, item_exporter, max_workers):
+        self.changes = sorted(changes)
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.batch_work_executor = BatchWorkExecutor(
+            starting_batch_size=1,
+            max_workers=max_workers
+        )
+
+    def _start(self):
+        self.item_importer.open()
+
+    def _export(self):
+        _LOGGER.info(f"Exporting {len(self.changes)} changed partitions")
+        self.batch_work_executor.execute(
+            self.changes,
+            self.export_changes_batch,
+            total_items=len(self.changes)
+        )
+
+    def export_changes_batch(self, changes):
+        return sum(self._export_bucket(table, bucket_id) for table, bucket_id in changes)
+
+    def _export_bucket(self, table, bucket_id):
+        if table == 'logs':
+            end_block = bucket_id + self.item_importer.log_partitions - 1
+            return self.item_exporter.upsert_chunks(self.item_importer.stream_logs_data(bucket_id, end_block), 'logs')
+
+        if table == 'blocks':
+            block_numbers = list(range(bucket_id, bucket_id + self.item_importer.block_partitions))
+            return self.item_exporter.upsert_chunks(self.item_importer.stream_blocks_data(block_numbers), 'blocks')
+
+        block_numbers = list(range(bucket_id, bucket_id + self.item_importer.tx_partitions))
+        if table == 'transactions':
+            row_count = self.item_exporter.upsert_chunks(
+                self.item_importer.stream_transactions_data(block_numbers), 'transactions')
+            return row_count + self.item_exporter.upsert_chunks(
+                self.item_importer.stream_transaction_receipts_data(block_numbers), 'transaction_receipts')
+        if table == 'token_transfer':
+            return self.item_exporter.upsert_chunks(
+                self.item_importer.stream_token_transfers_data(block_numbers), 'token_transfer')
+        if table == 'internal_transactions':
+            return self.item_exporter.upsert_chunks(
+                self.item_importer.stream_internal_transactions_data(block_numbers), 'internal_transactions')
+        raise ValueError(f'Unknown CDC table {table}, expected one of {CDC_TABLES}')
+
+    def _end(self):
+        self.batch_work_executor.shutdown()
+        self.item_exporter.close()
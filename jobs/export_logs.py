@@ -0,0 +1,13 @@
+from jobs.export_table_job import ExportTableJob
+from utils.completed_ranges import to_ranges
+
+
+class ExportLogs(ExportTableJob):
+    """Exports logs with the contiguous block_number range query instead of IN-lists,
+    which CassandraClient fans out into one query per log_partitions bucket."""
+    table = 'logs'
+    entity = 'logs'
+
+    def read_batch(self, block_numbers):
+        for start_block, end_block in to_ranges(block_numbers):
+            yield from self.item_importer.stream_logs_data(start_block, end_block)
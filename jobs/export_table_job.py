@@ -0,0 +1,93 @@
+from jobs.base_job import BaseJob
+from executors.batch_work_executor import BatchWorkExecutor
+from executors.pipeline_work_executor import PipelineWorkExecutor
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ExportTableJob(BaseJob):
+    """Exports the rows of one ClickHouse table batch by batch over a block range.
+
+    Subclasses set table (and entity, the name used in log messages) and implement
+    read_batch(block_numbers), returning the (column_names, tuple_rows) pages of a
+    batch. With pipeline_workers the pages go through reader, transformer and writer
+    stages, otherwise every batch is read and written by one BatchWorkExecutor worker.
+    """
+    table = None
+    entity = None
+
+    def __init__(self, start_block, end_block, item_importer, item_exporter, batch_size, max_workers, pipeline_workers=None,
+                 completed_ranges=None, controller=None, batch_rows=None, row_count_estimator=None,
+                 block_numbers=None):
+        self.start_block = start_block
+        self.end_block = end_block
+        self.block_numbers = block_numbers
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.pipeline_workers = pipeline_workers
+        if pipeline_workers:
+            reader_workers, transformer_workers, writer_workers = pipeline_workers
+            self.batch_work_executor = PipelineWorkExecutor(
+                starting_batch_size=batch_size,
+                reader_workers=reader_workers,
+                transformer_workers=transformer_workers,
+                writer_workers=writer_workers,
+                completed_ranges=completed_ranges,
+                commit_handler=item_exporter.after_flush,
+                batch_rows=batch_rows,
+                row_count_estimator=row_count_estimator
+            )
+        else:
+            self.batch_work_executor = BatchWorkExecutor(
+                starting_batch_size=batch_size,
+                max_workers=max_workers,
+                completed_ranges=completed_ranges,
+                commit_handler=item_exporter.after_flush,
+                controller=controller,
+                batch_rows=batch_rows,
+                row_count_estimator=row_count_estimator
+            )
+
+    def _start(self):
+        self.item_importer.open()
+
+    def _export(self):
+        _LOGGER.info(f"Exporting {self.entity or self.table} from {self.start_block} to {self.end_block}")
+        block_numbers = self.block_numbers if self.block_numbers is not None \
+            else range(self.start_block, self.end_block + 1)
+        total_blocks = len(block_numbers)
+
+        if self.pipeline_workers:
+            self.batch_work_executor.execute(
+                block_numbers,
+                self.read_batch,
+                self.transform_page,
+                self.write_page,
+                total_items=total_blocks
+            )
+            return
+
+        self.batch_work_executor.execute(
+            block_numbers,
+            self.read_and_export_batch,
+            total_items=total_blocks
+        )
+
+    def read_batch(self, block_numbers):
+        raise NotImplementedError()
+
+    def read_and_export_batch(self, block_numbers):
+        return self.item_exporter.upsert_chunks(self.read_batch(block_numbers), self.table)
+
+    def transform_page(self, page):
+        columns, rows = page
+        return self.item_exporter.convert_rows(columns, rows, self.table)
+
+    def write_page(self, converted_page):
+        fields, data_tuples = converted_page
+        self.item_exporter.insert_rows(data_tuples, fields, self.table)
+
+    def _end(self):
+        self.batch_work_executor.shutdown()
+        self.item_exporter.close()
@@ -0,0 +1,57 @@
+from jobs.base_job import BaseJob
+from executors.batch_work_executor import BatchWorkExecutor
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+BLOCK_NUMBER_COLUMNS = {
+    'blocks': 'number',
+    'transactions': 'block_number',
+    'token_transfer': 'block_number',
+    'internal_transactions': 'block_number',
+}
+
+
+class ExportTokenRanges(BaseJob):
+    """Full-table migration that scans the Cassandra token ring in split_count parallel
+    sub-ranges instead of querying block numbers. start_block/end_block are optional
+    and only filter the scanned rows: the filter runs in Cassandra, but every partition
+    of the ring is still read, so a narrow block range is cheaper to export by block."""
+    def __init__(self, table, split_count, item_importer, item_exporter, max_workers, fetch_size=5000, start_block=None, end_block=None):
+        if table not in BLOCK_NUMBER_COLUMNS:
+            raise ValueError(f'Token range scan is not supported for table {table}')
+        self.table = table
+        self.split_count = split_count
+        self.fetch_size = fetch_size
+        self.start_block = start_block
+        self.end_block = end_block
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.batch_work_executor = BatchWorkExecutor(
+            starting_batch_size=1,
+            max_workers=max_workers
+        )
+
+    def _start(self):
+        self.item_importer.open()
+
+    def _export(self):
+        token_ranges = self.item_importer.split_token_ring(self.split_count)
+        _LOGGER.info(f"Scanning {self.table} in {len(token_ranges)} token ranges")
+
+        self.batch_work_executor.execute(
+            token_ranges,
+            self.read_and_export_token_range_batch,
+            total_items=len(token_ranges)
+        )
+
+    def read_and_export_token_range_batch(self, token_ranges):
+        for start_token, end_token in token_ranges:
+            pages = self.item_importer.scan_token_range(
+                self.table, start_token, end_token, fetch_size=self.fetch_size,
+                block_column=BLOCK_NUMBER_COLUMNS[self.table], start_block=self.start_block, end_block=self.end_block)
+            self.item_exporter.upsert_chunks(pages, self.table)
+
+    def _end(self):
+        self.batch_work_executor.shutdown()
+        self.item_exporter.close()
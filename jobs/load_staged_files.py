@@ -0,0 +1,54 @@
+import logging
+import os
+
+from jobs.base_job import BaseJob
+from executors.batch_work_executor import BatchWorkExecutor
+from database.clickhouse_file_exporter import LOADED_FILE_SUFFIX, list_staged_files, read_staged_file
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LoadStagedFiles(BaseJob):
+    """Loads the Parquet files staged by ClickhouseFileExporter with one large columnar
+    insert per batch_rows rows. A loaded file is renamed to *.loaded (or deleted), so a
+    rerun after a failure only loads the remaining files; a file loaded twice is
+    collapsed by ReplacingMergeTree."""
+    def __init__(self, staging_dir, tables, item_exporter, max_workers, batch_rows=1000000, delete_loaded=False):
+        self.staging_dir = staging_dir
+        self.tables = tables
+        self.item_exporter = item_exporter
+        self.batch_rows = batch_rows
+        self.delete_loaded = delete_loaded
+        self.batch_work_executor = BatchWorkExecutor(
+            starting_batch_size=1,
+            max_workers=max_workers
+        )
+
+    def _start(self):
+        self.item_exporter.init_schema()
+
+    def _export(self):
+        staged_files = [(table, path) for table in self.tables for path in list_staged_files(self.staging_dir, table)]
+        _LOGGER.info(f"Loading {len(staged_files)} staged files from {self.staging_dir}")
+
+        self.batch_work_executor.execute(
+            staged_files,
+            self.load_staged_files_batch,
+            total_items=len(staged_files)
+        )
+
+    def load_staged_files_batch(self, staged_files):
+        row_count = 0
+        for table, path in staged_files:
+            for fields, columns in read_staged_file(path, self.batch_rows):
+                self.item_exporter.insert_columns(columns, fields, table)
+                row_count += len(columns[0]) if columns else 0
+            if self.delete_loaded:
+                os.remove(path)
+            else:
+                os.replace(path, path + LOADED_FILE_SUFFIX)
+        return row_count
+
+    def _end(self):
+        self.batch_work_executor.shutdown()
+        self.item_exporter.close()
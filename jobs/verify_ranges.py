@@ -0,0 +1,135 @@
+import hashlib
+import threading
+
+from jobs.base_job import BaseJob
+from executors.batch_work_executor import BatchWorkExecutor
+from utils.block_range_utils import merge_ranges
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# Block number column and the key columns checksummed per table, present in both databases
+VERIFY_KEYS = {
+    'blocks': ('number', ('number', 'hash')),
+    'transactions': ('block_number', ('block_number', 'hash')),
+    'token_transfer': ('block_number', ('block_number', 'log_index')),
+    'internal_transactions': ('block_number', ('block_number', 'hash', 'idx')),
+    'logs': ('block_number', ('block_number', 'log_index')),
+}
+
+KEY_SEPARATOR = '|'
+EMPTY_CHECKSUM = (0, 0)
+
+
+def key_hash(values):
+    """First 8 bytes of the MD5 of the joined key as a little-endian integer, the same
+    as reinterpretAsUInt64(substring(MD5(key), 1, 8)) in ClickHouse"""
+    key = KEY_SEPARATOR.join('' if value is None else str(value) for value in values)
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'little')
+
+
+class VerifyRanges(BaseJob):
+    """
+    Compares a table between Cassandra and ClickHouse with per-range checksums: the row
+    count and the wrapping sum of key hashes of every range_size blocks, which do not
+    depend on row order. ClickHouse computes them with one grouped query per batch of
+    ranges, and the Cassandra side streams only the key columns. A range that differs
+    is halved until ranges of min_range_size blocks, which are collected in
+    mismatched_ranges to feed the repair mode.
+    """
+    def __init__(self, table, start_block, end_block, item_importer, item_exporter, max_workers,
+                 range_size=10000, min_range_size=100, ranges_per_batch=10, read_batch_size=1000):
+        if table not in VERIFY_KEYS:
+            raise ValueError(f'Unknown table {table}, expected one of {sorted(VERIFY_KEYS)}')
+        self.table = table
+        self.start_block = start_block
+        self.end_block = end_block
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.range_size = range_size
+        self.min_range_size = max(min_range_size, 1)
+        self.read_batch_size = read_batch_size
+        self.block_column, self.key_columns = VERIFY_KEYS[table]
+        self.mismatched_ranges = []
+        self._lock = threading.Lock()
+        self.batch_work_executor = BatchWorkExecutor(
+            starting_batch_size=ranges_per_batch,
+            max_workers=max_workers
+        )
+
+    def _start(self):
+        self.item_importer.open()
+
+    def _export(self):
+        _LOGGER.info(f"Verifying {self.table} from {self.start_block} to {self.end_block}")
+        ranges = [(start, min(start + self.range_size - 1, self.end_block))
+                  for start in range(self.start_block, self.end_block + 1, self.range_size)]
+        self.batch_work_executor.execute(
+            ranges,
+            self.verify_ranges_batch,
+            total_items=len(ranges)
+        )
+
+    def verify_ranges_batch(self, ranges):
+        start_block, end_block = ranges[0][0], ranges[-1][1]
+        for start, end in self._mismatches(start_block, end_block, self.range_size):
+            self._drill_down(start, end)
+        return 0
+
+    def _drill_down(self, start_block, end_block):
+        size = end_block - start_block + 1
+        if size <= self.min_range_size:
+            with self._lock:
+                self.mismatched_ranges.append((start_block, end_block))
+            return
+        for start, end in self._mismatches(start_block, end_block, (size + 1) // 2):
+            self._drill_down(start, end)
+
+    def _mismatches(self, start_block, end_block, size):
+        """Sub-ranges of size blocks of [start_block, end_block] whose checksums differ"""
+        clickhouse_checksums = self._clickhouse_checksums(start_block, end_block, size)
+        cassandra_checksums = self._cassandra_checksums(start_block, end_block, size)
+        mismatches = []
+        for index, start in enumerate(range(start_block, end_block + 1, size)):
+            if clickhouse_checksums.get(index, EMPTY_CHECKSUM) != cassandra_checksums.get(index, EMPTY_CHECKSUM):
+                mismatches.append((start, min(start + size - 1, end_block)))
+        return mismatches
+
+    def _clickhouse_checksums(self, start_block, end_block, size):
+        key = f", '{KEY_SEPARATOR}', ".join(f"ifNull(toString({column}), '')" for column in self.key_columns)
+        rows = self.item_exporter.execute_query(f"""
+            SELECT intDiv({self.block_column} - {int(start_block)}, {int(size)}) AS range_index,
+                   count(),
+                   sumWithOverflow(reinterpretAsUInt64(substring(MD5(concat({key})), 1, 8)))
+            FROM {self.item_exporter.database}.{self.table} FINAL
+            WHERE {self.block_column} >= {int(start_block)} AND {self.block_column} <= {int(end_block)}
+            GROUP BY range_index
+        """)
+        return {int(range_index): (int(count), int(hash_sum)) for range_index, count, hash_sum in rows}
+
+    def _cassandra_checksums(self, start_block, end_block, size):
+        checksums = {}
+        for read_start in range(start_block, end_block + 1, self.read_batch_size):
+            read_end = min(read_start + self.read_batch_size - 1, end_block)
+            for columns, rows in self.item_importer.stream_block_range_columns(
+                    self.table, self.key_columns, read_start, read_end):
+                block_index = columns.index(self.block_column)
+                for row in rows:
+                    range_index = (row[block_index] - start_block) // size
+                    count, hash_sum = checksums.get(range_index, EMPTY_CHECKSUM)
+                    checksums[range_index] = (count + 1, (hash_sum + key_hash(row)) % 2 ** 64)
+        return checksums
+
+    def _end(self):
+        self.batch_work_executor.shutdown()
+        self.item_importer.close()
+        self.item_exporter.close()
+        self.mismatched_ranges = merge_ranges(self.mismatched_ranges)
+        mismatched_blocks = sum(end - start + 1 for start, end in self.mismatched_ranges)
+        _LOGGER.info(f"{len(self.mismatched_ranges)} mismatched ranges covering {mismatched_blocks} blocks of {self.table}")
+
+
+def write_repair_file(repair_file, ranges):
+    with open(repair_file, 'w') as file_handle:
+        for start, end in ranges:
+            file_handle.write(f'{start}-{end}\n')
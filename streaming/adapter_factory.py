@@ -0,0 +1,37 @@
+from streaming.async_export_adapter import AsyncExportAdapter
+from streaming.export_all_adapter import ExportAllAdapter
+from streaming.export_blocks_adapter import ExportBlocksAdapter
+from streaming.export_internal_transactions_adapter import ExportInternalTransactionsAdapter
+from streaming.export_logs_adapter import ExportLogsAdapter
+from streaming.export_transaction_receipts_adapter import ExportTransactionReceiptsAdapter
+from streaming.export_transactions_adapter import ExportTransactionsAdapter
+from streaming.export_transfer_adapter import ExportTransferAdapter
+
+# Keyed by the stream_id each CLI command passes to Streamer
+ADAPTERS = {
+    'all': ExportAllAdapter,
+    'blocks': ExportBlocksAdapter,
+    'transactions': ExportTransactionsAdapter,
+    'transaction_receipts': ExportTransactionReceiptsAdapter,
+    'token_transfers': ExportTransferAdapter,
+    'internal_transactions': ExportInternalTransactionsAdapter,
+    'logs': ExportLogsAdapter,
+}
+
+
+ENGINES = ('threads', 'asyncio')
+# Streams the asyncio engine can run
+ASYNC_ADAPTERS = {
+    'all': AsyncExportAdapter,
+}
+
+
+def create_adapter(stream_id, item_importer, item_exporter, engine='threads', **adapter_kwargs):
+    adapters = ASYNC_ADAPTERS if engine == 'asyncio' else ADAPTERS
+    if stream_id not in adapters:
+        raise ValueError(f'Unknown stream {stream_id} for the {engine} engine, expected one of {sorted(adapters)}')
+    return adapters[stream_id](
+        collector_id=None,
+        item_importer=item_importer,
+        item_exporter=item_exporter,
+        **adapter_kwargs)
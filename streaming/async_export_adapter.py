@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+from database.cassandra_client import TRANSACTION_RECEIPT_COLUMNS
+from executors.adaptive_controller import is_overload_error
+from executors.batch_work_executor import RETRY_EXCEPTIONS
+from jobs.export_all import ENTITIES
+from utils.executors_utils import ProgressLogger, dynamic_batch_iterator
+
+logger = logging.getLogger('Async Export Adapter')
+
+ENTITY_TABLES = {
+    'blocks': 'blocks',
+    'transactions': 'transactions',
+    'transaction_receipts': 'transaction_receipts',
+    'token_transfers': 'token_transfer',
+    'internal_transactions': 'internal_transactions',
+}
+
+
+class AsyncExportAdapter:
+    """
+    asyncio engine for the export_all stream, driven by Streamer like the thread adapters.
+
+    One event loop schedules every Cassandra bucket query of every batch and entity,
+    keeping up to max_in_flight_reads of them in flight through the driver's async
+    futures. Converted pages are inserted from a pool of writer_workers threads, since
+    ClickhouseClient is blocking; writes in flight are bounded by that pool, and each
+    reader waits for its page to be written before it fetches the next one.
+    """
+    def __init__(
+            self,
+            batch_size,
+            max_workers,
+            collector_id,
+            item_importer,
+            item_exporter,
+            entities=None,
+            completed_ranges=None,
+            max_in_flight_reads=256,
+            max_retries=3,
+    ):
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.collector_id = collector_id
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.entities = entities or ENTITIES
+        unknown_entities = set(self.entities) - set(ENTITIES)
+        if unknown_entities:
+            raise ValueError(f'Unknown entities {sorted(unknown_entities)}, expected some of {ENTITIES}')
+        self.completed_ranges = completed_ranges
+        self.max_in_flight_reads = max_in_flight_reads
+        self.max_retries = max_retries
+        self._writer_pool = None
+
+    def open(self):
+        self.item_importer.open()
+        self._writer_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def close(self):
+        if self._writer_pool is not None:
+            self._writer_pool.shutdown(wait=True)
+            self._writer_pool = None
+        self.item_exporter.close()
+        self.item_importer.close()
+
+    def get_current_block_number(self):
+        return self.item_importer.get_latest_block_number()
+
+    def export_all(self, start_block, end_block):
+        asyncio.run(self._export_range(start_block, end_block))
+
+    async def _export_range(self, start_block, end_block):
+        logger.info(f"Exporting {', '.join(self.entities)} from {start_block} to {end_block} with asyncio")
+        self._reads = asyncio.Semaphore(self.max_in_flight_reads)
+        progress_logger = ProgressLogger()
+        progress_logger.start(total_items=end_block - start_block + 1)
+
+        block_numbers = range(start_block, end_block + 1)
+        if self.completed_ranges is not None:
+            block_numbers = self.completed_ranges.missing(block_numbers)
+        tasks = [asyncio.ensure_future(self._export_batch(batch, progress_logger))
+                 for batch in dynamic_batch_iterator(block_numbers, lambda: self.batch_size)]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        progress_logger.finish()
+
+    async def _export_batch(self, block_numbers, progress_logger):
+        entities = [entity for entity in self.entities
+                    if not (entity == 'transaction_receipts' and 'transactions' in self.entities)]
+        await asyncio.gather(*[
+            self._export_statement(entity, statement)
+            for entity in entities
+            for statement in self.item_importer.entity_statements(entity, block_numbers)
+        ])
+        progress_logger.track(len(block_numbers))
+        if self.completed_ranges is not None:
+            self.item_exporter.after_flush(lambda: self.completed_ranges.add_numbers(block_numbers))
+
+    async def _export_statement(self, entity, statement):
+        # Pages re-sent by a retry are collapsed by ReplacingMergeTree
+        for i in range(self.max_retries):
+            try:
+                async with self._reads:
+                    async for columns, rows in self.item_importer.stream_pages_async(statement):
+                        await self._write_page(entity, columns, rows)
+                return
+            except Exception as e:
+                if not (is_overload_error(e) or isinstance(e, RETRY_EXCEPTIONS)) or i == self.max_retries - 1:
+                    raise
+                logger.exception(f'An exception occurred while exporting {entity}. Retry #{i}')
+                await asyncio.sleep(2 ** i)
+
+    async def _write_page(self, entity, columns, rows):
+        loop = asyncio.get_running_loop()
+        writes = [loop.run_in_executor(self._writer_pool, self.item_exporter.upsert_chunks,
+                                       [(columns, rows)], ENTITY_TABLES[entity])]
+        if entity == 'transactions' and 'transaction_receipts' in self.entities:
+            receipt_getter = itemgetter(*[columns.index(column) for column in TRANSACTION_RECEIPT_COLUMNS])
+            receipts = [receipt_getter(row) for row in rows]
+            writes.append(loop.run_in_executor(self._writer_pool, self.item_exporter.upsert_chunks,
+                                               [(TRANSACTION_RECEIPT_COLUMNS, receipts)], 'transaction_receipts'))
+        await asyncio.gather(*writes)
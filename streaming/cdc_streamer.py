@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import time
+
+from database.cdc_commit_log import list_cdc_segments, read_commit_log_entries, parse_mutation, decode_bucket_id
+from jobs.export_cdc_changes import ExportCdcChanges, CDC_TABLES
+
+
+class CdcStreamer:
+    """
+    Keeps ClickHouse in sync with rows rewritten in Cassandra by tailing the CDC commit
+    log segments Cassandra leaves in cdc_raw.
+
+    Mutations are decoded only as far as their table id and partition key: each one
+    marks a (table, bucket_id) partition of the keyspace as changed, and every
+    max_changes partitions (or at the end of the durable part of a segment) the changed
+    buckets are re-read from Cassandra and upserted by ExportCdcChanges. The offset
+    reached in each segment is then saved in offsets_file, so a restart resumes after
+    the last applied sync section and re-applies at most one micro-batch.
+
+    Cassandra stops accepting writes to CDC tables once cdc_raw is full, so completed
+    segments should be removed once consumed (delete_consumed) or by another process.
+    Deletions are not propagated: a bucket re-read after a delete drops nothing in
+    ClickHouse.
+
+    Every new block written to Cassandra is a CDC mutation too, so while the chain is
+    followed each micro-batch re-reads the whole hot bucket of every table, e.g. up to
+    block_partitions blocks of blocks, on top of what the block streams export.
+
+    apply_changes(changes) replaces the re-read and upsert, and together with table_ids
+    lets the change detection run without a cluster, e.g. against captured segments.
+    Without offsets_file the offsets are only kept in memory.
+    """
+    def __init__(
+            self,
+            cdc_raw_dir,
+            item_importer,
+            item_exporter,
+            max_workers,
+            offsets_file='cdc_offsets.json',
+            table_ids=None,
+            max_changes=1000,
+            period_seconds=10,
+            delete_consumed=False,
+            apply_changes=None,
+    ):
+        self.cdc_raw_dir = cdc_raw_dir
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.max_workers = max_workers
+        self.offsets_file = offsets_file
+        # uuid.UUID -> table name of the keyspace, read from system_schema unless given
+        self.table_ids = table_ids
+        self.max_changes = max_changes
+        self.period_seconds = period_seconds
+        self.delete_consumed = delete_consumed
+        self.apply_changes = apply_changes or self._export_changes
+        self.offsets = read_offsets(offsets_file) if offsets_file else {}
+
+    def stream(self):
+        while True:
+            if self.sync_once() == 0:
+                logging.info('No CDC changes. Sleeping for {} seconds...'.format(self.period_seconds))
+                time.sleep(self.period_seconds)
+
+    def sync_once(self):
+        """Apply every durable change found in cdc_raw. Returns the number of changed partitions."""
+        if self.table_ids is None:
+            self.table_ids = {table_id: table for table_id, table in self.item_importer.get_table_ids().items()
+                              if table in CDC_TABLES}
+        segments = list_cdc_segments(self.cdc_raw_dir)
+        self._forget_missing_segments(segments)
+
+        total_changes = 0
+        for segment in segments:
+            total_changes += self._sync_segment(segment)
+        return total_changes
+
+    def _sync_segment(self, segment):
+        resume_offset = self.offsets.get(segment.name, 0)
+        changes = set()
+        total_changes = 0
+        for section_end, mutation_bytes in read_commit_log_entries(segment.path, resume_offset, segment.durable_offset):
+            if mutation_bytes is not None:
+                changes.update(self._changed_partitions(mutation_bytes))
+                continue
+            # Only the end of a sync section is a safe place to resume from
+            resume_offset = section_end
+            if len(changes) >= self.max_changes:
+                total_changes += self._apply(changes)
+                changes = set()
+                self._commit(segment.name, resume_offset)
+        total_changes += self._apply(changes)
+        if resume_offset != self.offsets.get(segment.name, 0):
+            self._commit(segment.name, resume_offset)
+
+        # A completed segment has been read up to its final durable offset
+        if segment.completed and self.delete_consumed:
+            logging.info('Deleting consumed CDC segment {}'.format(segment.name))
+            os.remove(segment.path)
+            os.remove(segment.index_path)
+            # A segment with no new sync section in this run may have no offset yet
+            self.offsets.pop(segment.name, None)
+            self._save_offsets()
+        return total_changes
+
+    def _changed_partitions(self, mutation_bytes):
+        update_count, table_id, partition_key = parse_mutation(mutation_bytes)
+        table = self.table_ids.get(table_id)
+        if table is None:
+            # Another keyspace, or a table that is not exported
+            return []
+        bucket_id = decode_bucket_id(partition_key)
+        if update_count > 1:
+            # The other tables of the mutation share its partition key but are not decoded
+            return [(cdc_table, bucket_id) for cdc_table in CDC_TABLES]
+        return [(table, bucket_id)]
+
+    def _apply(self, changes):
+        if not changes:
+            return 0
+        self.apply_changes(changes)
+        return len(changes)
+
+    def _export_changes(self, changes):
+        job = ExportCdcChanges(
+            changes=changes,
+            item_importer=self.item_importer,
+            item_exporter=self.item_exporter,
+            max_workers=self.max_workers)
+        job.run()
+
+    def _commit(self, segment_name, offset):
+        self.offsets[segment_name] = offset
+        self._save_offsets()
+
+    def _save_offsets(self):
+        if self.offsets_file:
+            write_offsets(self.offsets_file, self.offsets)
+
+    def _forget_missing_segments(self, segments):
+        names = {segment.name for segment in segments}
+        missing = [name for name in self.offsets if name not in names]
+        for name in missing:
+            del self.offsets[name]
+        if missing:
+            self._save_offsets()
+
+
+def read_offsets(offsets_file):
+    if not os.path.isfile(offsets_file):
+        return {}
+    with open(offsets_file, 'r') as file_handle:
+        content = file_handle.read().strip()
+    return json.loads(content) if content else {}
+
+
+def write_offsets(offsets_file, offsets):
+    tmp_file = offsets_file + '.tmp'
+    with open(tmp_file, 'w') as file_handle:
+        json.dump(offsets, file_handle)
+        file_handle.flush()
+        os.fsync(file_handle.fileno())
+    os.replace(tmp_file, offsets_file)
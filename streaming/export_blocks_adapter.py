@@ -1,3 +1,5 @@
+from executors.adaptive_controller import AdaptiveController
+from executors.row_count_estimator import RowCountEstimator
 from jobs.export_blocks import ExportBlocks
 
 class ExportBlocksAdapter:
@@ -8,12 +10,24 @@ class ExportBlocksAdapter:
             collector_id,
             item_importer,
             item_exporter,
+            pipeline_workers=None,
+            completed_ranges=None,
+            adaptive=False,
+            batch_rows=None,
     ):
         self.batch_size = batch_size
         self.max_workers = max_workers
         self.collector_id = collector_id
         self.item_importer = item_importer
         self.item_exporter = item_exporter
+        self.pipeline_workers = pipeline_workers
+        self.completed_ranges = completed_ranges
+        # One controller for the whole stream, so what it learns carries over between jobs
+        self.controller = AdaptiveController(batch_size, max_workers) if adaptive else None
+        self.batch_rows = batch_rows
+        # Blocks are one row each, so only the observed yield is used
+        self.row_count_estimator = RowCountEstimator(item_importer, use_transaction_counts=False) \
+            if batch_rows else None
 
     def open(self):
         self.item_importer.open()
@@ -22,12 +36,16 @@ class ExportBlocksAdapter:
         self.item_importer.close()
 
     def get_current_block_number(self):
-        return 2e32
+        return self.item_importer.get_latest_block_number()
 
     def export_all(self, start_block, end_block):
         self._export_blocks(start_block, end_block)
 
-    def _export_blocks(self, start_block, end_block):
+    def export_block_numbers(self, block_numbers):
+        """Export an explicit, sorted list of block numbers, e.g. gaps to repair"""
+        self._export_blocks(block_numbers[0], block_numbers[-1], block_numbers=block_numbers)
+
+    def _export_blocks(self, start_block, end_block, block_numbers=None):
         job = ExportBlocks(
             start_block=start_block,
             end_block=end_block,
@@ -35,5 +53,11 @@ class ExportBlocksAdapter:
             max_workers=self.max_workers,
             item_importer=self.item_importer,
             item_exporter=self.item_exporter,
+            pipeline_workers=self.pipeline_workers,
+            completed_ranges=self.completed_ranges,
+            controller=self.controller,
+            batch_rows=self.batch_rows,
+            row_count_estimator=self.row_count_estimator,
+            block_numbers=block_numbers,
         )
         job.run()
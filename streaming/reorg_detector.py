@@ -0,0 +1,70 @@
+import logging
+from collections import deque
+
+# ClickHouse tables each single-entity stream writes, cleared from the fork block on a reorg
+STREAM_TABLES = {
+    'blocks': ['blocks'],
+    'transactions': ['transactions'],
+    'transaction_receipts': ['transaction_receipts'],
+    'token_transfers': ['token_transfer'],
+    'internal_transactions': ['internal_transactions'],
+    'logs': ['logs'],
+}
+
+
+class ReorgDetector:
+    """
+    Remembers (number, hash, parent_hash) of the last `depth` synced blocks to notice
+    when Cassandra replaces them after a chain reorganization.
+
+    find_fork() reads the hashes of the remembered blocks and of the block after them
+    again: the first block whose hash changed, or whose successor no longer points to
+    it, is where the chains fork. rollback() then deletes the rows of the stream's
+    tables from that block on with a lightweight DELETE, so the Streamer can export
+    the new chain again from there. A reorg deeper than depth is not detected.
+    """
+    def __init__(self, item_importer, item_exporter, tables, depth=64):
+        self.item_importer = item_importer
+        self.item_exporter = item_exporter
+        self.tables = tables
+        self.depth = depth
+        self.logger = logging.getLogger('ReorgDetector')
+        self._blocks = deque(maxlen=depth)
+
+    def record(self, start_block, end_block):
+        """Remember the tail of a range that has just been synced"""
+        start_block = max(start_block, end_block - self.depth + 1)
+        if self._blocks and self._blocks[-1][0] != start_block - 1:
+            # Not contiguous with what is remembered, e.g. after a restart
+            self._blocks.clear()
+        self._blocks.extend(self._read_blocks(range(start_block, end_block + 1)))
+
+    def find_fork(self):
+        """Lowest remembered block number that is no longer on the chain, or None"""
+        if not self._blocks:
+            return None
+        last_number = self._blocks[-1][0]
+        numbers = [number for number, _, _ in self._blocks] + [last_number + 1]
+        current = {number: (block_hash, parent_hash) for number, block_hash, parent_hash in self._read_blocks(numbers)}
+
+        for number, block_hash, _ in self._blocks:
+            current_block = current.get(number)
+            if current_block is None or current_block[0] != block_hash:
+                return number
+        next_block = current.get(last_number + 1)
+        if next_block is not None and next_block[1] != self._blocks[-1][1]:
+            # The newest block was replaced but its row is not rewritten yet
+            return last_number
+        return None
+
+    def rollback(self, fork_block):
+        """Delete the rows synced from fork_block on and forget those blocks"""
+        self.logger.warning(f'Chain reorganization from block {fork_block}, deleting {", ".join(self.tables)} rows')
+        for table in self.tables:
+            self.item_exporter.delete_from_block(table, fork_block)
+        while self._blocks and self._blocks[-1][0] >= fork_block:
+            self._blocks.pop()
+
+    def _read_blocks(self, numbers):
+        blocks = self.item_importer.get_block_hashes(numbers)
+        return sorted((int(block['number']), block['hash'], block['parent_hash']) for block in blocks)
@@ -0,0 +1,191 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from database.cassandra_client import CassandraClient
+from database.exporter_factory import create_item_exporter
+from streaming.adapter_factory import create_adapter
+from streaming.streamer import Streamer, completed_ranges_file, read_last_synced_block, stream_last_synced_block_file
+from utils.completed_ranges import CompletedRanges
+from utils.logging_utils import logging_basic_config
+
+
+class ShardedStreamer:
+    """
+    Runs one stream in several worker processes to get past the GIL.
+    [start_block, end_block] is split into `processes` shards whose boundaries are
+    multiples of shard_alignment, so shards never share a Cassandra bucket. Every
+    process builds its own importer/exporter pair and runs a Streamer over its shard
+    with its own checkpoint file. The shard plan is saved to a manifest next to
+    last_synced_block_file and reused by every later run, so a restart resumes each
+    shard where it stopped even if the chain head or --processes changed meanwhile.
+    The parent only reports progress from the shard checkpoints.
+    Without end_block, the range ends at the chain head (minus lag) when the run is planned.
+    """
+    def __init__(
+        self,
+        stream_id,
+        start_block,
+        end_block,
+        processes,
+        importer_kwargs,
+        exporter_kwargs,
+        adapter_kwargs,
+        block_batch_size=100,
+        shard_alignment=1,
+        last_synced_block_file=None,
+        period_seconds=10,
+        lag=0,
+        checkpoint_seconds=0
+    ):
+        self.stream_id = stream_id
+        self.start_block = start_block
+        self.end_block = end_block
+        self.processes = processes
+        self.importer_kwargs = importer_kwargs
+        self.exporter_kwargs = exporter_kwargs
+        self.adapter_kwargs = adapter_kwargs
+        self.block_batch_size = block_batch_size
+        self.shard_alignment = shard_alignment
+        self.last_synced_block_file = last_synced_block_file or stream_last_synced_block_file(stream_id)
+        self.period_seconds = period_seconds
+        self.lag = lag
+        self.checkpoint_seconds = checkpoint_seconds
+
+    def stream(self):
+        shards = self._plan()
+        if all(self._shard_done(shard_start, shard_end) for shard_start, shard_end in shards):
+            logging.info('Every shard of {} in {} is exported already, remove {} to plan a new run'.format(
+                self.stream_id, self._manifest_file(), self._manifest_file()))
+            return
+        logging.info('Running {} in {} shards: {}'.format(self.stream_id, len(shards), shards))
+
+        context = multiprocessing.get_context('spawn')
+        workers = []
+        for shard_start, shard_end in shards:
+            worker = context.Process(
+                target=run_shard,
+                args=(self.stream_id, shard_start, shard_end, self._shard_file(shard_start, shard_end),
+                      self.importer_kwargs, self.exporter_kwargs, self.adapter_kwargs, self.block_batch_size,
+                      self.checkpoint_seconds),
+                name=f'{self.stream_id}-{shard_start}-{shard_end}')
+            worker.start()
+            workers.append((worker, shard_start, shard_end))
+
+        while any(worker.is_alive() for worker, _, _ in workers):
+            self._log_progress(shards)
+            time.sleep(self.period_seconds)
+        self._log_progress(shards)
+
+        failed_shards = [(shard_start, shard_end) for worker, shard_start, shard_end in workers if worker.exitcode != 0]
+        if failed_shards:
+            raise RuntimeError(f'Shards {failed_shards} of {self.stream_id} failed, rerun to resume them')
+
+    def _plan(self):
+        """The shards of the manifest if there is one, otherwise a new plan saved to it"""
+        manifest_file = self._manifest_file()
+        if os.path.isfile(manifest_file):
+            with open(manifest_file, 'r') as file_handle:
+                manifest = json.load(file_handle)
+            requested = (self.start_block, self.end_block, self.processes, self.shard_alignment)
+            planned = (manifest['start_block'], manifest['end_block'], manifest['processes'], manifest['alignment'])
+            if any(value is not None and value != planned_value for value, planned_value in zip(requested, planned)):
+                logging.warning('Resuming the plan of {} (start, end, processes, alignment) {} instead of {}'.format(
+                    manifest_file, planned, requested))
+            self.start_block, self.end_block = manifest['start_block'], manifest['end_block']
+            return [tuple(shard) for shard in manifest['shards']]
+
+        if self.end_block is None:
+            self.end_block = CassandraClient(**self.importer_kwargs).get_latest_block_number() - self.lag
+            logging.info('Exporting {} up to the chain head {}'.format(self.stream_id, self.end_block))
+        shards = split_block_range(self.start_block, self.end_block, self.processes, self.shard_alignment)
+        manifest = dict(start_block=self.start_block, end_block=self.end_block, processes=self.processes,
+                        alignment=self.shard_alignment, shards=shards)
+        tmp_file = manifest_file + '.tmp'
+        with open(tmp_file, 'w') as file_handle:
+            json.dump(manifest, file_handle)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        os.replace(tmp_file, manifest_file)
+        return shards
+
+    def _manifest_file(self):
+        root, _ = os.path.splitext(self.last_synced_block_file)
+        return root + '.shards.json'
+
+    def _shard_done(self, shard_start, shard_end):
+        shard_file = self._shard_file(shard_start, shard_end)
+        try:
+            return os.path.isfile(shard_file) and read_last_synced_block(shard_file) >= shard_end
+        except ValueError:
+            return False
+
+    def _shard_file(self, shard_start, shard_end):
+        root, ext = os.path.splitext(self.last_synced_block_file)
+        return f'{root}.{shard_start}-{shard_end}{ext}'
+
+    def _log_progress(self, shards):
+        synced_blocks = 0
+        for shard_start, shard_end in shards:
+            shard_file = self._shard_file(shard_start, shard_end)
+            if os.path.isfile(shard_file):
+                try:
+                    last_synced_block = read_last_synced_block(shard_file)
+                except ValueError:
+                    continue
+                synced_blocks += max(min(last_synced_block, shard_end) - shard_start + 1, 0)
+        total_blocks = self.end_block - self.start_block + 1
+        logging.info('Synced {} of {} blocks ({}%) across {} shards'.format(
+            synced_blocks, total_blocks, int(synced_blocks * 100 / total_blocks), len(shards)))
+
+
+def run_shard(stream_id, start_block, end_block, last_synced_block_file, importer_kwargs, exporter_kwargs,
+              adapter_kwargs, block_batch_size, checkpoint_seconds=0):
+    logging_basic_config()
+
+    item_importer = CassandraClient(**importer_kwargs)
+    item_exporter = create_item_exporter(**exporter_kwargs)
+    completed_ranges = CompletedRanges(completed_ranges_file(last_synced_block_file))
+    adapter = create_adapter(stream_id, item_importer=item_importer, item_exporter=item_exporter,
+                             completed_ranges=completed_ranges, **adapter_kwargs)
+
+    # An existing checkpoint means this shard is being resumed
+    resume = os.path.isfile(last_synced_block_file)
+    streamer = Streamer(
+        blockchain_streamer_adapter=adapter,
+        last_synced_block_file=last_synced_block_file,
+        lag=0,
+        start_block=None if resume else start_block,
+        end_block=end_block,
+        block_batch_size=block_batch_size,
+        retry_errors=False,
+        stream_id=stream_id,
+        exporter=item_exporter,
+        completed_ranges=completed_ranges,
+        checkpoint_seconds=checkpoint_seconds
+    )
+    streamer.stream()
+
+
+def split_block_range(start_block, end_block, shard_count, alignment=1):
+    """Split [start_block, end_block] into at most shard_count contiguous shards
+    whose inner boundaries are multiples of alignment"""
+    alignment = max(int(alignment), 1)
+    shard_size = (end_block - start_block + 1) / max(int(shard_count), 1)
+    shards = []
+    shard_start = start_block
+    for i in range(1, shard_count + 1):
+        if i == shard_count:
+            shard_end = end_block
+        else:
+            boundary = int(start_block + shard_size * i)
+            shard_end = round(boundary / alignment) * alignment - 1
+        if shard_end < shard_start:
+            continue
+        shards.append((shard_start, min(shard_end, end_block)))
+        shard_start = shard_end + 1
+        if shard_start > end_block:
+            break
+    return shards
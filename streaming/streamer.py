@@ -13,12 +13,19 @@ class Streamer:
         * or from start_block -> end_block
     Properties:
         blockchain_streamer_adapter: the StreamerAdapter that needs running
-        start_block: optional, the first block to crawl
+        start_block: optional, the first block to crawl; omit it to resume from last_synced_block_file
         end_block: optional, the las block to crawl
         periods_seconds: time sleep
         last_synced_block_file: for last_synced_block be used as start_block instead
         block_batch_size: for (start_block + block_batch_sized) to be used as end_block
         stream_id: id of the collector a.k.a. the collector's type (saved on exporter database)
+        completed_ranges: optional CompletedRanges of batches finished out of order, the checkpoint
+            moves past any of them that continue it, so a restart skips work already done
+        reorg_detector: optional ReorgDetector, checked before every cycle; on a reorg the rows
+            from the fork block on are deleted and the stream rewinds to re-export them
+        checkpoint_seconds: 0 writes last_synced_block after every cycle. Otherwise it is
+            written at most this often (and whenever the stream catches up or ends), after
+            flushing the exporter, so buffered inserts can span several cycles
     """
     def __init__(
         self,
@@ -34,7 +41,10 @@ class Streamer:
         stream_id=None,
         exporter=None,
         chain_id=None,
-        monitor=False
+        monitor=False,
+        completed_ranges=None,
+        reorg_detector=None,
+        checkpoint_seconds=0
     ):
         self.monitor = monitor
         self.chain_id = chain_id
@@ -49,11 +59,24 @@ class Streamer:
         self.pid_file = pid_file
         self.stream_id = stream_id
         self.exporter = exporter
-
-        if self.start_block is not None or not os.path.isfile(self.last_synced_block_file):
-            init_last_synced_block_file((self.start_block or 0) - 1, self.last_synced_block_file)
+        self.completed_ranges = completed_ranges
+        self.reorg_detector = reorg_detector
+        self.checkpoint_seconds = checkpoint_seconds
+
+        if self.start_block is not None:
+            init_last_synced_block_file(self.start_block - 1, self.last_synced_block_file)
+            if self.completed_ranges is not None:
+                # An explicit start block begins a new run, ranges left over from an earlier one do not belong to it
+                self.completed_ranges.clear()
+        elif not os.path.isfile(self.last_synced_block_file):
+            # Completed ranges are kept: they still record what was exported past the lost checkpoint
+            init_last_synced_block_file(-1, self.last_synced_block_file)
 
         self.last_synced_block = read_last_synced_block(self.last_synced_block_file)
+        if self.completed_ranges is not None:
+            self.last_synced_block = self.completed_ranges.contiguous_end(self.last_synced_block + 1)
+        self._checkpointed_block = self.last_synced_block
+        self._checkpointed_at = time.time()
 
     #     self.update_start_extract_at()
 
@@ -98,9 +121,15 @@ class Streamer:
             if synced_blocks <= 0:
                 logging.info('Nothing to sync. Sleeping for {} seconds...'.format(self.period_seconds))
                 time.sleep(self.period_seconds)
+        self._checkpoint()
 
     def _sync_cycle(self):
         """Make the StreamerAdapter process from last_synced_block+1 to target_block"""
+        if self.reorg_detector is not None:
+            fork_block = self.reorg_detector.find_fork()
+            if fork_block is not None and fork_block <= self.last_synced_block:
+                self._rewind(fork_block)
+
         current_block = self.blockchain_streamer_adapter.get_current_block_number()  # current block of collector
         target_block = self._calculate_target_block(current_block, self.last_synced_block)  # target block of worker
         blocks_to_sync = max(target_block - self.last_synced_block, 0)
@@ -109,16 +138,46 @@ class Streamer:
 
         if blocks_to_sync != 0:
             self.blockchain_streamer_adapter.export_all(self.last_synced_block + 1, target_block)
-            logging.info('Writing last synced block {}'.format(target_block))
-            write_last_synced_block(self.last_synced_block_file, target_block)
-            if self.monitor:
-                write_monitor_logs(f"{self.chain_id}_{self.stream_id}", target_block, self.chain_id)
-            # if self.exporter:
-            #     self.exporter.update_latest_updated_at(self.stream_id, target_block)
+            if self.reorg_detector is not None:
+                self.reorg_detector.record(self.last_synced_block + 1, target_block)
             self.last_synced_block = target_block
 
+        # A short cycle means the stream caught up, so it is about to sleep
+        if self.checkpoint_seconds <= 0 or blocks_to_sync < self.block_batch_size \
+                or time.time() - self._checkpointed_at >= self.checkpoint_seconds:
+            self._checkpoint()
+
         return blocks_to_sync
 
+    def _checkpoint(self):
+        """Write last_synced_block once the rows exported up to it are in the exporter"""
+        if self.last_synced_block == self._checkpointed_block:
+            return
+        if self.exporter is not None:
+            self.exporter.flush()
+        target_block = self.last_synced_block
+        logging.info('Writing last synced block {}'.format(target_block))
+        write_last_synced_block(self.last_synced_block_file, target_block)
+        if self.completed_ranges is not None:
+            self.completed_ranges.discard_below(target_block)
+        if self.monitor:
+            write_monitor_logs(f"{self.chain_id}_{self.stream_id}", target_block, self.chain_id)
+        # if self.exporter:
+        #     self.exporter.update_latest_updated_at(self.stream_id, target_block)
+        self._checkpointed_block = target_block
+        self._checkpointed_at = time.time()
+
+    def _rewind(self, fork_block):
+        self.reorg_detector.rollback(fork_block)
+        logging.info('Rewinding last synced block from {} to {}'.format(self.last_synced_block, fork_block - 1))
+        write_last_synced_block(self.last_synced_block_file, fork_block - 1)
+        if self.completed_ranges is not None:
+            # Every completed range lies past the checkpoint, so past the fork too
+            self.completed_ranges.clear()
+        self.last_synced_block = fork_block - 1
+        self._checkpointed_block = fork_block - 1
+        self._checkpointed_at = time.time()
+
     def _calculate_target_block(self, current_block, last_synced_block):
         """target_block: next block for the collector
         = min(last_synced_block + self.block_batch_size, current_block - self.lag, self.end_block)
@@ -136,6 +195,17 @@ def delete_file(file):
         pass
 
 
+def stream_last_synced_block_file(stream_id):
+    """The checkpoint file of a stream, named after it so streams run from one directory never share one"""
+    return f'last_synced_block.{stream_id}.txt'
+
+
+def completed_ranges_file(last_synced_block_file):
+    """The file holding the out-of-order completed ranges next to a checkpoint file"""
+    root, _ = os.path.splitext(last_synced_block_file)
+    return root + '.ranges.json'
+
+
 def write_last_synced_block(file, last_synced_block):
     write_to_file(file, str(last_synced_block) + '\n')
 
@@ -0,0 +1,238 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('Work Coordinator')
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+
+
+class SqliteChunkStore:
+    """Chunk state in a local SQLite file. Leasing is a single IMMEDIATE transaction,
+    so it is safe for any number of worker processes sharing the file."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                stream_id TEXT NOT NULL,
+                start_block INTEGER NOT NULL,
+                end_block INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                PRIMARY KEY (stream_id, start_block)
+            )
+        """)
+
+    def create_chunks(self, stream_id, chunks):
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO chunks (stream_id, start_block, end_block, status) VALUES (?, ?, ?, ?)',
+                [(stream_id, start_block, end_block, PENDING) for start_block, end_block in chunks])
+
+    def lease(self, stream_id, worker_id, lease_seconds):
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                row = cursor.execute(
+                    'SELECT start_block, end_block FROM chunks '
+                    'WHERE stream_id = ? AND (status = ? OR (status = ? AND lease_expires_at < ?)) '
+                    'ORDER BY start_block LIMIT 1',
+                    (stream_id, PENDING, LEASED, now)).fetchone()
+                if row is not None:
+                    cursor.execute(
+                        'UPDATE chunks SET status = ?, worker_id = ?, lease_expires_at = ? '
+                        'WHERE stream_id = ? AND start_block = ?',
+                        (LEASED, worker_id, now + lease_seconds, stream_id, row[0]))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+        return tuple(row) if row is not None else None
+
+    def renew(self, stream_id, chunk, worker_id, lease_seconds):
+        with self._lock:
+            cursor = self._connection.execute(
+                'UPDATE chunks SET lease_expires_at = ? '
+                'WHERE stream_id = ? AND start_block = ? AND worker_id = ? AND status = ?',
+                (time.time() + lease_seconds, stream_id, chunk[0], worker_id, LEASED))
+        return cursor.rowcount == 1
+
+    def complete(self, stream_id, chunk, worker_id):
+        """Mark a chunk done if worker_id still holds its lease. Returns whether it did."""
+        with self._lock:
+            cursor = self._connection.execute(
+                'UPDATE chunks SET status = ?, lease_expires_at = NULL '
+                'WHERE stream_id = ? AND start_block = ? AND worker_id = ? AND status = ?',
+                (DONE, stream_id, chunk[0], worker_id, LEASED))
+        return cursor.rowcount == 1
+
+    def count_by_status(self, stream_id):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT status, count(*) FROM chunks WHERE stream_id = ? GROUP BY status', (stream_id,)).fetchall()
+        return dict(rows)
+
+
+class ClickhouseChunkStore:
+    """Chunk state in a ReplacingMergeTree control table of the target ClickHouse.
+
+    ClickHouse has no compare-and-set, so a lease is claimed by inserting a newer
+    version of the chunk row and then reading it back with FINAL after settle_seconds:
+    the worker whose version survived owns the chunk. Two workers can still both win
+    a close race, which only costs a duplicate export that ReplacingMergeTree absorbs.
+    """
+    def __init__(self, clickhouse_client, settle_seconds=2):
+        self.clickhouse_client = clickhouse_client
+        self.table = f'{clickhouse_client.database}.migration_chunks'
+        self.settle_seconds = settle_seconds
+        self.clickhouse_client.execute_query(f'CREATE DATABASE IF NOT EXISTS {clickhouse_client.database}')
+        self.clickhouse_client.execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.table}
+            (
+                stream_id String,
+                start_block Int64,
+                end_block Int64,
+                status String,
+                worker_id String,
+                lease_expires_at Float64,
+                version UInt64
+            )
+            ENGINE = ReplacingMergeTree(version)
+            ORDER BY (stream_id, start_block)
+        """)
+
+    def _write(self, stream_id, chunk, status, worker_id, lease_expires_at):
+        self.clickhouse_client.execute_query(
+            f'INSERT INTO {self.table} (stream_id, start_block, end_block, status, worker_id, lease_expires_at, version) VALUES',
+            [(stream_id, chunk[0], chunk[1], status, worker_id, lease_expires_at, time.time_ns())])
+
+    def _read(self, stream_id, where, params):
+        return self.clickhouse_client.execute_query(
+            f'SELECT start_block, end_block, status, worker_id, lease_expires_at FROM {self.table} FINAL '
+            f'WHERE stream_id = %(stream_id)s AND {where} ORDER BY start_block',
+            dict(params, stream_id=stream_id))
+
+    def create_chunks(self, stream_id, chunks):
+        existing = {row[0] for row in self._read(stream_id, '1', {})}
+        new_chunks = [chunk for chunk in chunks if chunk[0] not in existing]
+        if new_chunks:
+            self.clickhouse_client.execute_query(
+                f'INSERT INTO {self.table} (stream_id, start_block, end_block, status, worker_id, lease_expires_at, version) VALUES',
+                [(stream_id, start_block, end_block, PENDING, '', 0, 0) for start_block, end_block in new_chunks])
+
+    def lease(self, stream_id, worker_id, lease_seconds):
+        candidates = self._read(
+            stream_id, '(status = %(pending)s OR (status = %(leased)s AND lease_expires_at < %(now)s))',
+            {'pending': PENDING, 'leased': LEASED, 'now': time.time()})
+        for start_block, end_block, _, _, _ in candidates:
+            chunk = (start_block, end_block)
+            self._write(stream_id, chunk, LEASED, worker_id, time.time() + lease_seconds)
+            time.sleep(self.settle_seconds)
+            owner = self._read(stream_id, 'start_block = %(start_block)s', {'start_block': start_block})
+            if owner and owner[0][2] == LEASED and owner[0][3] == worker_id:
+                return chunk
+        return None
+
+    def renew(self, stream_id, chunk, worker_id, lease_seconds):
+        if not self._owns(stream_id, chunk, worker_id):
+            return False
+        self._write(stream_id, chunk, LEASED, worker_id, time.time() + lease_seconds)
+        return True
+
+    def complete(self, stream_id, chunk, worker_id):
+        """Mark a chunk done if worker_id still holds its lease. Returns whether it did.
+        As with leasing, a worker taking the chunk over at the same moment can still race it."""
+        if not self._owns(stream_id, chunk, worker_id):
+            return False
+        self._write(stream_id, chunk, DONE, worker_id, 0)
+        return True
+
+    def _owns(self, stream_id, chunk, worker_id):
+        owner = self._read(stream_id, 'start_block = %(start_block)s', {'start_block': chunk[0]})
+        return bool(owner) and owner[0][2] == LEASED and owner[0][3] == worker_id
+
+    def count_by_status(self, stream_id):
+        rows = self.clickhouse_client.execute_query(
+            f'SELECT status, count() FROM {self.table} FINAL WHERE stream_id = %(stream_id)s GROUP BY status',
+            {'stream_id': stream_id})
+        return dict(rows)
+
+
+class WorkCoordinator:
+    """
+    Lets any number of workers share one stream. The block range is planned into
+    chunks in a chunk store; each worker leases a chunk, keeps renewing the lease from
+    a heartbeat thread while the adapter exports it and marks it done afterwards.
+    A chunk whose lease expires, because its worker died, is handed out again. A worker
+    that loses its lease stops renewing it and leaves completing the chunk to its new owner.
+    """
+    def __init__(self, store, stream_id, worker_id=None, lease_seconds=300, poll_seconds=10):
+        self.store = store
+        self.stream_id = stream_id
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+
+    def plan(self, start_block, end_block, chunk_size):
+        chunks = [(chunk_start, min(chunk_start + chunk_size - 1, end_block))
+                  for chunk_start in range(start_block, end_block + 1, chunk_size)]
+        self.store.create_chunks(self.stream_id, chunks)
+        logger.info(f'Planned {len(chunks)} chunks of {chunk_size} blocks for {self.stream_id}')
+
+    def run(self, blockchain_streamer_adapter):
+        blockchain_streamer_adapter.open()
+        try:
+            while True:
+                chunk = self.store.lease(self.stream_id, self.worker_id, self.lease_seconds)
+                if chunk is None:
+                    counts = self.store.count_by_status(self.stream_id)
+                    if not counts.get(PENDING) and not counts.get(LEASED):
+                        logger.info(f'No chunks left for {self.stream_id}: {counts}')
+                        return
+                    logger.info(f'Waiting for leased chunks of {self.stream_id}: {counts}')
+                    time.sleep(self.poll_seconds)
+                    continue
+                self._export_chunk(blockchain_streamer_adapter, chunk)
+        finally:
+            blockchain_streamer_adapter.close()
+
+    def _export_chunk(self, blockchain_streamer_adapter, chunk):
+        logger.info(f'Worker {self.worker_id} leased chunk {chunk} of {self.stream_id}')
+        stop_heartbeat = threading.Event()
+        lease_lost = threading.Event()
+        heartbeat = threading.Thread(target=self._renew_lease, args=(chunk, stop_heartbeat, lease_lost), daemon=True)
+        heartbeat.start()
+        try:
+            blockchain_streamer_adapter.export_all(*chunk)
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+        if lease_lost.is_set() or not self.store.complete(self.stream_id, chunk, self.worker_id):
+            logger.warning(f'Worker {self.worker_id} lost the lease of chunk {chunk} of {self.stream_id}, '
+                           f'leaving it to its new owner')
+            return
+        logger.info(f'Worker {self.worker_id} completed chunk {chunk} of {self.stream_id}')
+
+    def _renew_lease(self, chunk, stop_heartbeat, lease_lost):
+        while not stop_heartbeat.wait(self.lease_seconds / 3):
+            try:
+                if not self.store.renew(self.stream_id, chunk, self.worker_id, self.lease_seconds):
+                    logger.warning(f'Worker {self.worker_id} lost the lease of chunk {chunk}, it may be exported twice')
+                    lease_lost.set()
+                    return
+            except Exception:
+                logger.exception(f'Failed to renew the lease of chunk {chunk}')
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
@@ -0,0 +1,104 @@
+"""Writes the commit log segments under fixtures/cdc used by test_cdc_commit_log.
+
+Run `python -m tests.cdc_segments` from the repository root to regenerate them."""
+import json
+import os
+import struct
+import uuid
+import zlib
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'cdc')
+
+SEGMENT_ID = 1700000000001
+BLOCKS_ID = uuid.UUID('5a1c3e20-0000-4000-8000-000000000001')
+TRANSACTIONS_ID = uuid.UUID('5a1c3e20-0000-4000-8000-000000000002')
+LOGS_ID = uuid.UUID('5a1c3e20-0000-4000-8000-000000000003')
+OTHER_ID = uuid.UUID('5a1c3e20-0000-4000-8000-0000000000ff')
+TABLE_IDS = {BLOCKS_ID: 'blocks', TRANSACTIONS_ID: 'transactions', LOGS_ID: 'logs'}
+
+
+def unsigned_vint(value):
+    """Cassandra unsigned vint, the inverse of read_unsigned_vint"""
+    for extra_bytes in range(9):
+        if extra_bytes == 8 or value < 1 << (7 * (extra_bytes + 1)):
+            break
+    if extra_bytes == 8:
+        return b'\xff' + value.to_bytes(8, 'big')
+    encoded = value.to_bytes(extra_bytes + 1, 'big')
+    marker = (0xFF << (8 - extra_bytes)) & 0xFF
+    return bytes([encoded[0] | marker]) + encoded[1:]
+
+
+def mutation(table_id, partition_key, update_count=1, body=b'\x00' * 8):
+    """Head of a serialized mutation followed by an opaque body standing in for the rows"""
+    return unsigned_vint(update_count) + table_id.bytes + unsigned_vint(len(partition_key)) + partition_key + body
+
+
+def crc_int(crc, value):
+    return zlib.crc32(struct.pack('>I', value & 0xFFFFFFFF), crc)
+
+
+def header(segment_id, version=7, parameters=None):
+    parameters_bytes = json.dumps(parameters).encode() if parameters else b''
+    crc = crc_int(0, version)
+    crc = crc_int(crc, segment_id & 0xFFFFFFFF)
+    crc = crc_int(crc, segment_id >> 32)
+    crc = crc_int(crc, len(parameters_bytes))
+    crc = zlib.crc32(parameters_bytes, crc)
+    return struct.pack('>iqH', version, segment_id, len(parameters_bytes)) + parameters_bytes + struct.pack('>I', crc)
+
+
+def entry(mutation_bytes):
+    size_bytes = struct.pack('>i', len(mutation_bytes))
+    crc = zlib.crc32(size_bytes)
+    size_crc = struct.pack('>I', crc)
+    return size_bytes + size_crc + mutation_bytes + struct.pack('>I', zlib.crc32(mutation_bytes, crc))
+
+
+def segment(segment_id, sections, padding=4):
+    """Segment bytes and the end offset of each sync section. Every section starts with
+    a sync marker pointing at the next one, and a zero marker ends the synced part."""
+    data = bytearray(header(segment_id))
+    section_ends = []
+    for mutations in sections:
+        marker_offset = len(data)
+        body = b''.join(entry(mutation_bytes) for mutation_bytes in mutations) + b'\x00' * padding
+        next_marker = marker_offset + 8 + len(body)
+        crc = crc_int(crc_int(crc_int(0, segment_id & 0xFFFFFFFF), segment_id >> 32), marker_offset)
+        data += struct.pack('>iI', next_marker, crc) + body
+        section_ends.append(next_marker)
+    data += struct.pack('>iI', 0, 0)
+    return bytes(data), section_ends
+
+
+def sections():
+    return [
+        [
+            mutation(BLOCKS_ID, struct.pack('>i', 0)),
+            mutation(TRANSACTIONS_ID, struct.pack('>q', 100)),
+        ],
+        [
+            # A mutation updating several tables of the same partition
+            mutation(LOGS_ID, struct.pack('>q', 200), update_count=2),
+            mutation(OTHER_ID, b'not a bucket'),
+        ],
+        [],
+    ]
+
+
+def write_fixtures(fixtures_dir=FIXTURES_DIR):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    data, section_ends = segment(SEGMENT_ID, sections())
+    with open(os.path.join(fixtures_dir, f'CommitLog-7-{SEGMENT_ID}.log'), 'wb') as segment_file:
+        segment_file.write(data)
+    with open(os.path.join(fixtures_dir, f'CommitLog-7-{SEGMENT_ID}_cdc.idx'), 'w') as index_file:
+        index_file.write(f'{section_ends[-1]}\nCOMPLETED\n')
+    # Not durable yet, no index file
+    data, _ = segment(SEGMENT_ID + 1, [[mutation(BLOCKS_ID, struct.pack('>i', 10000))]])
+    with open(os.path.join(fixtures_dir, f'CommitLog-7-{SEGMENT_ID + 1}.log'), 'wb') as segment_file:
+        segment_file.write(data)
+    return section_ends
+
+
+if __name__ == '__main__':
+    print(write_fixtures())
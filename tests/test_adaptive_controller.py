@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+from cassandra import OperationTimedOut, ReadTimeout
+from cassandra.cluster import NoHostAvailable
+from clickhouse_driver.errors import ErrorCodes, ServerException
+
+from executors import adaptive_controller
+from executors.adaptive_controller import AdaptiveController, is_overload_error
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(adaptive_controller, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+
+def run_window(controller, clock, rows_per_second, batch_seconds=1.0):
+    """Complete one window of `concurrency` batches in one second at the given throughput"""
+    batches = controller.concurrency
+    clock.now += 1
+    for _ in range(batches):
+        controller.observe(batch_seconds, rows_per_second // batches)
+
+
+def test_steady_throughput_probes_concurrency_then_batch_size(clock):
+    controller = AdaptiveController(batch_size=100, concurrency=2)
+    run_window(controller, clock, 2000)
+    assert (controller.batch_size, controller.concurrency) == (100, 3)
+    run_window(controller, clock, 3000)
+    assert (controller.batch_size, controller.concurrency) == (125, 3)
+    run_window(controller, clock, 3000)
+    assert (controller.batch_size, controller.concurrency) == (125, 4)
+
+
+def test_throughput_drop_undoes_last_probe(clock):
+    controller = AdaptiveController(batch_size=100, concurrency=2)
+    run_window(controller, clock, 2000)
+    run_window(controller, clock, 3000)
+    assert controller.batch_size == 125
+    run_window(controller, clock, 1200)
+    assert (controller.batch_size, controller.concurrency) == (100, 3)
+
+
+def test_probes_stop_at_the_maximums(clock):
+    controller = AdaptiveController(batch_size=100, concurrency=2, max_batch_size=125, max_concurrency=3)
+    for _ in range(6):
+        run_window(controller, clock, 3000)
+    assert (controller.batch_size, controller.concurrency) == (125, 3)
+
+
+def test_slow_batches_shrink_batch_size(clock):
+    controller = AdaptiveController(batch_size=100, concurrency=2, target_latency_seconds=5)
+    run_window(controller, clock, 2000, batch_seconds=10)
+    assert (controller.batch_size, controller.concurrency) == (80, 2)
+
+
+def test_overload_backs_off_once_per_window(clock):
+    controller = AdaptiveController(batch_size=100, concurrency=8)
+    controller.on_overload()
+    assert (controller.batch_size, controller.concurrency) == (50, 4)
+    # Further errors of the batches already in flight do not cut again
+    controller.on_overload()
+    assert (controller.batch_size, controller.concurrency) == (50, 4)
+
+    # The next window probes one more batch in flight, its overload cuts again
+    run_window(controller, clock, 2000)
+    assert controller.concurrency == 5
+    controller.on_overload()
+    assert (controller.batch_size, controller.concurrency) == (25, 2)
+
+
+def test_overload_respects_the_minimums(clock):
+    controller = AdaptiveController(batch_size=3, concurrency=1, min_batch_size=2)
+    controller.on_overload()
+    assert (controller.batch_size, controller.concurrency) == (2, 1)
+
+
+@pytest.mark.parametrize('error, overload', [
+    (ReadTimeout('read timed out'), True),
+    (OperationTimedOut(), True),
+    (ServerException('too many parts', ErrorCodes.TOO_MANY_PARTS), True),
+    (ServerException('too many queries', ErrorCodes.TOO_MANY_SIMULTANEOUS_QUERIES), True),
+    (ServerException('syntax error', ErrorCodes.SYNTAX_ERROR), False),
+    (NoHostAvailable('no host', {'10.0.0.1': ReadTimeout('read timed out')}), True),
+    (NoHostAvailable('no host', {'10.0.0.1': ConnectionRefusedError()}), False),
+    (ValueError('bad batch'), False),
+])
+def test_is_overload_error(error, overload):
+    assert is_overload_error(error) is overload
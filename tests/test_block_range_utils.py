@@ -0,0 +1,47 @@
+import pytest
+
+from utils.block_range_utils import iter_block_number_chunks, merge_ranges, parse_block_ranges
+
+
+def test_parse_ranges_and_single_numbers():
+    lines = ['100-199\n', '250\n', '300-300, 400 500-510\n']
+    assert parse_block_ranges(lines) == [(100, 199), (250, 250), (300, 300), (400, 400), (500, 510)]
+
+
+def test_parse_skips_blank_and_comment_lines():
+    lines = ['\n', '   \n', '# mismatched ranges of logs\n', '7-8\n']
+    assert parse_block_ranges(lines) == [(7, 8)]
+
+
+@pytest.mark.parametrize('line, message', [
+    ('12-abc', 'Invalid block range'),
+    ('-5', 'Invalid block range'),
+    ('20-10', 'end is before start'),
+])
+def test_parse_rejects_invalid_lines(line, message):
+    with pytest.raises(ValueError, match=message) as error:
+        parse_block_ranges(['1-2\n', line + '\n'])
+    assert 'line 2' in str(error.value)
+
+
+def test_merge_overlapping_and_adjacent_ranges():
+    ranges = [(20, 29), (0, 9), (10, 12), (25, 40), (50, 50), (42, 45)]
+    assert merge_ranges(ranges) == [(0, 12), (20, 40), (42, 45), (50, 50)]
+    assert merge_ranges([]) == []
+
+
+def test_chunks_split_at_chunk_size_across_ranges():
+    ranges = [(0, 4), (10, 10), (20, 27)]
+    chunks = list(iter_block_number_chunks(ranges, 4))
+    assert chunks == [[0, 1, 2, 3], [4, 10, 20, 21], [22, 23, 24, 25], [26, 27]]
+
+
+def test_chunks_of_exact_multiple_leave_no_empty_chunk():
+    assert list(iter_block_number_chunks([(1, 6)], 3)) == [[1, 2, 3], [4, 5, 6]]
+    assert list(iter_block_number_chunks([], 3)) == []
+
+
+def test_chunks_are_generated_lazily():
+    chunks = iter_block_number_chunks([(0, 10 ** 12)], 1000)
+    assert next(chunks) == list(range(1000))
+    assert next(chunks)[0] == 1000
@@ -0,0 +1,133 @@
+import os
+import shutil
+import struct
+
+import pytest
+
+from database.cdc_commit_log import (CommitLogError, decode_bucket_id, list_cdc_segments, parse_mutation,
+                                     read_commit_log_entries, read_commit_log_header, read_unsigned_vint)
+from streaming.cdc_streamer import CdcStreamer, read_offsets
+from tests.cdc_segments import (BLOCKS_ID, FIXTURES_DIR, LOGS_ID, OTHER_ID, SEGMENT_ID, TABLE_IDS, TRANSACTIONS_ID,
+                                header, mutation, segment, unsigned_vint)
+
+SEGMENT_NAME = f'CommitLog-7-{SEGMENT_ID}.log'
+SEGMENT_PATH = os.path.join(FIXTURES_DIR, SEGMENT_NAME)
+# End offsets of the three sync sections of the fixture segment
+SECTION_ENDS = [118, 226, 238]
+
+
+@pytest.fixture
+def cdc_raw_dir(tmp_path):
+    for name in os.listdir(FIXTURES_DIR):
+        shutil.copy(os.path.join(FIXTURES_DIR, name), tmp_path)
+    return tmp_path
+
+
+def test_read_header():
+    with open(SEGMENT_PATH, 'rb') as segment_file:
+        assert read_commit_log_header(segment_file) == (7, SEGMENT_ID, {})
+
+
+def test_read_header_checks_crc(cdc_raw_dir):
+    path = cdc_raw_dir / SEGMENT_NAME
+    data = bytearray(path.read_bytes())
+    data[5] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with open(path, 'rb') as segment_file:
+        with pytest.raises(CommitLogError, match='Corrupt commit log header'):
+            read_commit_log_header(segment_file)
+
+
+def test_read_entries_by_sync_section():
+    entries = list(read_commit_log_entries(SEGMENT_PATH))
+    assert [section_end for section_end, _ in entries] == [118, 118, 118, 226, 226, 226, 238]
+    assert [mutation_bytes is None for _, mutation_bytes in entries] == [False, False, True, False, False, True, True]
+    assert entries[0][1] == mutation(BLOCKS_ID, struct.pack('>i', 0))
+    assert entries[1][1] == mutation(TRANSACTIONS_ID, struct.pack('>q', 100))
+
+
+def test_read_entries_resumes_from_offset():
+    entries = list(read_commit_log_entries(SEGMENT_PATH, start_offset=SECTION_ENDS[0]))
+    assert [section_end for section_end, _ in entries] == [226, 226, 226, 238]
+
+
+def test_read_entries_stops_at_durable_offset():
+    entries = list(read_commit_log_entries(SEGMENT_PATH, end_offset=SECTION_ENDS[1] - 1))
+    assert [section_end for section_end, _ in entries] == [118, 118, 118]
+
+
+def test_read_entries_checks_entry_crc(cdc_raw_dir):
+    path = cdc_raw_dir / SEGMENT_NAME
+    data = bytearray(path.read_bytes())
+    # Inside the first mutation of the first section
+    data[SECTION_ENDS[0] - 30] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(CommitLogError, match='Corrupt commit log entry'):
+        list(read_commit_log_entries(str(path)))
+
+
+def test_parse_mutation():
+    assert parse_mutation(mutation(LOGS_ID, struct.pack('>q', 200), update_count=2)) == \
+        (2, LOGS_ID, struct.pack('>q', 200))
+
+
+def test_parse_mutation_rejects_truncated_key():
+    with pytest.raises(CommitLogError, match='Truncated mutation'):
+        parse_mutation(unsigned_vint(1) + BLOCKS_ID.bytes + unsigned_vint(8) + b'\x00' * 4)
+
+
+@pytest.mark.parametrize('value', [0, 1, 127, 128, 16383, 16384, 2 ** 32, 2 ** 56 - 1, 2 ** 63, 2 ** 64 - 1])
+def test_unsigned_vint_roundtrip(value):
+    encoded = unsigned_vint(value)
+    assert read_unsigned_vint(b'\x01' + encoded, 1) == (value, 1 + len(encoded))
+
+
+def test_decode_bucket_id():
+    assert decode_bucket_id(struct.pack('>i', 10000)) == 10000
+    assert decode_bucket_id(struct.pack('>q', -100)) == -100
+    with pytest.raises(CommitLogError):
+        decode_bucket_id(b'\x00' * 3)
+
+
+def test_list_cdc_segments_skips_segments_without_index(cdc_raw_dir):
+    segments = list_cdc_segments(str(cdc_raw_dir))
+    assert [(segment.name, segment.durable_offset, segment.completed) for segment in segments] == \
+        [(SEGMENT_NAME, SECTION_ENDS[-1], True)]
+
+
+def test_cdc_streamer_detects_changes_offline(cdc_raw_dir):
+    applied = []
+    offsets_file = str(cdc_raw_dir / 'offsets.json')
+    streamer = CdcStreamer(str(cdc_raw_dir), item_importer=None, item_exporter=None, max_workers=1,
+                           offsets_file=offsets_file, table_ids=TABLE_IDS, max_changes=2,
+                           apply_changes=lambda changes: applied.append(sorted(changes)))
+
+    assert streamer.sync_once() == 7
+    assert applied == [
+        [('blocks', 0), ('transactions', 100)],
+        # The logs mutation updates several tables, the table of OTHER_ID is not exported
+        [('blocks', 200), ('internal_transactions', 200), ('logs', 200), ('token_transfer', 200),
+         ('transactions', 200)],
+    ]
+    assert OTHER_ID not in TABLE_IDS
+    assert read_offsets(offsets_file) == {SEGMENT_NAME: SECTION_ENDS[-1]}
+
+    # A restart resumes after the last applied section
+    restarted = CdcStreamer(str(cdc_raw_dir), item_importer=None, item_exporter=None, max_workers=1,
+                            offsets_file=offsets_file, table_ids=TABLE_IDS,
+                            apply_changes=lambda changes: applied.append(sorted(changes)))
+    assert restarted.sync_once() == 0
+    assert len(applied) == 2
+
+
+def test_cdc_streamer_deletes_completed_segment_without_sections(tmp_path):
+    data, _ = segment(SEGMENT_ID, [])
+    (tmp_path / SEGMENT_NAME).write_bytes(data)
+    (tmp_path / f'CommitLog-7-{SEGMENT_ID}_cdc.idx').write_text(f'{len(header(SEGMENT_ID))}\nCOMPLETED\n')
+    streamer = CdcStreamer(str(tmp_path), item_importer=None, item_exporter=None, max_workers=1,
+                           offsets_file=None, table_ids=TABLE_IDS, delete_consumed=True,
+                           apply_changes=lambda changes: None)
+
+    assert streamer.sync_once() == 0
+    assert streamer.offsets == {}
+    assert not (tmp_path / SEGMENT_NAME).exists()
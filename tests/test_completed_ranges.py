@@ -0,0 +1,88 @@
+import json
+
+from utils.completed_ranges import CompletedRanges, to_ranges
+
+
+def test_adjacent_ranges_merge():
+    completed = CompletedRanges()
+    completed.add(10, 19)
+    completed.add(30, 39)
+    completed.add(20, 29)
+    assert completed.ranges() == [(10, 39)]
+
+
+def test_overlapping_ranges_merge():
+    completed = CompletedRanges()
+    completed.add(0, 9)
+    completed.add(20, 29)
+    completed.add(40, 49)
+    completed.add(5, 45)
+    assert completed.ranges() == [(0, 49)]
+    completed.add(60, 60)
+    completed.add(55, 58)
+    assert completed.ranges() == [(0, 49), (55, 58), (60, 60)]
+
+
+def test_add_numbers_collapses_runs():
+    completed = CompletedRanges()
+    completed.add_numbers([7, 3, 4, 5, 9])
+    assert completed.ranges() == [(3, 5), (7, 7), (9, 9)]
+    assert to_ranges([2, 1, 1, 5]) == [(1, 2), (5, 5)]
+
+
+def test_contiguous_end_stops_at_gap():
+    completed = CompletedRanges()
+    completed.add(100, 199)
+    completed.add(300, 399)
+    assert completed.contiguous_end(100) == 199
+    assert completed.contiguous_end(150) == 199
+    # Nothing completed from the start block on
+    assert completed.contiguous_end(200) == 199
+    assert completed.contiguous_end(50) == 49
+    completed.add(200, 299)
+    assert completed.contiguous_end(100) == 399
+
+
+def test_contains_gaps_and_missing():
+    completed = CompletedRanges()
+    completed.add(10, 19)
+    completed.add(30, 39)
+    assert completed.contains(10) and completed.contains(39)
+    assert not completed.contains(25)
+    assert completed.gaps(0, 50) == [(0, 9), (20, 29), (40, 50)]
+    assert completed.gaps(10, 19) == []
+    assert list(completed.missing([9, 10, 25, 39, 40])) == [9, 25, 40]
+
+
+def test_discard_below_trims_ranges():
+    completed = CompletedRanges()
+    completed.add(0, 9)
+    completed.add(20, 29)
+    completed.discard_below(24)
+    assert completed.ranges() == [(25, 29)]
+    completed.discard_below(29)
+    assert completed.ranges() == []
+
+
+def test_save_and_reload(tmp_path):
+    file = str(tmp_path / 'last_synced_block.blocks.ranges.json')
+    completed = CompletedRanges(file)
+    completed.add(20, 29)
+    completed.add(0, 9)
+    completed.add(10, 15)
+    with open(file) as file_handle:
+        assert json.load(file_handle) == [[0, 15], [20, 29]]
+    assert not (tmp_path / 'last_synced_block.blocks.ranges.json.tmp').exists()
+
+    reloaded = CompletedRanges(file)
+    assert reloaded.ranges() == [(0, 15), (20, 29)]
+    assert reloaded.contiguous_end(0) == 15
+
+    reloaded.clear()
+    assert CompletedRanges(file).ranges() == []
+
+
+def test_empty_file_loads_no_ranges(tmp_path):
+    file = tmp_path / 'ranges.json'
+    file.write_text('')
+    assert CompletedRanges(str(file)).ranges() == []
@@ -0,0 +1,36 @@
+import pytest
+
+from database.cassandra_client import ConcurrentFetch
+
+
+class FakeFuture:
+    has_more_pages = False
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def add_callbacks(self, callback, errback, callback_args=(), errback_args=()):
+        callback(self.rows, *callback_args)
+
+
+class FakeSession:
+    def execute_async(self, statement, params):
+        if statement == 'unavailable':
+            raise RuntimeError('no host available')
+        return FakeFuture([(statement, params)])
+
+
+def test_collects_rows_of_every_request():
+    fetch = ConcurrentFetch(max_in_flight=2)
+    for bucket in range(5):
+        fetch.submit(FakeSession(), 'select', bucket)
+    assert sorted(fetch.result()) == [('select', bucket) for bucket in range(5)]
+
+
+def test_synchronous_error_frees_its_slot():
+    fetch = ConcurrentFetch(max_in_flight=1)
+    with pytest.raises(RuntimeError, match='no host available'):
+        fetch.submit(FakeSession(), 'unavailable', 0)
+    # The slot is free again and result() does not wait for the failed request
+    fetch.submit(FakeSession(), 'select', 1)
+    assert fetch.result() == [('select', 1)]
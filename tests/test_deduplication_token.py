@@ -0,0 +1,32 @@
+from database.clickhouse_client import insert_deduplication_token
+
+FIELDS = ['block_number', 'log_index', 'address', 'data']
+ROWS = [(100, 0, '0xa', '0x01'), (100, 1, '0xb', '0x02'), (102, 0, '0xc', None)]
+COLUMNS = list(zip(*ROWS))
+
+
+def test_token_is_stable_for_the_same_batch():
+    assert insert_deduplication_token('logs', FIELDS, ROWS) == insert_deduplication_token('logs', FIELDS, list(ROWS))
+    assert insert_deduplication_token('logs', FIELDS, ROWS).startswith('logs:100-102:3:')
+
+
+def test_columns_get_the_token_of_their_rows():
+    assert insert_deduplication_token('logs', FIELDS, COLUMNS, columnar=True) == \
+        insert_deduplication_token('logs', FIELDS, ROWS)
+
+
+def test_token_changes_with_the_epoch():
+    tokens = {insert_deduplication_token('logs', FIELDS, ROWS, epoch) for epoch in ('', '1', '2')}
+    assert len(tokens) == 3
+
+
+def test_token_changes_with_the_rows_and_table():
+    token = insert_deduplication_token('logs', FIELDS, ROWS)
+    assert insert_deduplication_token('logs', FIELDS, ROWS[:2]) != token
+    assert insert_deduplication_token('logs', FIELDS, ROWS[:2] + [(102, 1, '0xc', None)]) != token
+    assert insert_deduplication_token('token_transfer', FIELDS, ROWS) != token
+
+
+def test_token_of_table_without_sorting_key_hashes_every_column():
+    token = insert_deduplication_token('unknown', FIELDS, ROWS)
+    assert insert_deduplication_token('unknown', FIELDS, ROWS[:2] + [(102, 0, '0xd', None)]) != token
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from database.insert_buffer import InsertBuffer
+
+
+class SlowHandler:
+    """Flush handler blocking until released, failing the first flush when asked to"""
+    def __init__(self, fail_first=False):
+        self.written = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail_first = fail_first
+
+    def __call__(self, rows, fields, table):
+        self.started.set()
+        self.release.wait(5)
+        if self.fail_first:
+            self.fail_first = False
+            raise RuntimeError('insert failed')
+        self.written.extend(rows)
+
+
+def start_timer_flush(handler):
+    buffer = InsertBuffer(handler, max_rows=1000, max_seconds=0.05)
+    buffer.add([(1, 'a'), (2, 'b')], ['number', 'hash'], 'blocks')
+    assert handler.started.wait(5), 'the timer did not flush'
+    return buffer
+
+
+def test_flush_waits_for_timer_flush():
+    handler = SlowHandler()
+    buffer = start_timer_flush(handler)
+
+    flushed = threading.Event()
+    flusher = threading.Thread(target=lambda: (buffer.flush(), flushed.set()))
+    flusher.start()
+    assert not flushed.wait(0.2)
+
+    handler.release.set()
+    flusher.join(5)
+    assert flushed.is_set()
+    assert handler.written == [(1, 'a'), (2, 'b')]
+
+
+def test_flush_retries_rows_of_failed_timer_flush():
+    handler = SlowHandler(fail_first=True)
+    buffer = start_timer_flush(handler)
+    checkpoints = []
+    buffer.after_flush(lambda: checkpoints.append(len(handler.written)))
+
+    release = threading.Timer(0.1, handler.release.set)
+    release.start()
+    buffer.flush()
+    assert handler.written == [(1, 'a'), (2, 'b')]
+    assert checkpoints == [2]
+
+
+def test_flush_raises_when_rows_cannot_be_written():
+    def failing_handler(rows, fields, table):
+        raise RuntimeError('insert failed')
+
+    buffer = InsertBuffer(failing_handler, max_rows=1000, max_seconds=3600)
+    buffer.add([(1, 'a')], ['number', 'hash'], 'blocks')
+    checkpoints = []
+    buffer.after_flush(lambda: checkpoints.append(time.time()))
+
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert checkpoints == []
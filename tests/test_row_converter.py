@@ -0,0 +1,56 @@
+from collections import namedtuple
+from decimal import Decimal
+
+import pytest
+
+from database.clickhouse_client import ClickhouseClient
+from database.row_converter import build_row_converter
+
+BLOCK_COLUMNS = ['bucket_id', 'number', 'hash', 'timestamp', 'transaction_count', 'withdrawals', 'miner']
+LOG_COLUMNS = ['block_number', 'bucket_id', 'log_index', 'topics', 'data']
+
+
+def asdict_rows(columns, rows):
+    """Insert tuples as built before tuple rows, from namedtuple rows through _asdict() and clean_cassandra_data"""
+    row_type = namedtuple('Row', columns)
+    entities = [row_type(*row)._asdict() for row in rows]
+    cleaned = ClickhouseClient.clean_cassandra_data(None, entities)
+    fields = list(cleaned[0].keys())
+    return fields, [tuple(entity.get(field) for field in fields) for entity in cleaned]
+
+
+@pytest.mark.parametrize('columns, rows', [
+    (BLOCK_COLUMNS, [
+        (10000, Decimal(10001), '0xabc', '1700000000', 12, [{'index': 1}], '0xminer'),
+        (10000, 10002, '0xdef', None, None, None, None),
+        (10000, 10003, '0x123', 1700000024, 0, 'null', ''),
+    ]),
+    (LOG_COLUMNS, [
+        (500, 100, 0, ['0xt0', '0xt1'], '0x'),
+        (500, 100, 1, None, None),
+        ('501', 100, 2, ('0xt0',), '0x01'),
+    ]),
+])
+def test_matches_asdict_rows(columns, rows):
+    fields, convert = build_row_converter(columns)
+    expected_fields, expected_rows = asdict_rows(columns, rows)
+    assert fields == expected_fields
+    converted = [convert(row) for row in rows]
+    assert converted == expected_rows
+    assert [[type(value) for value in row] for row in converted] == \
+        [[type(value) for value in row] for row in expected_rows]
+
+
+def test_single_and_uncoerced_columns_give_tuples():
+    fields, convert = build_row_converter(['bucket_id', 'hash'])
+    assert fields == ['hash']
+    assert convert((1, '0xabc')) == ('0xabc',)
+
+    fields, convert = build_row_converter(['hash', 'miner'])
+    assert convert(('0xabc', '0xminer')) == ('0xabc', '0xminer')
+
+
+def test_only_skipped_columns_give_empty_tuples():
+    fields, convert = build_row_converter(['bucket_id'])
+    assert fields == []
+    assert convert((1,)) == ()
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from streaming import sharded_streamer
+from streaming.sharded_streamer import split_block_range
+
+
+def assert_covers(shards, start_block, end_block):
+    assert shards[0][0] == start_block
+    assert shards[-1][1] == end_block
+    for (_, previous_end), (start, end) in zip(shards, shards[1:]):
+        # Inclusive [start, end] shards: no gap and no overlap
+        assert start == previous_end + 1
+        assert start <= end
+
+
+@pytest.mark.parametrize('start_block, end_block, shard_count', [
+    (0, 999, 4), (0, 1000, 3), (17, 12345, 7), (5, 5, 3), (0, 9, 10), (100, 102, 8),
+])
+def test_shards_cover_range(start_block, end_block, shard_count):
+    shards = split_block_range(start_block, end_block, shard_count)
+    assert_covers(shards, start_block, end_block)
+    assert len(shards) == min(shard_count, end_block - start_block + 1)
+
+
+def test_even_split():
+    assert split_block_range(0, 999, 4) == [(0, 249), (250, 499), (500, 749), (750, 999)]
+
+
+@pytest.mark.parametrize('start_block, end_block, shard_count', [(0, 99999, 3), (1234, 87654, 5), (0, 25000, 4)])
+def test_inner_boundaries_follow_alignment(start_block, end_block, shard_count):
+    shards = split_block_range(start_block, end_block, shard_count, alignment=10000)
+    assert_covers(shards, start_block, end_block)
+    for shard_start, _ in shards[1:]:
+        assert shard_start % 10000 == 0
+
+
+def test_alignment_wider_than_shards_merges_them():
+    # Fewer buckets than shards: shards never share a bucket, so there are fewer of them
+    shards = split_block_range(0, 19999, 4, alignment=10000)
+    assert shards == [(0, 9999), (10000, 19999)]
+    assert split_block_range(0, 999, 4, alignment=10000) == [(0, 999)]
+
+
+class FakeProcess:
+    started = []
+
+    def __init__(self, target, args, name):
+        self.args = args
+        self.exitcode = 0
+
+    def start(self):
+        FakeProcess.started.append(self.args[1:3])
+
+    def is_alive(self):
+        return False
+
+
+def test_rerun_resumes_saved_shard_plan(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharded_streamer.multiprocessing, 'get_context',
+                        lambda method: SimpleNamespace(Process=FakeProcess))
+    FakeProcess.started = []
+    last_synced_block_file = str(tmp_path / 'last_synced_block.blocks.txt')
+
+    def run(end_block, processes):
+        sharded_streamer.ShardedStreamer('blocks', 0, end_block, processes, {}, {}, {}, shard_alignment=100,
+                                         last_synced_block_file=last_synced_block_file, period_seconds=0).stream()
+
+    run(999, 2)
+    assert FakeProcess.started == [(0, 499), (500, 999)]
+    # A later run with another end block and process count keeps the saved plan
+    run(5000, 4)
+    assert FakeProcess.started[2:] == [(0, 499), (500, 999)]
+
+    (tmp_path / 'last_synced_block.blocks.0-499.txt').write_text('499\n')
+    (tmp_path / 'last_synced_block.blocks.500-999.txt').write_text('999\n')
+    run(None, 4)
+    assert len(FakeProcess.started) == 4
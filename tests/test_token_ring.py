@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from database.cassandra_client import MURMUR3_MAX_TOKEN, MURMUR3_MIN_TOKEN, CassandraClient, split_token_range
+
+
+def client_with_ring(tokens):
+    """A CassandraClient whose cluster metadata only holds a token ring"""
+    client = CassandraClient.__new__(CassandraClient)
+    token_map = SimpleNamespace(ring=[SimpleNamespace(value=token) for token in tokens]) if tokens is not None else None
+    client._cluster = SimpleNamespace(metadata=SimpleNamespace(token_map=token_map))
+    return client
+
+
+def assert_covers(token_ranges, start_token, end_token):
+    assert token_ranges[0][0] == start_token
+    assert token_ranges[-1][1] == end_token
+    for (_, previous_end), (start, end) in zip(token_ranges, token_ranges[1:]):
+        # (start, end] ranges: each one starts where the previous one ended, no gap or overlap
+        assert start == previous_end
+        assert start < end
+
+
+@pytest.mark.parametrize('pieces', [1, 2, 3, 7, 64])
+def test_split_token_range_covers_range(pieces):
+    token_ranges = split_token_range(-1000, 1001, pieces)
+    assert len(token_ranges) == pieces
+    assert_covers(token_ranges, -1000, 1001)
+
+
+def test_split_token_range_never_splits_below_one_token():
+    assert split_token_range(5, 8, 10) == [(5, 6), (6, 7), (7, 8)]
+
+
+def test_ring_without_metadata_is_split_uniformly():
+    token_ranges = client_with_ring(None).split_token_ring(8)
+    assert len(token_ranges) == 8
+    assert_covers(token_ranges, MURMUR3_MIN_TOKEN, MURMUR3_MAX_TOKEN)
+
+
+@pytest.mark.parametrize('split_count', [1, 3, 10, 100])
+def test_ring_split_follows_ring_tokens(split_count):
+    ring_tokens = [-2 ** 62, -5, 2 ** 40, 2 ** 62 + 7]
+    token_ranges = client_with_ring(ring_tokens).split_token_ring(split_count)
+
+    assert_covers(token_ranges, MURMUR3_MIN_TOKEN, MURMUR3_MAX_TOKEN)
+    boundaries = {end for _, end in token_ranges}
+    # Every owned range ends at its ring token, none straddles two owners
+    assert set(ring_tokens) <= boundaries
+    # At least one range per owned range, including both halves of the wrap-around range
+    assert len(token_ranges) >= len(ring_tokens) + 1
+
+
+def test_wrap_around_range_is_cut_at_the_minimum_token():
+    # Unsorted and duplicated tokens, one of them at the ring's extremes
+    ring_tokens = [100, -100, 100, MURMUR3_MIN_TOKEN, MURMUR3_MAX_TOKEN]
+    token_ranges = client_with_ring(ring_tokens).split_token_ring(1)
+    assert token_ranges == [(MURMUR3_MIN_TOKEN, -100), (-100, 100), (100, MURMUR3_MAX_TOKEN)]
+
+
+def test_uneven_owned_ranges_get_pieces_by_width():
+    # One owned range holds about three quarters of the ring
+    ring_tokens = [2 ** 62]
+    token_ranges = client_with_ring(ring_tokens).split_token_ring(8)
+    assert_covers(token_ranges, MURMUR3_MIN_TOKEN, MURMUR3_MAX_TOKEN)
+    below = [token_range for token_range in token_ranges if token_range[1] <= 2 ** 62]
+    above = [token_range for token_range in token_ranges if token_range[0] >= 2 ** 62]
+    assert (len(below), len(above)) == (6, 2)
@@ -0,0 +1,50 @@
+import re
+
+RANGE_PATTERN = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+
+def parse_block_ranges(lines):
+    """Parse "start-end" ranges and single block numbers, one or more per line separated
+    by commas or whitespace. Blank lines and lines starting with # are skipped."""
+    ranges = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        for token in re.split(r'[,\s]+', line):
+            match = RANGE_PATTERN.match(token)
+            if not match:
+                raise ValueError(f'Invalid block range {token!r} on line {line_number}, expected start-end or a block number')
+            start_block = int(match.group(1))
+            end_block = int(match.group(2)) if match.group(2) is not None else start_block
+            if end_block < start_block:
+                raise ValueError(f'Invalid block range {token!r} on line {line_number}, end is before start')
+            ranges.append((start_block, end_block))
+    return ranges
+
+
+def merge_ranges(ranges):
+    """Sort (start, end) ranges and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_block_number_chunks(ranges, chunk_size):
+    """Yield the block numbers of sorted (start, end) ranges as sorted lists of at most
+    chunk_size numbers, so a wide set of ranges is never materialized at once"""
+    chunk = []
+    for start, end in ranges:
+        while start <= end:
+            chunk_end = min(end, start + chunk_size - len(chunk) - 1)
+            chunk.extend(range(start, chunk_end + 1))
+            start = chunk_end + 1
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
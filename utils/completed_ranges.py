@@ -0,0 +1,122 @@
+import bisect
+import json
+import os
+import threading
+
+
+class CompletedRanges:
+    """Thread-safe set of completed block numbers stored as sorted, merged [start, end] runs.
+
+    Every change is persisted atomically (write to a temporary file, fsync, rename) when a
+    file is given, so after a crash only the batches that were in flight are redone.
+    """
+    def __init__(self, file=None):
+        self.file = file
+        self._lock = threading.Lock()
+        self._ranges = []
+        if file is not None and os.path.isfile(file):
+            with open(file, 'r') as file_handle:
+                content = file_handle.read().strip()
+            if content:
+                for start, end in json.loads(content):
+                    self._add(start, end)
+
+    def add(self, start, end):
+        with self._lock:
+            self._add(start, end)
+            self._save()
+
+    def add_numbers(self, numbers):
+        with self._lock:
+            for start, end in to_ranges(numbers):
+                self._add(start, end)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._ranges = []
+            self._save()
+
+    def discard_below(self, block_number):
+        """Forget everything up to block_number once a contiguous checkpoint covers it"""
+        with self._lock:
+            ranges = []
+            for start, end in self._ranges:
+                if end <= block_number:
+                    continue
+                ranges.append([max(start, block_number + 1), end])
+            self._ranges = ranges
+            self._save()
+
+    def contains(self, number):
+        ranges = self._ranges
+        index = bisect.bisect_right(ranges, [number, float('inf')]) - 1
+        return index >= 0 and ranges[index][0] <= number <= ranges[index][1]
+
+    def contiguous_end(self, start_block):
+        """The last block b such that [start_block, b] is complete, or start_block - 1"""
+        for start, end in self._ranges:
+            if start <= start_block <= end:
+                return end
+        return start_block - 1
+
+    def gaps(self, start_block, end_block):
+        gaps = []
+        position = start_block
+        for start, end in self._ranges:
+            if end < position:
+                continue
+            if start > end_block:
+                break
+            if start > position:
+                gaps.append((position, start - 1))
+            position = max(position, end + 1)
+        if position <= end_block:
+            gaps.append((position, end_block))
+        return gaps
+
+    def missing(self, numbers):
+        for number in numbers:
+            if not self.contains(number):
+                yield number
+
+    def ranges(self):
+        with self._lock:
+            return [tuple(run) for run in self._ranges]
+
+    def _add(self, start, end):
+        ranges = self._ranges
+        index = bisect.bisect_left(ranges, [start, end])
+        ranges.insert(index, [start, end])
+        # Merge with overlapping or adjacent neighbours
+        index = max(index - 1, 0)
+        while index < len(ranges) - 1:
+            current, following = ranges[index], ranges[index + 1]
+            if following[0] <= current[1] + 1:
+                current[1] = max(current[1], following[1])
+                del ranges[index + 1]
+            elif following[0] > end + 1:
+                break
+            else:
+                index += 1
+
+    def _save(self):
+        if self.file is None:
+            return
+        tmp_file = self.file + '.tmp'
+        with open(tmp_file, 'w') as file_handle:
+            json.dump(self._ranges, file_handle)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        os.replace(tmp_file, self.file)
+
+
+def to_ranges(numbers):
+    """Collapse block numbers into sorted (start, end) runs of consecutive numbers"""
+    ranges = []
+    for number in sorted(numbers):
+        if ranges and number <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], number)
+        else:
+            ranges.append([number, number])
+    return [tuple(run) for run in ranges]
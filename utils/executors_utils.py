@@ -17,6 +17,23 @@ def dynamic_batch_iterator(iterable, batch_size_getter):
     if len(batch) > 0:
         yield batch
 
+def row_count_batch_iterator(iterable, target_rows_getter, row_count_estimator, max_batch_size=None):
+    """Like dynamic_batch_iterator, but closes a batch once the estimated rows of its
+    items reach target_rows_getter(), or once it holds max_batch_size items"""
+    batch = []
+    batch_rows = 0
+    target_rows = target_rows_getter()
+    for item in iterable:
+        batch.append(item)
+        batch_rows += row_count_estimator.estimate(item)
+        if batch_rows >= target_rows or (max_batch_size is not None and len(batch) >= max_batch_size):
+            yield batch
+            batch = []
+            batch_rows = 0
+            target_rows = target_rows_getter()
+    if len(batch) > 0:
+        yield batch
+
 class ProgressLogger:
     def __init__(self, name='work', logger=None, log_percentage_step=10, log_item_step=5000):
         self.name = name